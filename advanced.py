@@ -1,20 +1,46 @@
 # advanced.py
 import os
 from dotenv import load_dotenv
-from notion_client import Client
 from auth import login, logout
-from basic_functionality import send_mail, read_mail
-from semantic_search import semantic_search
-from search import search_command
+from utils import parse_search_filters
+
+load_dotenv()
+if os.environ.get("NOTIONMAIL_SERVER"):
+    # Thin client: every command is served by a running server.py
+    from mail_client import (
+        send_mail, read_mail, count_unread, open_message, save_attachments, semantic_search, search_command
+    )
+else:
+    from notion_client import Client
+    from basic_functionality import send_mail, read_mail, count_unread, open_message, save_attachments
+    from semantic_search import semantic_search
+    from search import search_command
+
+def ask_filters():
+    """Prompt for optional search filters; returns a dict, or None if they are invalid."""
+    text = input("Filters (optional, e.g. from:Alice since:2025-03-01 until:2025-03-31): ").strip()
+    try:
+        return parse_search_filters(text)
+    except ValueError as e:
+        print(f"Error: {e}")
+        return None
 
 def main():
-    # Load environment variables and initialize Notion client
-    load_dotenv()
-    NOTION_KEY = os.environ["NOTION_KEY"]
-    DATABASE_ID = os.environ["DATABASE_ID"]
-    notion = Client(auth=NOTION_KEY)
+    if os.environ.get("NOTIONMAIL_SERVER"):
+        # The server owns the Notion client
+        notion = None
+        DATABASE_ID = None
+    else:
+        # Initialize Notion client
+        NOTION_KEY = os.environ["NOTION_KEY"]
+        DATABASE_ID = os.environ["DATABASE_ID"]
+        notion = Client(auth=NOTION_KEY)
 
     current_user = None
+    # How to fetch the next page of the last listing: (function, kwargs, cursor)
+    next_page = None
+    # Messages shown by the last listing, so they can be opened by number
+    last_results = []
     print("Welcome to Advanced NotionMail with Semantic Search!")
     
     while True:
@@ -23,8 +49,12 @@ def main():
         print("- logout:            Log out of your account.")
         print("- send:              Send mail to a user.")
         print("- read:              Check your mail.")
+        print("- read --new:        Check only mail received since your last check.")
         print("- search:            Keyword search (exact matching).")
         print("- semantic_search:   Semantic search using meaning similarity.")
+        print("- more:              Show older messages from the last read or search.")
+        print("- open:              Show the full text of a message from the last listing.")
+        print("- save:              Save the attachments of a message from the last listing.")
         print("- exit:              Exit the application.\n")
         
         option = input("$ ").strip().lower()
@@ -34,8 +64,12 @@ def main():
                 print(f"Already logged in as {current_user}.")
             else:
                 current_user = login()
+                if current_user:
+                    print(f"You have {count_unread(current_user)} unread message(s).")
         elif option == "logout":
             current_user = logout(current_user)
+            next_page = None
+            last_results = []
         elif option == "send":
             if not current_user:
                 print("You must be logged in to send mail. Please log in first.")
@@ -47,25 +81,74 @@ def main():
                 print("You must be logged in to read mail. Please log in first.")
             else:
                 # Use current_user as the recipient
-                read_mail(user=current_user)
+                last_results, cursor = read_mail(user=current_user)
+                next_page = (read_mail, {"user": current_user}, cursor) if cursor else None
+        elif option == "read --new":
+            if not current_user:
+                print("You must be logged in to read mail. Please log in first.")
+            else:
+                last_results, _ = read_mail(user=current_user, new_only=True)
+                next_page = None
         elif option == "search":
             if not current_user:
                 print("You must be logged in to search messages. Please log in first.")
             else:
                 term = input("Enter a keyword to search: ").strip()
-                if term:
-                    search_command(notion, DATABASE_ID, search_term=term, current_user=current_user)
+                filters = ask_filters()
+                if filters is None:
+                    continue
+                if term or filters:
+                    search_kwargs = {
+                        "notion": notion,
+                        "database_id": DATABASE_ID,
+                        "search_term": term,
+                        "current_user": current_user,
+                        **filters
+                    }
+                    last_results, cursor = search_command(**search_kwargs)
+                    next_page = (search_command, search_kwargs, cursor) if cursor else None
                 else:
-                    print("Please provide a valid search term.")
+                    print("Please provide a valid search term or filter.")
         elif option == "semantic_search":
             if not current_user:
                 print("You must be logged in to perform semantic search. Please log in first.")
             else:
                 query = input("Enter a phrase for semantic search: ").strip()
                 if query:
-                    semantic_search(query=query, current_user=current_user)
+                    filters = ask_filters()
+                    if filters is not None:
+                        semantic_search(query=query, current_user=current_user, **filters)
                 else:
                     print("Please provide a valid query.")
+        elif option == "more":
+            if not next_page:
+                print("Nothing more to show. Use 'read' or 'search' first.")
+            else:
+                # Only fetch the next page now that the user asked for it
+                func, kwargs, cursor = next_page
+                last_results, cursor = func(start_cursor=cursor, **kwargs)
+                next_page = (func, kwargs, cursor) if cursor else None
+        elif option == "open":
+            if not last_results:
+                print("Nothing to open. Use 'read' or 'search' first.")
+            else:
+                choice = input(f"Message number (1-{len(last_results)}): ").strip()
+                if choice.isdigit() and 1 <= int(choice) <= len(last_results):
+                    # The full body is only fetched now, and cached for next time
+                    open_message(last_results[int(choice) - 1])
+                else:
+                    print("Please provide a valid message number.")
+        elif option == "save":
+            if not last_results:
+                print("Nothing to save. Use 'read' or 'search' first.")
+            else:
+                choice = input(f"Message number (1-{len(last_results)}): ").strip()
+                if choice.isdigit() and 1 <= int(choice) <= len(last_results):
+                    directory = input("Save to directory (default: current): ").strip() or "."
+                    # Attachment bytes are only read from the blob store now
+                    save_attachments(last_results[int(choice) - 1], directory)
+                else:
+                    print("Please provide a valid message number.")
         elif option == "exit":
             print("Exiting Advanced NotionMail. Goodbye!")
             break
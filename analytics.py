@@ -0,0 +1,241 @@
+# analytics.py
+import argparse
+import os
+import time
+import numpy as np
+
+# Local column file; refreshes only scan pages created since the last refresh
+ANALYTICS_FILE = "message_columns.npz"
+
+# A message only counts as answered by the recipient's next message to the
+# sender within this many seconds
+RESPONSE_WINDOW = 7 * 24 * 3600
+
+PERIODS = {"day": "datetime64[D]", "week": "datetime64[W]", "month": "datetime64[M]", "year": "datetime64[Y]"}
+
+def _page_text(properties, name):
+    prop = properties.get(name, {})
+    return "".join(part.get("plain_text", "") for part in prop.get("rich_text", prop.get("title", [])))
+
+class MessageColumns:
+    """
+    Every message copy as three NumPy columns: its Timestamp and the interned
+    IDs of its sender and recipient (indexes into `names`). Queries run on the
+    whole arrays at once instead of walking page dicts.
+    The Notion page ID of every row (as bytes) and the newest created_time scanned
+    (`synced`) are kept too, so refreshes pick up exactly the pages added since.
+    """
+
+    def __init__(self, timestamps=None, senders=None, recipients=None, names=(), page_ids=None, synced=None):
+        self.timestamps = timestamps if timestamps is not None else np.empty(0, dtype=np.float64)
+        self.senders = senders if senders is not None else np.empty(0, dtype=np.int32)
+        self.recipients = recipients if recipients is not None else np.empty(0, dtype=np.int32)
+        self.page_ids = page_ids if page_ids is not None else np.empty(0, dtype="S")
+        self.names = list(names)
+        self.ids = {name: number for number, name in enumerate(self.names)}
+        self.synced = synced
+
+    def __len__(self):
+        return len(self.timestamps)
+
+    def intern(self, name):
+        if name not in self.ids:
+            self.ids[name] = len(self.names)
+            self.names.append(name)
+        return self.ids[name]
+
+    def append(self, rows, page_ids=None):
+        """Add (timestamp, sender, recipient) rows, with their page IDs if they come from Notion."""
+        rows = list(rows)
+        if not rows:
+            return
+        if page_ids is None:
+            page_ids = [b""] * len(rows)
+        self.page_ids = np.concatenate([self.page_ids, np.array(page_ids, dtype="S")])
+        self.timestamps = np.concatenate([self.timestamps, np.fromiter((row[0] for row in rows), np.float64, len(rows))])
+        self.senders = np.concatenate([self.senders, np.fromiter((self.intern(row[1]) for row in rows), np.int32, len(rows))])
+        self.recipients = np.concatenate([self.recipients, np.fromiter((self.intern(row[2]) for row in rows), np.int32, len(rows))])
+
+    def append_pages(self, pages):
+        pages = [page for page in pages if page["properties"].get("Timestamp", {}).get("number") is not None]
+        self.append(
+            ((page["properties"]["Timestamp"]["number"],
+              _page_text(page["properties"], "Sender"),
+              _page_text(page["properties"], "Recipient"))
+             for page in pages),
+            [page["id"].encode() for page in pages]
+        )
+
+    def save(self, path=ANALYTICS_FILE):
+        # np.savez_compressed adds .npz to names without it, so write to a .npz temp file
+        tmp_path = f"{path}.tmp.npz"
+        np.savez_compressed(
+            tmp_path,
+            timestamps=self.timestamps,
+            senders=self.senders,
+            recipients=self.recipients,
+            page_ids=self.page_ids,
+            names=np.array(self.names, dtype=str),
+            synced=np.array(self.synced or "")
+        )
+        os.replace(tmp_path, path)
+
+    @classmethod
+    def load(cls, path=ANALYTICS_FILE):
+        """Load the saved columns, or return empty columns if there are none."""
+        if not os.path.exists(path):
+            return cls()
+        with np.load(path) as data:
+            if "page_ids" not in data.files:
+                # Saved before page IDs were kept; it cannot be refreshed without duplicates
+                return cls()
+            return cls(
+                data["timestamps"], data["senders"], data["recipients"], data["names"].tolist(),
+                data["page_ids"], str(data["synced"]) or None
+            )
+
+    def refresh(self, notion, database_ids):
+        """
+        Scan the pages created since the last refresh and append the ones not
+        held yet. Pages are found by creation time rather than Timestamp, so
+        messages loaded with old Timestamps (restores, imports) are picked up.
+        Deleted pages are not noticed; rebuild the columns to drop them.
+        Returns how many messages were added.
+        """
+        # Imported here so queries on saved columns do not need the Notion client
+        from scan import scan_pages
+
+        query_filter = None
+        if self.synced:
+            # Notion rounds created_time to the minute, so the last minute is
+            # scanned again and its pages skipped by ID
+            query_filter = {"timestamp": "created_time", "created_time": {"on_or_after": self.synced}}
+        pages = scan_pages(notion, database_ids, query_filter)
+        known = set(self.page_ids.tolist())
+        before = len(self)
+        self.append_pages(page for page in pages if page["id"].encode() not in known)
+        created = [page["created_time"] for page in pages if page.get("created_time")]
+        if created:
+            self.synced = max(created + [self.synced or ""])
+        return len(self) - before
+
+    def volume(self, period="month"):
+        """Messages per period, as (period labels, counts), oldest first."""
+        buckets = self.timestamps.astype("datetime64[s]").astype(PERIODS[period])
+        labels, counts = np.unique(buckets, return_counts=True)
+        return labels.astype(str).tolist(), counts
+
+    def activity(self):
+        """Messages sent and received per user, as (names, sent, received)."""
+        sent = np.bincount(self.senders, minlength=len(self.names))
+        received = np.bincount(self.recipients, minlength=len(self.names))
+        return self.names, sent, received
+
+    def top_pairs(self, n=10):
+        """The n busiest sender→recipient pairs, as [(sender, recipient, count)]."""
+        users = max(len(self.names), 1)
+        pairs, counts = np.unique(self.senders.astype(np.int64) * users + self.recipients, return_counts=True)
+        top = np.argsort(counts)[::-1][:n]
+        return [(self.names[pairs[i] // users], self.names[pairs[i] % users], int(counts[i])) for i in top]
+
+    def response_times(self, window=RESPONSE_WINDOW):
+        """
+        Seconds from each message until its recipient next wrote to its sender,
+        for the messages answered within window.
+        """
+        if not len(self):
+            return np.empty(0)
+        users = max(len(self.names), 1)
+        # Sort every message by (direction, time) and look up, for each message,
+        # the first one in the reverse direction after it
+        keys = self.senders.astype(np.int64) * users + self.recipients
+        seconds = np.floor(self.timestamps - self.timestamps.min()).astype(np.int64)
+        composite = (keys << 32) | seconds
+        order = np.argsort(composite)
+        sorted_composite = composite[order]
+        reply_keys = self.recipients.astype(np.int64) * users + self.senders
+        queries = (reply_keys << 32) | seconds
+        # Searching in sorted order keeps the lookups cache-friendly (several times faster)
+        query_order = np.argsort(queries)
+        positions = np.empty(len(queries), dtype=np.int64)
+        positions[query_order] = np.searchsorted(sorted_composite, queries[query_order], side="right")
+        found = positions < len(sorted_composite)
+        positions = np.minimum(positions, len(sorted_composite) - 1)
+        replies = order[positions]
+        answered = found & (keys[replies] == reply_keys)
+        delays = self.timestamps[replies] - self.timestamps
+        return delays[answered & (delays <= window)]
+
+def print_timed(title, started):
+    print(f"\n{title} ({(time.perf_counter() - started) * 1000:.1f} ms)")
+
+def print_report(columns, period="month", top=10):
+    """Print every analytics query over the columns, with the time each took."""
+    print("=" * 50)
+    print(f"Message Analytics ({len(columns)} messages, {len(columns.names)} people)")
+    print("=" * 50)
+
+    started = time.perf_counter()
+    names, sent, received = columns.activity()
+    print_timed("Messages sent / received by each person", started)
+    for number in np.argsort(sent + received)[::-1]:
+        print(f"  {names[number]}: {sent[number]} sent, {received[number]} received")
+
+    started = time.perf_counter()
+    labels, counts = columns.volume(period)
+    print_timed(f"Messages per {period}", started)
+    for label, count in zip(labels, counts):
+        print(f"  {label}: {count}")
+
+    started = time.perf_counter()
+    pairs = columns.top_pairs(top)
+    print_timed(f"Top {top} sender → recipient pairs", started)
+    for sender, recipient, count in pairs:
+        print(f"  {sender} → {recipient}: {count}")
+
+    started = time.perf_counter()
+    delays = columns.response_times()
+    print_timed("Response times", started)
+    if len(delays):
+        p50, p90, p99 = np.percentile(delays, [50, 90, 99]) / 3600
+        print(f"  {len(delays)} of {len(columns)} messages answered within {RESPONSE_WINDOW // 86400} days")
+        print(f"  p50 {p50:.1f} h, p90 {p90:.1f} h, p99 {p99:.1f} h")
+        for label, limit in (("within an hour", 3600), ("within a day", 86400), ("within a week", 7 * 86400)):
+            print(f"  {label}: {np.count_nonzero(delays <= limit) / len(columns):.1%}")
+    else:
+        print("  No answered messages.")
+    print("=" * 50)
+
+def main():
+    parser = argparse.ArgumentParser(description="Message analytics over a local columnar copy of the database")
+    parser.add_argument("--period", choices=sorted(PERIODS), default="month")
+    parser.add_argument("--top", type=int, default=10, help="Sender → recipient pairs to show")
+    parser.add_argument("--rebuild", action="store_true", help="Scan every message again instead of only new ones")
+    parser.add_argument("--offline", action="store_true", help="Use the saved columns without scanning Notion")
+    parser.add_argument("--synthetic", type=int, metavar="COUNT",
+                        help="Analyze COUNT generated messages instead of the database (for benchmarking)")
+    args = parser.parse_args()
+
+    if args.synthetic:
+        # Imported here so the synthetic benchmark needs no clients
+        from synth_corpus import CorpusGenerator
+        columns = MessageColumns()
+        started = time.perf_counter()
+        columns.append(
+            (record["timestamp"], record["sender"], record["recipient"])
+            for record in CorpusGenerator(count=args.synthetic, users=max(50, args.synthetic // 1000))
+        )
+        print(f"Generated {len(columns)} messages in {time.perf_counter() - started:.1f}s")
+    else:
+        columns = MessageColumns() if args.rebuild else MessageColumns.load()
+        if not args.offline:
+            from basic_functionality import notion
+            from shards import all_shards
+            started = time.perf_counter()
+            added = columns.refresh(notion, all_shards())
+            print(f"Scanned {added} new messages in {time.perf_counter() - started:.1f}s")
+            columns.save()
+    print_report(columns, args.period, args.top)
+
+if __name__ == "__main__":
+    main()
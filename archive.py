@@ -0,0 +1,345 @@
+# archive.py
+import argparse
+import gzip
+import json
+import math
+import os
+import re
+from datetime import datetime, timedelta
+from utils import make_preview
+
+# Local cold storage for old mail. Each archive run writes one immutable
+# segment (gzip JSONL) plus a small index used to skip segments a query
+# cannot match; manifest.json lists the segments and the archive cutoff.
+ARCHIVE_DIR = "archive"
+MANIFEST_FILE = os.path.join(ARCHIVE_DIR, "manifest.json")
+
+# Prefix of the cursors used to page from the live database into the archive,
+# "archive:<timestamp>[:<page id>]": listings resume below that Timestamp, or
+# below that (Timestamp, page ID) since copies of one message share a Timestamp
+ARCHIVE_CURSOR_PREFIX = "archive:"
+
+TOKEN_PATTERN = re.compile(r"\w{2,}")
+
+def tokenize(text):
+    """Lowercase word tokens used by the segment indexes."""
+    return set(TOKEN_PATTERN.findall(text.lower()))
+
+def load_manifest():
+    """Load the archive manifest (an empty archive if none exists)."""
+    try:
+        with open(MANIFEST_FILE, "r") as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return {"cutoff": None, "segments": []}
+
+def save_manifest(manifest):
+    """Write the manifest atomically, after the segment files it lists."""
+    tmp_path = MANIFEST_FILE + ".tmp"
+    with open(tmp_path, "w") as f:
+        json.dump(manifest, f, indent=4)
+    os.replace(tmp_path, MANIFEST_FILE)
+
+def archive_cutoff():
+    """Timestamp below which messages may live in the archive (None if nothing is archived)."""
+    return load_manifest()["cutoff"]
+
+def segment_paths(name):
+    return os.path.join(ARCHIVE_DIR, f"{name}.jsonl.gz"), os.path.join(ARCHIVE_DIR, f"{name}.index.json")
+
+def load_index(name):
+    with open(segment_paths(name)[1], "r") as f:
+        return json.load(f)
+
+def read_segment(name):
+    """Stream the records of one segment."""
+    with gzip.open(segment_paths(name)[0], "rt") as f:
+        for line in f:
+            yield json.loads(line)
+
+def write_segment(records):
+    """Write records as a new segment with its index and register it in the manifest."""
+    os.makedirs(ARCHIVE_DIR, exist_ok=True)
+    manifest = load_manifest()
+    name = f"segment-{len(manifest['segments']) + 1:05d}"
+    data_path, index_path = segment_paths(name)
+
+    tokens = set()
+    participants = set()
+    for record in records:
+        tokens |= tokenize(f"{record['sender']} {record['recipient']} {record['message']}")
+        participants.update([record["sender"].lower(), record["recipient"].lower()])
+
+    with gzip.open(data_path, "wt") as f:
+        for record in records:
+            f.write(json.dumps(record) + "\n")
+    index = {
+        "ids": [record["id"] for record in records],
+        "count": len(records),
+        "min_ts": min(record["timestamp"] for record in records),
+        "max_ts": max(record["timestamp"] for record in records),
+        "participants": sorted(participants),
+        "tokens": sorted(tokens),
+        "has_vectors": any(record.get("vectors") for record in records)
+    }
+    with open(index_path, "w") as f:
+        json.dump(index, f)
+
+    manifest["segments"].append({"name": name, "count": len(records), "min_ts": index["min_ts"], "max_ts": index["max_ts"]})
+    save_manifest(manifest)
+    return name
+
+def archived_ids():
+    """IDs of every archived message."""
+    ids = set()
+    for segment in load_manifest()["segments"]:
+        ids.update(load_index(segment["name"])["ids"])
+    return ids
+
+def segment_may_match(segment, index, user=None, before=None, since=None, term=None, vectors=False, sender=None,
+                      before_id=None):
+    """Use the manifest entry and segment index to skip segments a query cannot match."""
+    if before is not None and (segment["min_ts"] > before if before_id else segment["min_ts"] >= before):
+        return False
+    if since is not None and segment["max_ts"] <= since:
+        return False
+    if user and user.lower() not in index["participants"]:
+        return False
+    if sender and sender.lower() not in index["participants"]:
+        return False
+    if vectors and not index.get("has_vectors"):
+        return False
+    if term:
+        # Keyword search matches substrings, so every word of the term has to
+        # appear inside some token of the segment
+        for word in tokenize(term):
+            if not any(word in token for token in index["tokens"]):
+                return False
+    return True
+
+def record_matches(record, user=None, role="participant", before=None, since=None, term=None, sender=None,
+                   before_id=None):
+    """
+    Whether a record matches a query. Records at or after before are skipped;
+    with before_id, only those at or after (before, before_id) in Timestamp, ID order.
+    """
+    if before is not None:
+        if before_id is None and record["timestamp"] >= before:
+            return False
+        if before_id is not None and (record["timestamp"], record["id"]) >= (before, before_id):
+            return False
+    if since is not None and record["timestamp"] <= since:
+        return False
+    if sender and record["sender"].lower() != sender.lower():
+        return False
+    if user:
+        if role == "recipient" and record["recipient"].lower() != user.lower():
+            return False
+        if role == "participant" and user.lower() not in (record["sender"].lower(), record["recipient"].lower()):
+            return False
+    if term:
+        text = f"{record['sender']}\n{record['recipient']}\n{record['message']}".lower()
+        if term.lower() not in text:
+            return False
+    return True
+
+def query_archive(user=None, role="participant", before=None, since=None, term=None, limit=None, sender=None,
+                  before_id=None):
+    """
+    Archived records matching a query, newest first (ties ordered by ID).
+    role is "recipient" for inbox reads and "participant" for searches.
+    """
+    filters = {"user": user, "before": before, "since": since, "term": term, "sender": sender, "before_id": before_id}
+    matches = []
+    for segment in load_manifest()["segments"]:
+        index = load_index(segment["name"])
+        if not segment_may_match(segment, index, **filters):
+            continue
+        for record in read_segment(segment["name"]):
+            if record_matches(record, role=role, **filters):
+                matches.append(record)
+    matches.sort(key=lambda record: (record["timestamp"], record["id"]), reverse=True)
+    return matches[:limit] if limit else matches
+
+def archive_page(user, role, before, limit, term=None, since=None, until=None, sender=None):
+    """
+    One page of archived messages below `before` (and older than `until`), as
+    Notion-like pages. before is a (Timestamp, page ID) key as returned by
+    parse_archive_cursor; a None ID means strictly older than the Timestamp.
+    Returns (pages, next_cursor).
+    """
+    before, before_id = before
+    if until is not None and until <= before:
+        before, before_id = until, None
+    # The archive's since is exclusive; search filters include since itself
+    since = since - 1e-6 if since is not None else None
+    records = query_archive(
+        user=user, role=role, before=before, since=since, term=term, limit=limit + 1, sender=sender, before_id=before_id
+    )
+    pages = [record_to_page(record) for record in records[:limit]]
+    if len(records) > limit:
+        return pages, archive_cursor(records[limit - 1]["timestamp"], records[limit - 1]["id"])
+    return pages, None
+
+def continue_into_archive(results, next_cursor, user, role, limit, term=None, since=None, until=None, sender=None):
+    """
+    Extend a page of live results into the archive once the live database is exhausted.
+    Archived mail is only read when a listing reaches back past the live data.
+    Returns (results, next_cursor).
+    """
+    cutoff = archive_cutoff()
+    if next_cursor or cutoff is None:
+        return results, next_cursor
+    if since is not None and since >= cutoff:
+        # Nothing the filter allows is old enough to be archived
+        return results, next_cursor
+    # Live pages can be older than the cutoff (restored or imported later), so
+    # the archive is always read from the cutoff down; a page archived by an
+    # interrupted run can be in both, so the ones just shown are skipped
+    shown = {page["id"] for page in results}
+    older, older_cursor = archive_page(
+        user, role, (cutoff, None), limit - len(results) if len(results) < limit else 1, term, since, until, sender
+    )
+    older = [page for page in older if page["id"] not in shown]
+    if len(results) < limit:
+        return results + older, older_cursor
+    # The page is already full; only hand out a cursor if the archive has more
+    return results, archive_cursor(cutoff) if older or older_cursor else None
+
+def archive_cursor(timestamp, page_id=None):
+    """Cursor resuming below a Timestamp, or below (Timestamp, page ID) given an ID."""
+    if page_id is None:
+        return f"{ARCHIVE_CURSOR_PREFIX}{timestamp}"
+    return f"{ARCHIVE_CURSOR_PREFIX}{timestamp}:{page_id}"
+
+def parse_archive_cursor(cursor):
+    """
+    Return the (Timestamp, page ID) key an archive cursor resumes below (the ID
+    is None for a bare Timestamp), or None for other cursors.
+    """
+    if cursor and cursor.startswith(ARCHIVE_CURSOR_PREFIX):
+        timestamp, _, page_id = cursor[len(ARCHIVE_CURSOR_PREFIX):].partition(":")
+        return float(timestamp), page_id or None
+    return None
+
+def record_to_page(record):
+    """
+    Present an archived record like a Notion page, so listing and rendering
+    code works unchanged. The full body rides along under "body".
+    """
+    def text(content):
+        return [{"type": "text", "text": {"content": content}, "plain_text": content}]
+
+    properties = {
+        "Sender": {"rich_text": text(record["sender"])},
+        "Recipient": {"rich_text": text(record["recipient"])},
+        "Message": {"title": text(make_preview(record["message"]))},
+        "Timestamp": {"number": record["timestamp"]},
+    }
+    if record.get("cc"):
+        properties["Cc"] = {"rich_text": text(record["cc"])}
+    if record.get("attachments"):
+        properties["Attachments"] = {"rich_text": text(json.dumps(record["attachments"], separators=(",", ":")))}
+    return {"id": record["id"], "archived": True, "body": record["message"], "properties": properties}
+
+def cosine(a, b):
+    dot = sum(x * y for x, y in zip(a, b))
+    norm = math.sqrt(sum(x * x for x in a)) * math.sqrt(sum(y * y for y in b))
+    return dot / norm if norm else 0.0
+
+def semantic_matches(query_vector, user, top_k, since=None, until=None, sender=None):
+    """Score archived chunk vectors against a query vector, as Pinecone-style matches."""
+    since = since - 1e-6 if since is not None else None
+    matches = []
+    for segment in load_manifest()["segments"]:
+        index = load_index(segment["name"])
+        if not segment_may_match(segment, index, user=user, before=until, since=since, vectors=True, sender=sender):
+            continue
+        for record in read_segment(segment["name"]):
+            if not record_matches(record, user=user, before=until, since=since, sender=sender):
+                continue
+            for vector in record.get("vectors", []):
+                if len(vector["values"]) != len(query_vector):
+                    # Embedded by another model version; not comparable
+                    continue
+                matches.append({
+                    "id": vector["id"],
+                    "score": cosine(query_vector, vector["values"]),
+                    "metadata": vector["metadata"]
+                })
+    matches.sort(key=lambda match: match["score"], reverse=True)
+    return matches[:top_k]
+
+def fetch_vectors(index, page_id, namespace):
+    """Fetch the chunk vectors (and any pre-chunking vector) stored for a page."""
+    ids = [page_id]
+    for batch in index.list(prefix=f"{page_id}#", namespace=namespace):
+        ids.extend(batch)
+    fetched = index.fetch(ids=ids, namespace=namespace).vectors
+    return [
+        {"id": vector_id, "values": list(vector.values), "metadata": dict(vector.metadata or {})}
+        for vector_id, vector in fetched.items()
+    ]
+
+def archive_messages(cutoff, include_vectors=False):
+    """
+    Move every message older than cutoff out of Notion into a new archive segment.
+    With include_vectors, their embeddings are stored in the segment and removed
+    from Pinecone; otherwise they stay searchable in Pinecone as before.
+    """
+    # Imported here so reading the archive does not need the live clients
+    from basic_functionality import index, notion, page_to_record, pc, query_all
+    from embedding import get_version, version_index
+    from rate_limiter import notion_limiter
+
+    version = get_version()
+    pages = query_all(filter={"property": "Timestamp", "number": {"less_than": cutoff}}, page_size=100)
+    already_archived = archived_ids()
+
+    records = []
+    for page in pages:
+        if page["id"] in already_archived:
+            # Written to a segment by an interrupted earlier run
+            continue
+        record = page_to_record(page)
+        if include_vectors and index:
+            record["vectors"] = fetch_vectors(version_index(pc, version), page["id"], version["namespace"])
+        records.append(record)
+
+    if records:
+        name = write_segment(records)
+        print(f"Wrote {len(records)} messages to {name}.")
+
+    # Only raise the cutoff once the segment is safely on disk
+    manifest = load_manifest()
+    manifest["cutoff"] = max(manifest["cutoff"] or 0, cutoff)
+    save_manifest(manifest)
+
+    # Remove the archived pages (and stored vectors) from the hot tier
+    for page in pages:
+        notion_limiter.acquire()
+        notion.pages.update(page_id=page["id"], archived=True)
+    if include_vectors and index:
+        vector_ids = [vector["id"] for record in records for vector in record.get("vectors", [])]
+        for i in range(0, len(vector_ids), 1000):
+            version_index(pc, version).delete(ids=vector_ids[i:i + 1000], namespace=version["namespace"])
+
+    print(f"Archived {len(pages)} messages older than {datetime.fromtimestamp(cutoff):%Y-%m-%d}.")
+
+def main():
+    parser = argparse.ArgumentParser(description="Move old messages from Notion into the local archive")
+    group = parser.add_mutually_exclusive_group(required=True)
+    group.add_argument("--older-than-days", type=int, help="Archive messages older than this many days")
+    group.add_argument("--before", help="Archive messages sent before this date (YYYY-MM-DD)")
+    parser.add_argument("--vectors", action="store_true",
+                        help="Also move the messages' embeddings from Pinecone into the archive")
+    args = parser.parse_args()
+
+    if args.before:
+        cutoff = datetime.strptime(args.before, "%Y-%m-%d").timestamp()
+    else:
+        cutoff = (datetime.now() - timedelta(days=args.older_than_days)).timestamp()
+    archive_messages(cutoff, include_vectors=args.vectors)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,308 @@
+# async_mail.py
+import asyncio
+import os
+from datetime import datetime
+from dotenv import load_dotenv
+from notion_client import AsyncClient
+from pinecone import PineconeAsyncio
+from archive import (
+    archive_cutoff, archive_page, continue_into_archive, parse_archive_cursor, query_archive, record_to_page
+)
+from basic_functionality import (
+    MAX_BLOCKS_PER_REQUEST, build_inbox_filter, build_properties, get_page_timestamp, parse_recipients
+)
+from blob_store import put_file
+from embedding import (
+    EMBED_BATCH_SIZE, UPSERT_BATCH_SIZE,
+    build_copy_vectors, chunk_text, embed_parameters, format_passage, get_version, is_local, write_versions
+)
+from local_embedding import local_embed
+from query_cache import result_cache
+from rate_limiter import notion_limiter
+from search import build_search_filter
+from shards import (
+    all_shards, below_cursor, merge_shard_pages, shard_for_write, shard_needs_more, shard_query_kwargs, shards_for_read
+)
+from semantic_search import (
+    CHUNKS_PER_RESULT, SEARCH_DEADLINE, fallback_terms, keyword_hits, metadata_filter, pinecone_breaker, user_hits
+)
+from utils import DEFAULT_PAGE_SIZE, PREVIEW_LENGTH, build_body_blocks, parse_date
+from watermarks import get_watermark, set_watermark
+
+# Load environment variables
+load_dotenv()
+NOTION_KEY = os.environ["NOTION_KEY"]
+PINECONE_API_KEY = os.environ.get("PINECONE_API_KEY")
+
+# Maximum number of requests in flight per backend
+NOTION_CONCURRENCY = 3
+PINECONE_CONCURRENCY = 8
+
+class AsyncMail:
+    """
+    Async variants of the mail primitives for use from an event loop.
+    Unlike the sync primitives they never prompt or print; they return data.
+    Use as `async with AsyncMail() as mail:` so clients are opened and closed
+    on the running loop.
+    """
+
+    def __init__(self, notion_concurrency=NOTION_CONCURRENCY, pinecone_concurrency=PINECONE_CONCURRENCY):
+        self.notion_concurrency = notion_concurrency
+        self.pinecone_concurrency = pinecone_concurrency
+
+    async def __aenter__(self):
+        self.notion = AsyncClient(auth=NOTION_KEY)
+        self.notion_semaphore = asyncio.BoundedSemaphore(self.notion_concurrency)
+        self.pinecone_semaphore = asyncio.BoundedSemaphore(self.pinecone_concurrency)
+        self.pc = PineconeAsyncio(api_key=PINECONE_API_KEY) if PINECONE_API_KEY else None
+        self.indexes = {}
+        return self
+
+    async def __aexit__(self, *exc_info):
+        await self.notion.aclose()
+        for index in self.indexes.values():
+            await index.close()
+        if self.pc:
+            await self.pc.close()
+
+    async def _index_for(self, version):
+        """Async index handle of an embedding version, opened once per index name."""
+        if version["index"] not in self.indexes:
+            description = await self.pc.describe_index(version["index"])
+            self.indexes[version["index"]] = self.pc.IndexAsyncio(host=description.host)
+        return self.indexes[version["index"]]
+
+    async def _notion_call(self, method, **kwargs):
+        """Call a Notion endpoint under the per-backend semaphore and the shared rate limiter."""
+        async with self.notion_semaphore:
+            await notion_limiter.acquire_async()
+            return await method(**kwargs)
+
+    async def _pinecone_call(self, method, **kwargs):
+        """Call a Pinecone endpoint under the per-backend semaphore."""
+        async with self.pinecone_semaphore:
+            return await method(**kwargs)
+
+    async def _embed_passages(self, texts, version):
+        """Embed passages with a version's model in batches, running the batches concurrently."""
+        if is_local(version):
+            # CPU-bound; keep it off the event loop
+            return await asyncio.to_thread(local_embed, version, texts, "passage")
+        batches = await asyncio.gather(*[
+            self._pinecone_call(
+                self.pc.inference.embed,
+                model=version["model"],
+                inputs=texts[i:i + EMBED_BATCH_SIZE],
+                parameters=embed_parameters(version, "passage")
+            )
+            for i in range(0, len(texts), EMBED_BATCH_SIZE)
+        ])
+        return [emb["values"] for batch in batches for emb in batch]
+
+    async def _query_shards(self, database_ids, query_filter, limit, start_cursor=None):
+        """Async counterpart of shards.query_shards: one page, newest first, across shards."""
+        if len(database_ids) == 1:
+            query_kwargs = shard_query_kwargs(query_filter, limit, None)
+            if start_cursor:
+                query_kwargs["start_cursor"] = start_cursor
+            response = await self._notion_call(self.notion.databases.query, database_id=database_ids[0], **query_kwargs)
+            next_cursor = response.get("next_cursor") if response.get("has_more") else None
+            return response.get("results", []), next_cursor
+
+        query_kwargs = shard_query_kwargs(query_filter, limit, start_cursor)
+
+        async def query_one(database_id):
+            pages = []
+            kwargs = dict(query_kwargs)
+            while True:
+                response = await self._notion_call(self.notion.databases.query, database_id=database_id, **kwargs)
+                pages.extend(below_cursor(response.get("results", []), start_cursor))
+                if not shard_needs_more(pages, limit, response.get("has_more")):
+                    return pages, bool(response.get("has_more"))
+                kwargs["start_cursor"] = response.get("next_cursor")
+
+        shard_pages = await asyncio.gather(*[query_one(database_id) for database_id in database_ids])
+        return merge_shard_pages(shard_pages, limit)
+
+    async def _query_all(self, database_ids, query_filter):
+        """Fetch every matching page from each shard, newest first, with shards in parallel."""
+        async def query_one(database_id):
+            results = []
+            query_kwargs = shard_query_kwargs(query_filter, 100, None)
+            while True:
+                response = await self._notion_call(self.notion.databases.query, database_id=database_id, **query_kwargs)
+                results.extend(response.get("results", []))
+                if not response.get("has_more"):
+                    return results
+                query_kwargs["start_cursor"] = response.get("next_cursor")
+
+        per_shard = await asyncio.gather(*[query_one(database_id) for database_id in database_ids])
+        return sorted((page for pages in per_shard for page in pages), key=get_page_timestamp, reverse=True)
+
+    async def _create_page(self, properties, children, database_id):
+        response = await self._notion_call(
+            self.notion.pages.create,
+            parent={"database_id": database_id},
+            properties=properties,
+            children=children[:MAX_BLOCKS_PER_REQUEST]
+        )
+        for i in range(MAX_BLOCKS_PER_REQUEST, len(children), MAX_BLOCKS_PER_REQUEST):
+            await self._notion_call(
+                self.notion.blocks.children.append,
+                block_id=response["id"],
+                children=children[i:i + MAX_BLOCKS_PER_REQUEST]
+            )
+        return response
+
+    async def send_mail(self, sender, recipient, message, cc=None, bcc=None, attachments=None):
+        """
+        Send a message to one or more recipients (see basic_functionality.send_mail).
+        attachments is a list of file paths, stored in the local blob store.
+        Returns a dict mapping each recipient to their page ID, or to the exception
+        raised while creating their copy.
+        """
+        cc_list = parse_recipients(cc)
+        all_recipients = list(dict.fromkeys(parse_recipients(recipient) + cc_list + parse_recipients(bcc)))
+        timestamp_number = datetime.now().astimezone().timestamp()
+        children = build_body_blocks(message) if len(message) > PREVIEW_LENGTH else []
+        refs = [put_file(path) for path in attachments or []]
+
+        responses = await asyncio.gather(*[
+            self._create_page(
+                build_properties(sender, name, message, timestamp_number, cc=cc_list, attachments=refs),
+                children,
+                shard_for_write(name, timestamp_number)
+            )
+            for name in all_recipients
+        ], return_exceptions=True)
+        sent = {
+            name: response if isinstance(response, Exception) else response["id"]
+            for name, response in zip(all_recipients, responses)
+        }
+        result_cache.bump(sender, *all_recipients)
+
+        # Embed once per write version and upsert one set of chunk vectors per delivered copy
+        copies = [(name, page_id) for name, page_id in sent.items() if not isinstance(page_id, Exception)]
+        if self.pc and copies:
+            chunks = chunk_text(message)
+            passages = [format_passage(sender, ", ".join(name for name, _ in copies), chunk) for chunk in chunks]
+            for position, version in enumerate(write_versions()):
+                try:
+                    index = await self._index_for(version)
+                    values = await self._embed_passages(passages, version)
+                    vectors = build_copy_vectors(sender, copies, chunks, values, timestamp_number)
+                    await asyncio.gather(*[
+                        self._pinecone_call(
+                            index.upsert, vectors=vectors[i:i + UPSERT_BATCH_SIZE], namespace=version["namespace"]
+                        )
+                        for i in range(0, len(vectors), UPSERT_BATCH_SIZE)
+                    ])
+                except Exception:
+                    # Shadow writes are best-effort; the backfill catches them up
+                    if position == 0:
+                        raise
+        return sent
+
+    async def read_mail(self, user, new_only=False, limit=DEFAULT_PAGE_SIZE, start_cursor=None):
+        """Fetch a user's messages, newest first. Returns (results, next_cursor) like read_mail."""
+        if new_only:
+            # Every message above the watermark, from the shards that can hold it
+            watermark = get_watermark(user)
+            results = await self._query_all(
+                shards_for_read(recipient=user, since=watermark),
+                build_inbox_filter(user, since=watermark)
+            )
+            next_cursor = None
+            cutoff = archive_cutoff()
+            if cutoff is not None and watermark < cutoff:
+                archived = await asyncio.to_thread(query_archive, user=user, role="recipient", since=watermark)
+                results += [record_to_page(record) for record in archived]
+        elif parse_archive_cursor(start_cursor) is not None:
+            # Paging has reached back past the live database into the archive;
+            # archive reads are file I/O, so they run off the event loop
+            archive_before = parse_archive_cursor(start_cursor)
+            results, next_cursor = await asyncio.to_thread(archive_page, user, "recipient", archive_before, limit)
+        else:
+            results, next_cursor = await self._query_shards(
+                shards_for_read(recipient=user), build_inbox_filter(user), limit, start_cursor
+            )
+            results, next_cursor = await asyncio.to_thread(
+                continue_into_archive, results, next_cursor, user, "recipient", limit
+            )
+
+        if results:
+            set_watermark(user, max(get_page_timestamp(page) for page in results))
+        return results, next_cursor
+
+    async def search_command(self, search_term, current_user, limit=DEFAULT_PAGE_SIZE, start_cursor=None,
+                             since=None, until=None, sender=None):
+        """
+        Keyword search, newest first, optionally restricted by date and sender.
+        Continues into the archive like search_command.
+        Returns (results, next_cursor) like search_command.
+        """
+        filters = {"since": parse_date(since), "until": parse_date(until, end_of_day=True), "sender": sender}
+        archive_before = parse_archive_cursor(start_cursor)
+        if archive_before is not None:
+            return await asyncio.to_thread(
+                archive_page, current_user, "participant", archive_before, limit, search_term, **filters
+            )
+        results, next_cursor = await self._query_shards(
+            all_shards(), build_search_filter(search_term, current_user, **filters), limit, start_cursor
+        )
+        return await asyncio.to_thread(
+            continue_into_archive, results, next_cursor, current_user, "participant", limit, search_term, **filters
+        )
+
+    async def _vector_matches(self, query, top_k, namespace, query_filter=None):
+        version = get_version()
+        index = await self._index_for(version)
+        if is_local(version):
+            query_vector = (await asyncio.to_thread(local_embed, version, [query], "query"))[0]
+        else:
+            embeddings = await self._pinecone_call(
+                self.pc.inference.embed,
+                model=version["model"],
+                inputs=[query],
+                parameters=embed_parameters(version, "query")
+            )
+            query_vector = embeddings[0]["values"]
+        query_kwargs = {"filter": query_filter} if query_filter else {}
+        results = await self._pinecone_call(
+            index.query,
+            namespace=namespace or version["namespace"],
+            vector=query_vector,
+            top_k=top_k * CHUNKS_PER_RESULT,
+            include_values=False,
+            include_metadata=True,
+            **query_kwargs
+        )
+        return results["matches"]
+
+    async def semantic_search(self, query, current_user, top_k=3, namespace=None, pooling="max",
+                              deadline=SEARCH_DEADLINE, since=None, until=None, sender=None):
+        """
+        Semantic search pooled per message (see semantic_search.semantic_search).
+        Returns the pooled hits involving current_user, best first; if Pinecone
+        misses the deadline, fails or its circuit is open, keyword hits tagged
+        "degraded" are returned instead. Date and sender filters apply to both.
+        """
+        filters = {"since": parse_date(since), "until": parse_date(until, end_of_day=True), "sender": sender}
+        if self.pc and pinecone_breaker.allow():
+            try:
+                matches = await asyncio.wait_for(
+                    self._vector_matches(query, top_k, namespace, metadata_filter(**filters)), deadline
+                )
+            except Exception:
+                pinecone_breaker.record_failure()
+            else:
+                pinecone_breaker.record_success()
+                return user_hits(matches, current_user, top_k, pooling=pooling)
+
+        words = fallback_terms(query)
+        if not words and since is None and until is None and not sender:
+            return []
+        pages, _ = await self._query_shards(
+            all_shards(), build_search_filter(words, current_user, **filters), top_k * 3
+        )
+        return keyword_hits(pages, words, top_k)
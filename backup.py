@@ -0,0 +1,178 @@
+# backup.py
+import argparse
+import gzip
+import json
+import os
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from basic_functionality import create_record_page, notion, page_to_record
+from rate_limiter import notion_limiter
+from shards import all_shards
+
+DEFAULT_SNAPSHOT = "snapshot.jsonl.gz"
+
+# Worker threads creating pages during a restore; the shared rate limiter
+# still decides how many requests per second actually go out
+RESTORE_WORKERS = 8
+
+# Seconds between progress lines
+REPORT_INTERVAL = 10
+
+def checkpoint_path(snapshot):
+    return snapshot + ".checkpoint.json"
+
+def restored_log_path(snapshot):
+    return snapshot + ".restored"
+
+def save_checkpoint(path, checkpoint):
+    """Write a checkpoint atomically."""
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "w") as f:
+        json.dump(checkpoint, f)
+    os.replace(tmp_path, path)
+
+class Progress:
+    """Counts processed records and prints the rate every REPORT_INTERVAL seconds."""
+
+    def __init__(self, label, already_done=0):
+        self.label = label
+        self.count = 0
+        self.already_done = already_done
+        self.started = time.monotonic()
+        self.last_report = self.started
+        self.lock = threading.Lock()
+
+    def add(self, n=1):
+        with self.lock:
+            self.count += n
+            now = time.monotonic()
+            if now - self.last_report >= REPORT_INTERVAL:
+                self.last_report = now
+                self.report()
+
+    def report(self, final=False):
+        elapsed = max(time.monotonic() - self.started, 1e-9)
+        prefix = "Done:" if final else "Progress:"
+        print(f"{prefix} {self.label} {self.count + self.already_done} records "
+              f"({self.count} this run, {self.count / elapsed:.1f} records/s)")
+
+def export_database(snapshot=DEFAULT_SNAPSHOT):
+    """
+    Stream every page of every shard into a gzip JSONL snapshot.
+    Each page of results is appended as its own gzip member and followed by a
+    checkpoint holding the file size and each shard's cursor, so an interrupted
+    export resumes where it stopped instead of starting over.
+    """
+    cp_path = checkpoint_path(snapshot)
+    if os.path.exists(cp_path):
+        with open(cp_path, "r") as f:
+            checkpoint = json.load(f)
+        # Drop anything written after the last checkpoint
+        with open(snapshot, "ab") as f:
+            f.truncate(checkpoint["size"])
+        print(f"Resuming export into {snapshot} at {checkpoint['count']} records.")
+    else:
+        checkpoint = {"size": 0, "count": 0, "shards": {}}
+        open(snapshot, "wb").close()
+
+    progress = Progress("exported", already_done=checkpoint["count"])
+    for database_id in all_shards():
+        state = checkpoint["shards"].setdefault(database_id, {"cursor": None, "done": False})
+        while not state["done"]:
+            query_kwargs = {"page_size": 100}
+            if state["cursor"]:
+                query_kwargs["start_cursor"] = state["cursor"]
+            notion_limiter.acquire()
+            response = notion.databases.query(database_id=database_id, **query_kwargs)
+            records = [page_to_record(page) for page in response.get("results", [])]
+
+            with gzip.open(snapshot, "at") as f:
+                for record in records:
+                    f.write(json.dumps(record, separators=(",", ":")) + "\n")
+
+            state["cursor"] = response.get("next_cursor")
+            state["done"] = not response.get("has_more")
+            checkpoint["count"] += len(records)
+            checkpoint["size"] = os.path.getsize(snapshot)
+            save_checkpoint(cp_path, checkpoint)
+            progress.add(len(records))
+
+    progress.report(final=True)
+    os.remove(cp_path)
+    print(f"Snapshot complete: {snapshot}")
+
+def read_snapshot(snapshot):
+    """Stream the records of a snapshot."""
+    with gzip.open(snapshot, "rt") as f:
+        for line in f:
+            if line.strip():
+                yield json.loads(line)
+
+def restore_database(snapshot=DEFAULT_SNAPSHOT, workers=RESTORE_WORKERS):
+    """Restore every record of a snapshot (see restore_records)."""
+    restore_records(read_snapshot(snapshot), restored_log_path(snapshot), workers=workers)
+
+def restore_records(records, log_path, workers=RESTORE_WORKERS):
+    """
+    Create a page for every record, in parallel under the Notion rate limiter.
+    Each restored record is appended to the log at log_path (old ID, new ID),
+    so a rerun after an interruption skips what is already there.
+    """
+    done = set()
+    if os.path.exists(log_path):
+        with open(log_path, "r") as f:
+            done = {line.split("\t", 1)[0] for line in f if line.strip()}
+        print(f"Resuming restore: {len(done)} records already restored.")
+
+    progress = Progress("restored", already_done=len(done))
+    log_lock = threading.Lock()
+    failures = 0
+
+    with open(log_path, "a") as log, ThreadPoolExecutor(max_workers=workers) as executor:
+        def restore_one(record):
+            try:
+                page = create_record_page(record)
+            except Exception as e:
+                print(f"Error restoring {record['id']}: {e}")
+                raise
+            with log_lock:
+                log.write(f"{record['id']}\t{page['id']}\n")
+                log.flush()
+            progress.add()
+
+        # Keep a bounded number of records in flight so memory stays flat
+        pending = set()
+        for record in records:
+            if record["id"] in done:
+                continue
+            pending.add(executor.submit(restore_one, record))
+            if len(pending) >= workers * 4:
+                finished, pending = wait(pending, return_when=FIRST_COMPLETED)
+                failures += sum(1 for future in finished if future.exception())
+        finished, _ = wait(pending)
+        failures += sum(1 for future in finished if future.exception())
+
+    progress.report(final=True)
+    if failures:
+        print(f"{failures} records failed; run the restore again to retry them.")
+    else:
+        print("Restore complete. Run pinecone_embed_all.py to rebuild semantic search.")
+
+def main():
+    parser = argparse.ArgumentParser(description="Back up or restore the NotionMail database")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    export_parser = subparsers.add_parser("export", help="Stream every message into a snapshot")
+    export_parser.add_argument("--snapshot", default=DEFAULT_SNAPSHOT)
+    import_parser = subparsers.add_parser("import", help="Restore a snapshot into the database")
+    import_parser.add_argument("--snapshot", default=DEFAULT_SNAPSHOT)
+    import_parser.add_argument("--workers", type=int, default=RESTORE_WORKERS)
+    args = parser.parse_args()
+
+    if args.command == "export":
+        export_database(args.snapshot)
+    else:
+        restore_database(args.snapshot, workers=args.workers)
+
+if __name__ == "__main__":
+    main()
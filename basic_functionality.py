@@ -1,11 +1,27 @@
 # basic_functionality.py
 import os
 import json
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from datetime import datetime
+from functools import lru_cache
 from dotenv import load_dotenv
 from notion_client import Client
 from pinecone import Pinecone
-from utils import format_message, print_message
+from utils import (
+    DEFAULT_PAGE_SIZE, NEWEST_FIRST, PREVIEW_LENGTH, build_body_blocks, format_cc,
+    format_message, get_attachments, is_truncated, make_preview, render_message
+)
+from blob_store import put_file, save_attachment
+from archive import (
+    archive_cutoff, archive_page, continue_into_archive, parse_archive_cursor, query_archive, record_to_page
+)
+from embedding import (
+    build_copy_vectors, chunk_text, embed_passages, format_passage, get_version, version_index, write_to_versions
+)
+from query_cache import result_cache
+from rate_limiter import notion_limiter
+from shards import all_shards, query_all_shards, query_shards, shard_for_write, shards_for_read
+from watermarks import get_watermark, set_watermark
 
 # Load environment variables
 load_dotenv()
@@ -20,7 +36,7 @@ notion = Client(auth=NOTION_KEY)
 try:
     if PINECONE_API_KEY:
         pc = Pinecone(api_key=PINECONE_API_KEY)
-        index = pc.Index("notion-mail")
+        index = version_index(pc, get_version())
     else:
         pc = None
         index = None
@@ -29,122 +45,391 @@ except Exception as e:
     pc = None
     index = None
 
-def send_mail(sender=None, recipient=None, message=None):
+# Notion accepts at most 100 blocks per create/append request
+MAX_BLOCKS_PER_REQUEST = 100
+
+# Upper bound on concurrent page creations when fanning out a message
+MAX_SEND_WORKERS = 8
+
+def parse_recipients(recipients):
+    """Turn a comma-separated string or a list of names into a clean list of names."""
+    if not recipients:
+        return []
+    if isinstance(recipients, str):
+        recipients = recipients.split(",")
+    return [name.strip() for name in recipients if name and name.strip()]
+
+def rich_text(content):
+    """Build a Notion rich_text/title value holding a single piece of text."""
+    return [
+        {
+            "type": "text",
+            "text": {"content": content}
+        }
+    ]
+
+def build_properties(sender, recipient, message, timestamp_number, cc=None, attachments=None):
     """
-    Send a message to the Notion database.
-    Optionally embed the message in Pinecone for semantic search.
+    Construct the Notion properties for one recipient's copy of a message.
+    Long messages only keep a preview in the title and are flagged as Truncated;
+    their full body goes into the page's blocks (see build_body_blocks).
+    attachments are blob store references; the bytes never go to Notion.
     """
-    # Get inputs if not provided
-    if sender is None:
-        sender = input("Sender: ").strip()
-    if recipient is None:
-        recipient = input("Recipient: ").strip()
-    if message is None:
-        message = input("Message: ").strip()
-    
-    # Get current time as Unix timestamp
-    now = datetime.now().astimezone()
-    timestamp_number = now.timestamp()
-
-    # Construct properties for the new page
     properties = {
         "Sender": {
-            "rich_text": [
-                {
-                    "type": "text",
-                    "text": {"content": sender}
-                }
-            ]
+            "rich_text": rich_text(sender)
         },
         "Recipient": {
-            "rich_text": [
-                {
-                    "type": "text",
-                    "text": {"content": recipient}
-                }
-            ]
+            "rich_text": rich_text(recipient)
         },
         "Message": {
-            "title": [
-                {
-                    "type": "text",
-                    "text": {"content": message}
-                }
-            ]
+            "title": rich_text(make_preview(message))
         },
         "Timestamp": {
             "number": timestamp_number
         }
     }
+    if cc:
+        properties["Cc"] = {"rich_text": rich_text(", ".join(cc))}
+    if len(message) > PREVIEW_LENGTH:
+        properties["Truncated"] = {"checkbox": True}
+    if attachments:
+        properties["Attachments"] = {"rich_text": rich_text(json.dumps(attachments, separators=(",", ":")))}
+    return properties
 
-    # Create a new page in the database
-    try:
-        response = notion.pages.create(
-            parent={"database_id": DATABASE_ID},
-            properties=properties
+def create_page(properties, children=None, database_id=None):
+    """
+    Create a page in the database (or the given shard), waiting for the shared Notion rate limiter.
+    children are body blocks; Notion takes at most 100 per request, so the
+    rest are appended in follow-up requests.
+    """
+    children = children or []
+    notion_limiter.acquire()
+    response = notion.pages.create(
+        parent={"database_id": database_id or DATABASE_ID},
+        properties=properties,
+        children=children[:MAX_BLOCKS_PER_REQUEST]
+    )
+    for i in range(MAX_BLOCKS_PER_REQUEST, len(children), MAX_BLOCKS_PER_REQUEST):
+        notion_limiter.acquire()
+        notion.blocks.children.append(
+            block_id=response["id"],
+            children=children[i:i + MAX_BLOCKS_PER_REQUEST]
         )
-        print("Mail sent successfully!\n")
-        
-        # Try to embed the message for semantic search
-        if pc and index:
+    return response
+
+@lru_cache(maxsize=256)
+def fetch_body(page_id):
+    """Fetch the full body stored in a page's blocks. Bodies never change, so they are cached."""
+    parts = []
+    start_cursor = None
+    while True:
+        kwargs = {"block_id": page_id, "page_size": 100}
+        if start_cursor:
+            kwargs["start_cursor"] = start_cursor
+        notion_limiter.acquire()
+        response = notion.blocks.children.list(**kwargs)
+        for block in response.get("results", []):
+            if block.get("type") == "paragraph":
+                parts.extend(part.get("plain_text", "") for part in block["paragraph"].get("rich_text", []))
+        if not response.get("has_more"):
+            return "".join(parts)
+        start_cursor = response.get("next_cursor")
+
+def get_message_body(page):
+    """Return the full text of a message, loading it from the page blocks only if needed."""
+    if "body" in page:
+        # Archived messages carry their full body with them
+        return page["body"]
+    _, message_text = format_message(page["properties"])
+    if is_truncated(page["properties"]):
+        return fetch_body(page["id"])
+    return message_text
+
+def page_to_record(page):
+    """Flatten a message page into a plain record holding its full body (used by archive and backup)."""
+    properties = page["properties"]
+    sender_text, _ = format_message(properties)
+    recipient_parts = properties.get("Recipient", {}).get("rich_text", [])
+    return {
+        "id": page["id"],
+        "sender": sender_text,
+        "recipient": "".join(part.get("plain_text", "") for part in recipient_parts),
+        "cc": format_cc(properties),
+        "attachments": get_attachments(properties),
+        "message": get_message_body(page),
+        "timestamp": get_page_timestamp(page)
+    }
+
+def create_record_page(record):
+    """Recreate a message page from a record, in the shard it belongs to. Returns the new page."""
+    message = record["message"]
+    properties = build_properties(
+        record["sender"],
+        record["recipient"],
+        message,
+        record["timestamp"],
+        cc=parse_recipients(record.get("cc")),
+        attachments=record.get("attachments")
+    )
+    children = build_body_blocks(message) if len(message) > PREVIEW_LENGTH else None
+    page = create_page(properties, children, shard_for_write(record["recipient"], record["timestamp"]))
+    result_cache.bump(record["sender"], record["recipient"])
+    return page
+
+def open_message(page):
+    """Display one message in full, including a body stored in page blocks."""
+    properties = page["properties"]
+    sender_text, _ = format_message(properties)
+    print(render_message(sender_text, get_message_body(page), format_cc(properties), get_attachments(properties)))
+
+def save_attachments(page, directory="."):
+    """
+    Fetch a message's attachments from the blob store into directory.
+    Listings only carry the references; the bytes are read here, on request.
+    Returns the paths written.
+    """
+    refs = get_attachments(page["properties"])
+    if not refs:
+        print("This message has no attachments.")
+    paths = []
+    for ref in refs:
+        try:
+            paths.append(save_attachment(ref, directory))
+            print(f"Saved {paths[-1]}")
+        except (KeyError, ValueError) as e:
+            print(f"Error saving {ref['name']}: {e}")
+    return paths
+
+def embed_message(sender, recipients, message, page_ids, timestamp=None):
+    """
+    Chunk and embed the message once, then upsert the chunk vectors for every
+    recipient page. Every copy shares the same embeddings; only the metadata differs.
+    During an embedding migration this happens once per write version.
+    """
+    chunks = chunk_text(message)
+    passages = [format_passage(sender, ", ".join(recipients), chunk) for chunk in chunks]
+
+    def build_vectors(version):
+        # One batched embedding call for all copies, one vector per chunk per copy
+        values = embed_passages(pc, passages, version)
+        return build_copy_vectors(sender, list(zip(recipients, page_ids)), chunks, values, timestamp)
+
+    write_to_versions(pc, build_vectors)
+
+def send_mail(sender=None, recipient=None, message=None, cc=None, bcc=None, attachments=None):
+    """
+    Send a message to the Notion database.
+    recipient, cc and bcc accept a single name, a comma-separated string or a list.
+    attachments are file paths (a list or a comma-separated string); they are
+    stored once in the local blob store and every copy only references them.
+    One page is created per recipient, concurrently under the Notion rate limiter.
+    CC names are visible to every recipient; BCC names are not.
+    Optionally embed the message in Pinecone for semantic search (once for all copies).
+    Returns True if every copy was sent.
+    """
+    # Get inputs if not provided
+    if sender is None:
+        sender = input("Sender: ").strip()
+    if recipient is None:
+        recipient = input("Recipient(s), comma-separated: ").strip()
+        if cc is None:
+            cc = input("Cc (optional): ").strip()
+        if bcc is None:
+            bcc = input("Bcc (optional): ").strip()
+        if attachments is None:
+            attachments = input("Attachments (file paths, optional): ").strip()
+    if message is None:
+        message = input("Message: ").strip()
+
+    to_list = parse_recipients(recipient)
+    cc_list = parse_recipients(cc)
+    bcc_list = parse_recipients(bcc)
+
+    # Each person gets exactly one copy, even if listed more than once
+    all_recipients = list(dict.fromkeys(to_list + cc_list + bcc_list))
+    if not all_recipients:
+        print("Error sending mail: no recipients given.")
+        return False
+
+    # Store the attachment bytes locally; pages only get the references
+    if isinstance(attachments, str):
+        attachments = attachments.split(",")
+    refs = []
+    for path in [path.strip() for path in attachments or [] if path and path.strip()]:
+        try:
+            refs.append(put_file(path))
+        except OSError as e:
+            print(f"Error sending mail: cannot attach {path}: {e}")
+            return False
+    
+    # Get current time as Unix timestamp
+    now = datetime.now().astimezone()
+    timestamp_number = now.timestamp()
+
+    # Long bodies are stored as blocks; the title only keeps a preview
+    children = build_body_blocks(message) if len(message) > PREVIEW_LENGTH else None
+
+    # Create one page per recipient concurrently
+    page_ids = {}
+    with ThreadPoolExecutor(max_workers=min(MAX_SEND_WORKERS, len(all_recipients))) as executor:
+        futures = {
+            executor.submit(
+                create_page,
+                build_properties(sender, name, message, timestamp_number, cc=cc_list, attachments=refs),
+                children,
+                shard_for_write(name, timestamp_number)
+            ): name
+            for name in all_recipients
+        }
+        for future in as_completed(futures):
+            name = futures[future]
             try:
-                # Format the text for embedding
-                combined_text = f"Sender: {sender}\nRecipient: {recipient}\nMessage: {message}"
-                
-                # Create embedding using Pinecone
-                embedding = pc.inference.embed(
-                    model="llama-text-embed-v2",
-                    inputs=[combined_text],
-                    parameters={"input_type": "passage"}
-                )
-                
-                # Prepare vector for upsert
-                vector = {
-                    "id": response["id"],
-                    "values": embedding[0]["values"],
-                    "metadata": {"text": combined_text}
-                }
-                
-                # Upsert to Pinecone
-                index.upsert(vectors=[vector], namespace="notion_mail")
+                page_ids[name] = future.result()["id"]
             except Exception as e:
-                print(f"Skipping embedding due to error: {e}")
-                print("Message won't be searchable via semantic search.")
-        
-        return True
-    except Exception as e:
-        print(f"Error sending mail: {e}")
+                print(f"Error sending mail to {name}: {e}")
+
+    # Cached listings and searches of everyone involved are now out of date
+    result_cache.bump(sender, *page_ids)
+    if not page_ids:
         return False
+    if len(page_ids) == len(all_recipients):
+        print("Mail sent successfully!\n")
+    else:
+        print(f"Mail sent to {len(page_ids)} of {len(all_recipients)} recipients.\n")
+        
+    # Try to embed the message for semantic search
+    if pc and index:
+        try:
+            delivered = [name for name in all_recipients if name in page_ids]
+            embed_message(sender, delivered, message, [page_ids[name] for name in delivered], timestamp_number)
+        except Exception as e:
+            print(f"Skipping embedding due to error: {e}")
+            print("Message won't be searchable via semantic search.")
+    
+    return len(page_ids) == len(all_recipients)
+
+def build_inbox_filter(user, since=None):
+    """
+    Build the Notion filter for a user's inbox.
+    If since is given, only messages with a Timestamp above it are matched.
+    """
+    recipient_filter = {
+        "property": "Recipient",
+        "rich_text": {
+            "equals": user
+        }
+    }
+    if since is None:
+        return recipient_filter
+    return {
+        "and": [
+            recipient_filter,
+            {"property": "Timestamp", "number": {"greater_than": since}}
+        ]
+    }
+
+def query_all(database_ids=None, **query_kwargs):
+    """
+    Run a database query and follow next_cursor until every page is fetched.
+    Queries every shard (in parallel) unless database_ids narrows them down.
+    """
+    return query_all_shards(notion, database_ids or all_shards(), **query_kwargs)
+
+def get_page_timestamp(page):
+    """Return the Timestamp property of a page (0 if missing)."""
+    return page["properties"].get("Timestamp", {}).get("number") or 0
 
-def read_mail(user=None):
+def fetch_new_mail(user):
     """
-    Retrieve and display messages for a specific recipient.
+    Every message to user above their watermark, newest first.
+    The archive is only consulted if the watermark is older than its cutoff.
+    """
+    watermark = get_watermark(user)
+    results = query_all(
+        database_ids=shards_for_read(recipient=user, since=watermark),
+        filter=build_inbox_filter(user, since=watermark),
+        sorts=NEWEST_FIRST,
+        page_size=100
+    )
+    cutoff = archive_cutoff()
+    if cutoff is not None and watermark < cutoff:
+        results += [record_to_page(record) for record in query_archive(user=user, role="recipient", since=watermark)]
+    return results
+
+def count_unread(user):
+    """
+    Count the messages the user has not seen yet.
+    Only messages above the user's watermark are fetched, so the cost
+    grows with new mail rather than with the size of the mailbox.
+    """
+    return len(fetch_new_mail(user))
+
+def read_mail(user=None, new_only=False, limit=DEFAULT_PAGE_SIZE, start_cursor=None, use_cache=True):
+    """
+    Retrieve and display messages for a specific recipient, newest first.
+    Only the latest `limit` messages are fetched; pass the returned cursor
+    as start_cursor to fetch the next (older) page.
+    With new_only, every message newer than the user's watermark is fetched.
+    The watermark is advanced to the newest message displayed.
+    Pass use_cache=False to always query Notion instead of the result cache.
+    Returns (results, next_cursor); next_cursor is None when nothing is left.
     """
     if user is None:
         user = input("User: ").strip()
 
-    # Query database for matching recipients
-    response = notion.databases.query(
-        database_id=DATABASE_ID,
-        filter={
-            "property": "Recipient",
-            "rich_text": {
-                "equals": user
-            }
-        }
-    )
+    next_cursor = None
+    if new_only:
+        # Query only messages above the watermark
+        results = fetch_new_mail(user)
+        header = f"New messages ({len(results)}):"
+    else:
+        archive_before = parse_archive_cursor(start_cursor)
+        if archive_before is not None:
+            # Paging has reached back past the live database into the archive
+            results, next_cursor = archive_page(user, "recipient", archive_before, limit)
+        else:
+            def fetch_inbox():
+                # Let Notion sort and limit the page instead of fetching the whole inbox
+                results, next_cursor = query_shards(
+                    notion,
+                    shards_for_read(recipient=user),
+                    build_inbox_filter(user),
+                    limit,
+                    start_cursor
+                )
+                return continue_into_archive(results, next_cursor, user, "recipient", limit)
 
-    results = response.get("results", [])
-    print(f"\nMessages ({len(results)}):\n")
+            # Repeated reads are served from the cache until the user's mail changes
+            if use_cache:
+                results, next_cursor = result_cache.cached(
+                    "read_mail", user, {"limit": limit, "cursor": start_cursor}, fetch_inbox
+                )
+            else:
+                results, next_cursor = fetch_inbox()
+            results = list(results)
+        if start_cursor:
+            header = f"Older messages ({len(results)}):"
+        else:
+            header = f"Latest messages ({len(results)}):"
     
-    for page in results:
+    # Build the whole screen and print it in one call
+    lines = [f"\n{header}\n"]
+    for number, page in enumerate(results, start=1):
         sender_text, message_text = format_message(page["properties"])
-        print_message(sender_text, message_text)
+        lines.append(f"#{number} " + render_message(
+            sender_text, message_text, format_cc(page["properties"]), get_attachments(page["properties"])
+        ))
     
     if not results:
-        print("No messages found.\n")
+        lines.append("No new messages.\n" if new_only else "No messages found.\n")
+    else:
+        set_watermark(user, max(get_page_timestamp(page) for page in results))
+    if next_cursor:
+        lines.append("(older messages available)")
+    print("\n".join(lines))
     
-    return results
+    return results, next_cursor
 
 def main():
     """Main CLI loop for the application."""
@@ -154,6 +439,7 @@ def main():
         print("\nPlease select an option:")
         print("- send: Send mail to a user.")
         print("- read: Check a user's mail.")
+        print("- read --new: Check only mail received since the last check.")
         print("- exit: Exit the application.\n")
 
         option = input("$ ").strip().lower()
@@ -162,11 +448,13 @@ def main():
             send_mail()
         elif option == "read":
             read_mail()
+        elif option == "read --new":
+            read_mail(new_only=True)
         elif option == "exit":
             print("Exiting NotionMail. Goodbye!")
             break
         else:
-            print("Invalid option. Please choose 'send', 'read', or 'exit'.")
+            print("Invalid option. Please choose 'send', 'read', 'read --new', or 'exit'.")
 
 if __name__ == "__main__":
     main()
\ No newline at end of file
@@ -0,0 +1,184 @@
+# batch.py
+import argparse
+import json
+import sys
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from basic_functionality import DATABASE_ID, notion, get_page_timestamp, read_mail, send_mail
+from search import search_command
+from semantic_search import semantic_search
+from utils import DEFAULT_PAGE_SIZE, capture_output, format_message
+
+# Commands run at once. Notion calls still wait for the shared rate limiter,
+# so more workers mostly overlap embedding and Pinecone latency.
+BATCH_WORKERS = 4
+
+class InvalidCommand(Exception):
+    """Raised for a batch line that cannot be run."""
+
+def require(params, name):
+    """Return a required parameter; the primitives would otherwise prompt for it."""
+    value = params.get(name)
+    if value is None or value == "":
+        raise InvalidCommand(f"Missing required parameter: {name}")
+    return value
+
+def page_summary(page):
+    sender_text, message_text = format_message(page["properties"])
+    return {"id": page["id"], "sender": sender_text, "preview": message_text, "timestamp": get_page_timestamp(page)}
+
+def run_command(command, user):
+    """
+    Run one command of the chat `commands` shape as user.
+    Returns (printed output, JSON-serializable result).
+    """
+    action = command.get("action", "").lower()
+    params = command.get("params", {})
+    if action == "send":
+        return capture_output(
+            send_mail,
+            sender=user,
+            recipient=require(params, "recipient"),
+            message=require(params, "message"),
+            cc=params.get("cc") or "",
+            bcc=params.get("bcc") or "",
+            attachments=params.get("attachments") or []
+        )
+    if action in ("read", "search"):
+        if action == "read":
+            output, (pages, next_cursor) = capture_output(
+                read_mail,
+                user=user,
+                new_only=bool(params.get("new", False)),
+                limit=params.get("limit") or DEFAULT_PAGE_SIZE,
+                start_cursor=params.get("cursor")
+            )
+        else:
+            output, (pages, next_cursor) = capture_output(
+                search_command,
+                notion,
+                DATABASE_ID,
+                search_term=params.get("keyword", ""),
+                current_user=user,
+                limit=params.get("limit") or DEFAULT_PAGE_SIZE,
+                start_cursor=params.get("cursor"),
+                since=params.get("since"),
+                until=params.get("until"),
+                sender=params.get("from")
+            )
+        return output, {"messages": [page_summary(page) for page in pages], "cursor": next_cursor}
+    if action == "semantic_search":
+        return capture_output(
+            semantic_search,
+            query=require(params, "query"),
+            current_user=user,
+            top_k=params.get("top_k") or 3,
+            since=params.get("since"),
+            until=params.get("until"),
+            sender=params.get("from")
+        )
+    if action == "summarize":
+        # Imported here so batches without summaries do not need the OpenAI client
+        from openai import OpenAI
+        from summarize import SUMMARIZE_LIMIT, summarize_inbox
+        return capture_output(
+            summarize_inbox,
+            OpenAI(),
+            user,
+            limit=params.get("limit") or SUMMARIZE_LIMIT,
+            since=params.get("since"),
+            until=params.get("until"),
+            sender=params.get("from"),
+            focus=params.get("focus")
+        )
+    raise InvalidCommand(f"Unknown action: {action}")
+
+def timed_run(line_number, command, default_user):
+    """Run one batch line and build its result record, never raising."""
+    record = {"line": line_number, "action": command.get("action")}
+    started = time.monotonic()
+    try:
+        user = command.get("user") or default_user
+        if not user:
+            raise InvalidCommand("No user given (set \"user\" on the line or pass --user)")
+        output, result = run_command(command, user)
+        record.update(ok=True, output=output, result=result)
+    except Exception as e:
+        record.update(ok=False, error=str(e) or type(e).__name__)
+    record["elapsed_ms"] = round((time.monotonic() - started) * 1000, 1)
+    return record
+
+def read_commands(lines):
+    """Yield (line number, command) for every non-empty line; invalid JSON yields an error string."""
+    for line_number, line in enumerate(lines, start=1):
+        line = line.strip()
+        if not line:
+            continue
+        try:
+            command = json.loads(line)
+        except json.JSONDecodeError as e:
+            yield line_number, f"Invalid JSON: {e}"
+            continue
+        if not isinstance(command, dict):
+            yield line_number, "Each line must be a JSON object"
+            continue
+        yield line_number, command
+
+def run_batch(lines, out, user=None, workers=BATCH_WORKERS):
+    """
+    Run JSONL commands from lines with `workers` at a time and write one JSONL
+    result per command to out as soon as it finishes (so in completion order;
+    each result carries its input line number). Input is read as the batch
+    runs, so it can be streamed. Returns (succeeded, failed).
+    """
+    counts = {True: 0, False: 0}
+
+    def write(records):
+        for record in records:
+            counts[record["ok"]] += 1
+            out.write(json.dumps(record, default=str) + "\n")
+        out.flush()
+
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        pending = set()
+        for line_number, command in read_commands(lines):
+            if isinstance(command, str):
+                write([{"line": line_number, "ok": False, "error": command}])
+                continue
+            pending.add(executor.submit(timed_run, line_number, command, user))
+            if len(pending) >= workers * 2:
+                # Keep a bounded number of commands queued
+                done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                write(future.result() for future in done)
+        while pending:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            write(future.result() for future in done)
+    return counts[True], counts[False]
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Run mail commands from a JSONL file, one {\"action\", \"params\"} object per line"
+    )
+    parser.add_argument("input", nargs="?", default="-", help="JSONL file of commands (default: stdin)")
+    parser.add_argument("--user", help="User to run the commands as, unless a line sets \"user\"")
+    parser.add_argument("--workers", type=int, default=BATCH_WORKERS)
+    parser.add_argument("--output", default="-", help="Where to write the JSONL results (default: stdout)")
+    args = parser.parse_args()
+
+    lines = sys.stdin if args.input == "-" else open(args.input, "r")
+    out = sys.stdout if args.output == "-" else open(args.output, "w")
+    started = time.monotonic()
+    try:
+        succeeded, failed = run_batch(lines, out, args.user, args.workers)
+    finally:
+        if lines is not sys.stdin:
+            lines.close()
+        if out is not sys.stdout:
+            out.close()
+    elapsed = time.monotonic() - started
+    total = succeeded + failed
+    print(f"{total} commands ({succeeded} ok, {failed} failed) in {elapsed:.1f}s"
+          f"{f', {total / elapsed:.1f}/s' if elapsed else ''} with {args.workers} workers", file=sys.stderr)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,68 @@
+# bench_async.py
+import argparse
+import asyncio
+import statistics
+import time
+from concurrent.futures import ThreadPoolExecutor
+from async_mail import AsyncMail
+from basic_functionality import read_mail
+from utils import capture_output
+
+def summarize(label, users, latencies, elapsed):
+    """Print throughput and latency percentiles for one run."""
+    latencies = sorted(latencies)
+    p95 = latencies[int(0.95 * (len(latencies) - 1))]
+    print(f"{label:<14} users={users:<4} requests={len(latencies):<5} "
+          f"throughput={len(latencies) / elapsed:7.2f} req/s  "
+          f"p50={statistics.median(latencies) * 1000:7.1f} ms  p95={p95 * 1000:7.1f} ms")
+
+def run_sync(users, requests_per_user, threads):
+    """
+    Serve every user's inbox reads with the blocking primitive on a thread pool.
+    The result cache is bypassed, as the async path has none.
+    """
+    def one_read(user):
+        start = time.perf_counter()
+        capture_output(read_mail, user=user, use_cache=False)
+        return time.perf_counter() - start
+
+    jobs = [user for user in users for _ in range(requests_per_user)]
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=threads) as executor:
+        latencies = list(executor.map(one_read, jobs))
+    return latencies, time.perf_counter() - start
+
+async def run_async(users, requests_per_user):
+    """Serve every user's inbox reads concurrently from a single event loop."""
+    async with AsyncMail() as mail:
+        async def one_read(user):
+            start = time.perf_counter()
+            await mail.read_mail(user)
+            return time.perf_counter() - start
+
+        start = time.perf_counter()
+        latencies = await asyncio.gather(*[
+            one_read(user) for user in users for _ in range(requests_per_user)
+        ])
+    return list(latencies), time.perf_counter() - start
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare concurrent users served by the sync and async mail paths")
+    parser.add_argument("--users", type=int, nargs="+", default=[1, 10, 50, 100], help="Concurrent user counts to try")
+    parser.add_argument("--requests", type=int, default=3, help="Inbox reads per user")
+    parser.add_argument("--threads", type=int, default=8, help="Worker threads for the sync path")
+    parser.add_argument("--names", nargs="+", default=["Alice", "Bob", "Charlie"],
+                        help="Mailbox names the simulated users cycle through")
+    args = parser.parse_args()
+
+    print("Note: both paths share the Notion rate limiter, so throughput is capped at its rate;")
+    print("the comparison shows how many users each path can keep waiting on it cheaply.\n")
+    for count in args.users:
+        users = [args.names[i % len(args.names)] for i in range(count)]
+        latencies, elapsed = run_sync(users, args.requests, args.threads)
+        summarize("sync/threads", count, latencies, elapsed)
+        latencies, elapsed = asyncio.run(run_async(users, args.requests))
+        summarize("async", count, latencies, elapsed)
+
+if __name__ == "__main__":
+    main()
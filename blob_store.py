@@ -0,0 +1,148 @@
+# blob_store.py
+import argparse
+import hashlib
+import json
+import os
+import tempfile
+import zlib
+
+# Content-addressed store for attachment bytes. Files are split into chunks
+# stored once under the SHA-256 of their content, and a manifest per file
+# (also named by its SHA-256) lists the chunks. Message pages only hold
+# {"name", "hash", "size"} references, so the same file sent to many
+# recipients, or sent twice, is stored once.
+BLOB_DIR = "blobs"
+CHUNK_DIR = os.path.join(BLOB_DIR, "chunks")
+MANIFEST_DIR = os.path.join(BLOB_DIR, "manifests")
+
+# Chunk size for deduplication; files sharing aligned chunks share storage
+BLOB_CHUNK_SIZE = 256 * 1024
+
+# Compress chunks with zlib when it actually makes them smaller
+COMPRESS_BLOBS = True
+
+COMPRESSED_SUFFIX = ".z"
+
+def _chunk_path(digest):
+    return os.path.join(CHUNK_DIR, digest[:2], digest)
+
+def _manifest_path(digest):
+    return os.path.join(MANIFEST_DIR, digest[:2], f"{digest}.json")
+
+def _write_atomic(path, data):
+    """
+    Write a file atomically. Every writer gets its own temp file, so concurrent
+    writers of the same content (threads or processes) are harmless; paths are
+    content-addressed, so a destination that already exists holds the same bytes.
+    """
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), prefix=os.path.basename(path) + ".", suffix=".tmp")
+    try:
+        with os.fdopen(fd, "wb") as f:
+            f.write(data)
+        os.replace(tmp_path, path)
+    except OSError:
+        # On Windows replacing a file another writer has open fails
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        if not os.path.exists(path):
+            raise
+
+def _put_chunk(data, compress):
+    digest = hashlib.sha256(data).hexdigest()
+    path = _chunk_path(digest)
+    if os.path.exists(path) or os.path.exists(path + COMPRESSED_SUFFIX):
+        return digest
+    if compress:
+        packed = zlib.compress(data, 6)
+        if len(packed) < len(data):
+            _write_atomic(path + COMPRESSED_SUFFIX, packed)
+            return digest
+    _write_atomic(path, data)
+    return digest
+
+def _get_chunk(digest):
+    path = _chunk_path(digest)
+    if os.path.exists(path + COMPRESSED_SUFFIX):
+        with open(path + COMPRESSED_SUFFIX, "rb") as f:
+            return zlib.decompress(f.read())
+    with open(path, "rb") as f:
+        return f.read()
+
+def put_file(path, compress=COMPRESS_BLOBS):
+    """
+    Store a file and return its reference {"name", "hash", "size"}.
+    The file is read and chunked incrementally, so large files are never held in memory.
+    """
+    file_hash = hashlib.sha256()
+    chunks = []
+    size = 0
+    with open(path, "rb") as f:
+        while True:
+            data = f.read(BLOB_CHUNK_SIZE)
+            if not data:
+                break
+            file_hash.update(data)
+            chunks.append(_put_chunk(data, compress))
+            size += len(data)
+
+    digest = file_hash.hexdigest()
+    manifest_path = _manifest_path(digest)
+    if not os.path.exists(manifest_path):
+        _write_atomic(manifest_path, json.dumps({"size": size, "chunks": chunks}).encode())
+    return {"name": os.path.basename(path), "hash": digest, "size": size}
+
+def get_bytes(digest):
+    """Return the content of a stored file, verifying it against its hash."""
+    try:
+        with open(_manifest_path(digest), "rb") as f:
+            manifest = json.load(f)
+    except FileNotFoundError:
+        raise KeyError(f"Attachment {digest[:12]} is not in the local blob store")
+    data = b"".join(_get_chunk(chunk) for chunk in manifest["chunks"])
+    if hashlib.sha256(data).hexdigest() != digest:
+        raise ValueError(f"Attachment {digest[:12]} is corrupt")
+    return data
+
+def save_attachment(ref, directory="."):
+    """Write an attachment into directory under its original name and return the path."""
+    os.makedirs(directory, exist_ok=True)
+    path = os.path.join(directory, os.path.basename(ref["name"]))
+    with open(path, "wb") as f:
+        f.write(get_bytes(ref["hash"]))
+    return path
+
+def store_stats():
+    """Return (files, logical bytes, chunks, stored bytes) for the whole store."""
+    files = logical = chunks = stored = 0
+    for root, _, names in os.walk(MANIFEST_DIR):
+        for name in names:
+            with open(os.path.join(root, name), "rb") as f:
+                logical += json.load(f)["size"]
+            files += 1
+    for root, _, names in os.walk(CHUNK_DIR):
+        for name in names:
+            stored += os.path.getsize(os.path.join(root, name))
+            chunks += 1
+    return files, logical, chunks, stored
+
+def main():
+    parser = argparse.ArgumentParser(description="Inspect the local attachment store")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    subparsers.add_parser("stats", help="Show how much space deduplication and compression save")
+    get_parser = subparsers.add_parser("get", help="Write a stored attachment to a file")
+    get_parser.add_argument("hash")
+    get_parser.add_argument("output")
+    args = parser.parse_args()
+
+    if args.command == "stats":
+        files, logical, chunks, stored = store_stats()
+        ratio = logical / stored if stored else 1.0
+        print(f"{files} files ({logical} bytes) stored as {chunks} chunks ({stored} bytes), {ratio:.2f}x saving")
+    else:
+        with open(args.output, "wb") as f:
+            f.write(get_bytes(args.hash))
+        print(f"Wrote {args.output}")
+
+if __name__ == "__main__":
+    main()
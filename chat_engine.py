@@ -0,0 +1,225 @@
+# chat_engine.py
+import json
+from datetime import date
+from dotenv import load_dotenv
+from basic_functionality import send_mail, read_mail
+from search import search_command
+from semantic_search import semantic_search
+from summarize import SUMMARIZE_LIMIT, summarize_inbox
+from chat_memory import ConversationMemory
+from intent_router import route, template_answer
+from utils import capture_output
+from openai import OpenAI
+
+# Initialize OpenAI client
+load_dotenv()
+openai_client = OpenAI()
+
+def new_memory():
+    """A fresh token-budgeted memory for one chat session."""
+    return ConversationMemory(openai_client)
+
+def load_documentation():
+    """Load the command documentation given to the AI as its system prompt."""
+    try:
+        with open("documentation.txt", "r") as f:
+            return f.read()
+    except Exception as e:
+        print("Error loading documentation.txt:", e)
+    return (
+        "You are an assistant that can control a mail system. The available commands are:\n"
+        "- \"send\": Sends an email. Requires parameters: \"recipient\" (a name or a list of names) and \"message\". "
+        "Optional parameters: \"cc\" and \"bcc\" (lists of names), \"attachments\" (a list of relative file paths).\n"
+        "- \"read\": Reads all emails for the logged-in user. Optional parameter: \"new\" (true to read only emails received since the last check).\n"
+        "- \"search\": Searches emails by keyword. Requires parameter: \"keyword\". "
+        "Optional parameters: \"from\" (sender name), \"since\" and \"until\" (dates as YYYY-MM-DD, inclusive). "
+        "\"keyword\" may be left out when one of the optional parameters is given.\n"
+        "- \"semantic_search\": Performs semantic search on emails. Requires parameter: \"query\". "
+        "Optional parameters: \"from\", \"since\" and \"until\", as for \"search\".\n"
+        "- \"summarize\": Summarizes the user's received emails. Optional parameters: \"from\", \"since\" and "
+        "\"until\" as for \"search\", \"limit\" (newest emails to include, default 100) and \"focus\" (what to concentrate on).\n\n"
+        "When given a natural language prompt, output a JSON object with a key \"commands\" "
+        "that is a list of command objects. For example:\n"
+        "{\"commands\": [{\"action\": \"read\", \"params\": {}}]}"
+    )
+
+def get_ai_instructions(user_prompt, documentation, memory=None):
+    """
+    Uses GPT-4o-mini to interpret the user's prompt and generate structured commands.
+    With a memory, earlier turns are included so follow-ups can refer back to them.
+    Returns a JSON object with a "commands" list.
+    """
+    # The date lets the model turn "last week" into since/until filters
+    messages = [{"role": "system", "content": f"{documentation}\n\nToday is {date.today():%Y-%m-%d}."}]
+    context = memory.context() if memory else ""
+    if context:
+        messages.append({"role": "system", "content": f"Conversation so far:\n{context}"})
+    messages.append({"role": "user", "content": user_prompt})
+    response = openai_client.chat.completions.create(
+        model="gpt-4o-mini",
+        messages=messages,
+        temperature=0
+    )
+    if memory:
+        memory.record_usage("plan", response)
+    content = response.choices[0].message.content.strip()
+    try:
+        instruction = json.loads(content)
+        if "commands" not in instruction:
+            instruction = {"commands": []}
+    except json.JSONDecodeError:
+        print(f"Warning: Could not parse JSON from AI response: {content}")
+        instruction = {"commands": []}
+    return instruction
+
+def execute_commands(commands, notion, database_id, current_user, memory=None, resolve_attachment=None):
+    """
+    Executes each command in the provided list and returns the combined output.
+    Supported actions: send, read, search, semantic_search, summarize.
+    Attachment names come from the model; with resolve_attachment (which
+    returns a path, or raises ValueError for names that are not allowed) every
+    one is resolved through it, and a send naming a refused file is not made.
+    """
+    output = ""
+    for cmd in commands:
+        action = cmd.get("action", "").lower()
+        params = cmd.get("params", {})
+        
+        if action == "send":
+            recipient = params.get("recipient", "")
+            message = params.get("message", "")
+            attachments = params.get("attachments", [])
+            if resolve_attachment is not None and attachments:
+                if isinstance(attachments, str):
+                    attachments = [name for name in attachments.split(",") if name.strip()]
+                try:
+                    attachments = [resolve_attachment(name) for name in attachments]
+                except ValueError as e:
+                    output += f"Error: message not sent: {e}\n"
+                    continue
+            captured_output, _ = capture_output(
+                send_mail, 
+                sender=current_user, 
+                recipient=recipient, 
+                message=message,
+                cc=params.get("cc", ""),
+                bcc=params.get("bcc", ""),
+                attachments=attachments
+            )
+            output += captured_output + "\n"
+            
+        elif action == "read":
+            captured_output, _ = capture_output(
+                read_mail, 
+                user=current_user,
+                new_only=bool(params.get("new", False))
+            )
+            output += captured_output + "\n"
+            
+        elif action == "search":
+            term = params.get("keyword", "")
+            captured_output, _ = capture_output(
+                search_command, 
+                notion, 
+                database_id, 
+                search_term=term, 
+                current_user=current_user,
+                since=params.get("since"),
+                until=params.get("until"),
+                sender=params.get("from")
+            )
+            output += captured_output + "\n"
+            
+        elif action == "semantic_search":
+            query = params.get("query", "")
+            captured_output, _ = capture_output(
+                semantic_search, 
+                query=query, 
+                current_user=current_user,
+                since=params.get("since"),
+                until=params.get("until"),
+                sender=params.get("from")
+            )
+            output += captured_output + "\n"
+            
+        elif action == "summarize":
+            # Map-reduce over the inbox, so only the overview reaches the final answer
+            captured_output, _ = capture_output(
+                summarize_inbox,
+                openai_client,
+                current_user,
+                limit=params.get("limit") or SUMMARIZE_LIMIT,
+                since=params.get("since"),
+                until=params.get("until"),
+                sender=params.get("from"),
+                focus=params.get("focus"),
+                memory=memory
+            )
+            output += captured_output + "\n"
+
+        else:
+            output += f"Unknown action: {action}\n"
+            
+    return output
+
+def get_final_answer(command_output, user_prompt, documentation, current_user, memory=None):
+    """
+    Uses GPT-4o-mini to generate a conversational answer based on
+    the command output and original user prompt.
+    """
+    messages = [
+        {"role": "system", "content": f"You are a concise email assistant for {current_user}. Address {current_user} directly in first person. Keep your responses brief but informative. Include only the most relevant information from the email operations. Don't use unnecessary words or explanations."}
+    ]
+    context = memory.context() if memory else ""
+    if context:
+        messages.append({"role": "system", "content": f"Conversation so far:\n{context}"})
+    messages.append(
+        {"role": "user", "content": f"User prompt: {user_prompt}\n\nCommand output:\n{command_output}\n\nProvide a concise, direct answer. Remember you're talking to {current_user}."}
+    )
+    response = openai_client.chat.completions.create(
+        model="gpt-4o-mini",
+        messages=messages,
+        temperature=0.7
+    )
+    if memory:
+        memory.record_usage("answer", response)
+    return response.choices[0].message.content.strip()
+
+def chat_turn(user_query, documentation, notion, database_id, current_user, memory=None, resolve_attachment=None):
+    """
+    Runs one chat turn: plan commands, execute them and phrase the answer.
+    Common one-step prompts are planned (and, for reads and sends, answered)
+    locally by the intent router; only the rest go to the LLM. Routed turns
+    are marked with "router": "local" in the returned instruction.
+    With a ConversationMemory the turn sees (and is added to) the session so far,
+    and its token usage is left in memory.usage.
+    resolve_attachment is passed on to execute_commands.
+    Returns (instruction, final_answer).
+    """
+    if memory:
+        memory.start_turn()
+
+    # Try the local fast path before asking the AI for structured instructions
+    instruction, _ = route(user_query)
+    if instruction:
+        instruction["router"] = "local"
+    else:
+        instruction = get_ai_instructions(user_query, documentation, memory)
+    commands = instruction.get("commands", [])
+
+    # Execute the commands
+    if commands:
+        command_output = execute_commands(commands, notion, database_id, current_user, memory, resolve_attachment)
+    else:
+        command_output = "No valid commands were generated."
+
+    # Generate final conversational answer with updated prompt and pass current_user
+    final_answer = None
+    if instruction.get("router") == "local":
+        final_answer = template_answer(instruction, command_output)
+    if final_answer is None:
+        final_answer = get_final_answer(command_output, user_query, documentation, current_user, memory)
+
+    if memory:
+        memory.add_turn(user_query, instruction, command_output, final_answer)
+    return instruction, final_answer
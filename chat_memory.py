@@ -0,0 +1,156 @@
+# chat_memory.py
+import hashlib
+import json
+import threading
+
+try:
+    import tiktoken
+    _encoding = tiktoken.get_encoding("o200k_base")
+except ImportError:
+    _encoding = None
+
+SUMMARY_MODEL = "gpt-4o-mini"
+
+# Token budget for everything the memory adds to a prompt
+MEMORY_TOKEN_BUDGET = 1500
+
+# Turns kept verbatim; older turns are folded into the running summary
+RECENT_TURNS = 4
+
+# Command outputs longer than this are replaced by a cached summary
+OUTPUT_TOKEN_LIMIT = 300
+
+# Target length of the running summary of older turns
+SUMMARY_TOKEN_LIMIT = 300
+
+def count_tokens(text):
+    """Tokens in text (roughly 4 characters per token without tiktoken)."""
+    if _encoding:
+        return len(_encoding.encode(text))
+    return (len(text) + 3) // 4
+
+class ConversationMemory:
+    """
+    Memory of one chat session that fits a fixed token budget.
+    The last RECENT_TURNS turns are kept verbatim; older turns are folded into
+    a running summary, and large command outputs are summarized once (cached
+    by content) before they are stored, so the context added to each prompt
+    stays bounded however long the session runs.
+    Token usage of the current turn's model calls is collected in `usage`.
+    """
+
+    def __init__(self, openai_client, budget=MEMORY_TOKEN_BUDGET, recent_turns=RECENT_TURNS,
+                 output_limit=OUTPUT_TOKEN_LIMIT):
+        self.openai_client = openai_client
+        self.budget = budget
+        self.recent_turns = recent_turns
+        self.output_limit = output_limit
+        self.summary = ""
+        self.turns = []
+        self.output_summaries = {}
+        self.usage = {}
+        self.lock = threading.Lock()
+
+    def start_turn(self):
+        """Reset the per-turn token usage."""
+        self.usage = {}
+
+    def record_usage(self, stage, response):
+        """Add the token usage of one chat completion to the current turn."""
+        if not getattr(response, "usage", None):
+            return
+        prompt_tokens, completion_tokens = self.usage.get(stage, (0, 0))
+        self.usage[stage] = (
+            prompt_tokens + response.usage.prompt_tokens,
+            completion_tokens + response.usage.completion_tokens
+        )
+
+    def _complete(self, stage, instructions, text):
+        response = self.openai_client.chat.completions.create(
+            model=SUMMARY_MODEL,
+            messages=[
+                {"role": "system", "content": instructions},
+                {"role": "user", "content": text}
+            ],
+            temperature=0
+        )
+        self.record_usage(stage, response)
+        return response.choices[0].message.content.strip()
+
+    def compress_output(self, output):
+        """Return a command output, summarized (and cached) if it is over the output limit."""
+        if count_tokens(output) <= self.output_limit:
+            return output
+        key = hashlib.sha1(output.encode()).hexdigest()
+        if key not in self.output_summaries:
+            self.output_summaries[key] = self._complete(
+                "memory",
+                f"Summarize this mail command output in at most {self.output_limit // 2} words. "
+                "Keep the numbering of listed messages with their sender, recipient and date "
+                "so the user can refer back to them.",
+                output
+            )
+        return self.output_summaries[key]
+
+    def _fold_into_summary(self, turns):
+        """Merge evicted turns into the running summary."""
+        text = ""
+        if self.summary:
+            text += f"Summary so far:\n{self.summary}\n\n"
+        text += "New turns:\n" + "\n\n".join(render_turn(turn) for turn in turns)
+        self.summary = self._complete(
+            "memory",
+            f"Update the summary of this email assistant conversation in at most "
+            f"{SUMMARY_TOKEN_LIMIT // 2} words. Keep names, message numbers and "
+            "anything the user may refer back to.",
+            text
+        )
+
+    def add_turn(self, user_prompt, instruction, command_output, answer):
+        """Store a finished turn, then shrink the memory back under the budget."""
+        with self.lock:
+            self.turns.append({
+                "user": user_prompt,
+                "commands": instruction.get("commands", []),
+                "output": self.compress_output(command_output),
+                "answer": answer
+            })
+            evicted = []
+            while len(self.turns) > 1 and (
+                len(self.turns) > self.recent_turns or count_tokens(self._render()) > self.budget
+            ):
+                evicted.append(self.turns.pop(0))
+            if evicted:
+                self._fold_into_summary(evicted)
+
+    def _render(self):
+        parts = []
+        if self.summary:
+            parts.append(f"Summary of earlier conversation:\n{self.summary}")
+        parts.extend(render_turn(turn) for turn in self.turns)
+        return "\n\n".join(parts)
+
+    def context(self):
+        """The conversation so far, as text to include in a prompt ("" if empty)."""
+        with self.lock:
+            return self._render()
+
+    def context_tokens(self):
+        return count_tokens(self.context())
+
+def render_turn(turn):
+    return (
+        f"User: {turn['user']}\n"
+        f"Commands: {json.dumps(turn['commands'])}\n"
+        f"Results:\n{turn['output'].strip()}\n"
+        f"Assistant: {turn['answer']}"
+    )
+
+def format_usage(usage, context_tokens=None, budget=MEMORY_TOKEN_BUDGET):
+    """One-line report of a turn's token usage."""
+    parts = [f"{stage}: {prompt} in / {completion} out" for stage, (prompt, completion) in usage.items()]
+    total = sum(prompt + completion for prompt, completion in usage.values())
+    line = ", ".join(parts + [f"total: {total}"])
+    if context_tokens is not None:
+        line += f" (memory {context_tokens}/{budget} tokens)"
+    return line
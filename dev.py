@@ -1,9 +1,11 @@
 # dev.py
 import os
 import json
-from collections import Counter
+import argparse
 from dotenv import load_dotenv
 from notion_client import Client
+from analytics import MessageColumns, print_report
+from shards import all_shards, load_shard_config, save_shard_config
 
 # Load environment variables from .env file
 load_dotenv()
@@ -31,30 +33,31 @@ def check_database_exists():
     except Exception:
         return False
 
-def create_database():
+def create_database(title="NotionMail Database", save_to_env=True):
     """Create a new Notion database based on schema.json"""
     schema = load_schema()
     
     # Create database in user's Notion workspace
     response = notion.databases.create(
         parent={"type": "page_id", "page_id": input("Enter parent page ID: ")},
-        title=[{"type": "text", "text": {"content": "NotionMail Database"}}],
+        title=[{"type": "text", "text": {"content": title}}],
         properties=schema["properties"]
     )
     
-    # Save the new database ID to .env file
-    with open(".env", "a") as f:
-        f.write(f"\nDATABASE_ID={response['id']}")
-    
     print(f"Database created with ID: {response['id']}")
-    print("Updated .env file with the new DATABASE_ID")
+
+    # Save the new database ID to .env file
+    if save_to_env:
+        with open(".env", "a") as f:
+            f.write(f"\nDATABASE_ID={response['id']}")
+        print("Updated .env file with the new DATABASE_ID")
     
     return response["id"]
 
-def validate_database_schema():
+def validate_database_schema(database_id=None):
     """Validate that the database schema matches our expected schema"""
     expected_schema = load_schema()["properties"]
-    current_schema = notion.databases.retrieve(database_id=DATABASE_ID)["properties"]
+    current_schema = notion.databases.retrieve(database_id=database_id or DATABASE_ID)["properties"]
     
     # Check if all expected properties exist with correct types
     missing_props = []
@@ -76,10 +79,50 @@ def validate_database_schema():
     
     return True
 
+def create_shards(strategy, count=0, months=()):
+    """
+    Create shard databases from schema.json and record them in shards.json.
+    "recipient" shards are added until there are `count` of them; "month"
+    shards are created for each missing month ("YYYY-MM").
+    Changing the number of recipient shards re-routes existing inboxes, so
+    decide on the count before messages are written.
+    """
+    config = load_shard_config()
+    if config["strategy"] not in ("none", strategy):
+        print(f"Shards already use the '{config['strategy']}' strategy; refusing to mix strategies.")
+        return
+    if config["strategy"] == "none":
+        config = {"strategy": strategy, "shards": [] if strategy == "recipient" else {}}
+
+    if strategy == "recipient":
+        while len(config["shards"]) < count:
+            number = len(config["shards"])
+            config["shards"].append(create_database(title=f"NotionMail Shard {number}", save_to_env=False))
+            save_shard_config(config)
+    else:
+        for month in months:
+            if month not in config["shards"]:
+                config["shards"][month] = create_database(title=f"NotionMail {month}", save_to_env=False)
+                save_shard_config(config)
+
+    print(f"{len(config['shards'])} '{strategy}' shard(s) configured in shards.json")
+
+def validate_shards():
+    """Validate every shard (and DATABASE_ID where it is still used) against schema.json."""
+    valid = True
+    for database_id in all_shards():
+        print(f"Validating {database_id}...")
+        if not validate_database_schema(database_id):
+            valid = False
+    print("All shards match schema.json." if valid else "Some shards do not match schema.json.")
+    return valid
+
 def query_database():
-    """Query the Notion database and return the response."""
-    response = notion.databases.query(database_id=DATABASE_ID)
-    return response
+    """Query the first page of every shard and return the combined response."""
+    results = []
+    for database_id in all_shards():
+        results.extend(notion.databases.query(database_id=database_id).get("results", []))
+    return {"results": results}
 
 def extract_text_from_property(prop):
     """Extract plain text from a Notion property."""
@@ -89,55 +132,24 @@ def extract_text_from_property(prop):
         return "".join([part.get("plain_text", "") for part in prop["title"]])
     return ""
 
-def display_statistics():
+def display_statistics(rebuild=False):
     """
     Display overall statistics:
     - What fields are in the database right now.
-    - How many different senders and recipients.
-    - How many messages sent and received by each person.
+    - How many messages each person sent and received, message volume over
+      time, the busiest sender → recipient pairs and response times.
+    Messages are kept in a local columnar file (see analytics.py), so only
+    pages created since the last run are scanned. With rebuild the file is
+    discarded and every message scanned again, which drops deleted pages.
     """
-    data = query_database()
-    results = data.get("results", [])
-    
-    # Collect all property fields available in the pages
-    fields_set = set()
-    for page in results:
-        properties = page.get("properties", {})
-        for key in properties.keys():
-            fields_set.add(key)
-    
-    print("=" * 50)
-    print("Overall Database Statistics")
-    print("=" * 50)
-    print(f"Total Pages: {len(results)}")
-    print("Fields in database:", ", ".join(sorted(fields_set)))
-    
-    # Counters for messages sent and received
-    sent_counter = Counter()
-    received_counter = Counter()
-    
-    for page in results:
-        properties = page.get("properties", {})
-        sender = extract_text_from_property(properties.get("Sender", {}))
-        recipient = extract_text_from_property(properties.get("Recipient", {}))
-        
-        if sender:
-            sent_counter[sender] += 1
-        if recipient:
-            received_counter[recipient] += 1
-    
-    print("\nUnique Senders:", len(sent_counter))
-    print("Unique Recipients:", len(received_counter))
-    
-    print("\nMessages Sent by Each Person:")
-    for sender, count in sent_counter.most_common():
-        print(f"  {sender}: {count}")
-    
-    print("\nMessages Received by Each Person:")
-    for recipient, count in received_counter.most_common():
-        print(f"  {recipient}: {count}")
-    
-    print("=" * 50)
+    columns = MessageColumns() if rebuild else MessageColumns.load()
+    added = columns.refresh(notion, all_shards())
+    columns.save()
+
+    fields = notion.databases.retrieve(database_id=all_shards()[0])["properties"]
+    print("Fields in database:", ", ".join(sorted(fields)))
+    print(f"Scanned {added} new messages.")
+    print_report(columns)
 
 def display_pretty():
     """
@@ -151,10 +163,41 @@ def display_pretty():
         print(json.dumps(page.get("properties", {}), indent=4))
     print("=" * 50)
 
+def shards_main(args):
+    """Handle `python dev.py shards create|validate ...`."""
+    if args.shard_command == "create":
+        if args.strategy == "recipient" and args.count < 1:
+            print("Please pass --count with the number of recipient shards.")
+            return
+        if args.strategy == "month" and not args.months:
+            print("Please pass --months with the months to create, e.g. 2025-03 2025-04.")
+            return
+        create_shards(args.strategy, count=args.count, months=args.months)
+    elif args.shard_command == "validate":
+        validate_shards()
+
 def main():
     """
     Main function to check, create or validate database, and display statistics.
+    `python dev.py shards ...` manages shard databases instead.
     """
+    parser = argparse.ArgumentParser(description="NotionMail database tools")
+    parser.add_argument("--rebuild", action="store_true",
+                        help="Rescan every message for the statistics instead of only new ones")
+    subparsers = parser.add_subparsers(dest="command")
+    shards_parser = subparsers.add_parser("shards", help="Create or validate shard databases")
+    shard_commands = shards_parser.add_subparsers(dest="shard_command", required=True)
+    create_parser = shard_commands.add_parser("create", help="Create shard databases from schema.json")
+    create_parser.add_argument("--strategy", choices=["recipient", "month"], required=True)
+    create_parser.add_argument("--count", type=int, default=0, help="Number of recipient-hash shards")
+    create_parser.add_argument("--months", nargs="*", default=[], help="Months to create, e.g. 2025-03")
+    shard_commands.add_parser("validate", help="Validate every shard against schema.json")
+    args = parser.parse_args()
+
+    if args.command == "shards":
+        shards_main(args)
+        return
+
     # Check if database exists
     if not check_database_exists():
         print("Database does not exist or cannot be accessed.")
@@ -173,7 +216,7 @@ def main():
         return
     
     # Display statistics
-    display_statistics()
+    display_statistics(rebuild=args.rebuild)
     
     # Uncomment to see detailed page data
     # display_pretty()
@@ -0,0 +1,316 @@
+# embed_versions.py
+import argparse
+import os
+import random
+import statistics
+import time
+from dotenv import load_dotenv
+from pinecone import Pinecone, ServerlessSpec
+from embedding import (
+    embed_passages, embed_query, format_passage, get_version, is_local, load_versions, save_versions, version_index
+)
+from local_embedding import HASHING_MODEL, get_embedder
+from semantic_search import CHUNKS_PER_RESULT, pool_matches
+
+# Load environment variables
+load_dotenv()
+PINECONE_API_KEY = os.environ.get("PINECONE_API_KEY")
+PINECONE_CLOUD = os.environ.get("PINECONE_CLOUD", "aws")
+PINECONE_REGION = os.environ.get("PINECONE_REGION", "us-east-1")
+
+# Local versions can be added and benchmarked without Pinecone
+pc = Pinecone(api_key=PINECONE_API_KEY) if PINECONE_API_KEY else None
+
+# Messages used as known-item queries by `compare` when no query file is given
+COMPARE_SAMPLE = 50
+
+# Generated messages embedded by `bench`, and how many of them are queried
+BENCH_MESSAGES = 500
+BENCH_QUERIES = 50
+
+def require_pinecone(purpose):
+    """Return the Pinecone client, or exit if PINECONE_API_KEY is not set."""
+    if pc is None:
+        raise SystemExit(f"PINECONE_API_KEY is required to {purpose}.")
+    return pc
+
+def check_index_dimension(name, settings):
+    """
+    Refuse a version whose vectors do not fit its index: its dual-writes would
+    fail with only a warning, and after a switch every query would.
+    """
+    if not pc.has_index(settings["index"]):
+        raise SystemExit(f"Index {settings['index']} does not exist; pass --create-index to create it.")
+    index_dimension = version_index(pc, settings).describe_index_stats()["dimension"]
+    # Models with a default output size are asked for one vector to find it
+    dimension = settings["dimension"] or len(embed_passages(pc, ["dimension"], settings)[0])
+    if dimension != index_dimension:
+        raise SystemExit(
+            f"Index {settings['index']} holds {index_dimension}-dimensional vectors, but {name} embeds into "
+            f"{dimension}. Pass --index (with --create-index) to give it an index of its own."
+        )
+
+def list_versions():
+    config = load_versions()
+    for name, settings in config["versions"].items():
+        role = "active" if name == config["active"] else "shadow" if name == config.get("shadow") else ""
+        dimension = settings.get("dimension") or "model default"
+        print(f"{name:<8} {role:<7} provider={settings.get('provider', 'pinecone')} "
+              f"model={settings['model']} dimension={dimension} "
+              f"index={settings['index']} namespace={settings['namespace']}")
+
+def add_version(name, model, dimension=None, index_name=None, namespace=None, create_index=False,
+                provider="pinecone"):
+    """
+    Register a new embedding version and make it the shadow, so every new
+    message is dual-written to it from now on. Backfill it next.
+    With provider "local" the version is embedded on this machine instead of
+    by Pinecone's inference API (see local_embedding.py).
+    """
+    config = load_versions()
+    if name in config["versions"]:
+        raise SystemExit(f"Embedding version {name} already exists.")
+    if config.get("shadow"):
+        raise SystemExit(f"Version {config['shadow']} is already the shadow; switch to it or retire it first.")
+
+    if provider == "local":
+        # Loads the model once, which also checks the dimension against it
+        try:
+            dimension = get_embedder(model, dimension).dimension
+        except (RuntimeError, ValueError) as e:
+            raise SystemExit(str(e))
+    active = get_version()
+    settings = {
+        "provider": provider,
+        "model": model,
+        "dimension": dimension,
+        "index": index_name or active["index"],
+        "namespace": namespace or f"{active['namespace']}_{name}"
+    }
+    if create_index and not require_pinecone("create an index").has_index(settings["index"]):
+        if not dimension:
+            raise SystemExit("--dimension is required to create an index.")
+        pc.create_index(
+            name=settings["index"],
+            dimension=dimension,
+            metric="cosine",
+            spec=ServerlessSpec(cloud=PINECONE_CLOUD, region=PINECONE_REGION)
+        )
+        print(f"Created index {settings['index']} ({dimension} dimensions).")
+    elif pc is None:
+        if settings["index"] == active["index"] and dimension != active.get("dimension"):
+            # Without Pinecone only the active version's settings can be compared
+            raise SystemExit(
+                f"{name} embeds into {dimension or 'the model default'} dimensions, unlike the active version's index "
+                f"{active['index']}. Pass --index (with --create-index) to give it an index of its own."
+            )
+        print("PINECONE_API_KEY is not set, so the index dimension was not checked.")
+    else:
+        check_index_dimension(name, settings)
+
+    config["versions"][name] = settings
+    config["shadow"] = name
+    save_versions(config)
+    print(f"Added version {name}; new messages are now also embedded with {model}.")
+    print(f"Run `python embed_versions.py backfill {name}` to embed the existing messages.")
+
+def backfill(name):
+    """Embed every existing message into a version."""
+    # Imported here so the other commands do not need the Notion client
+    from pinecone_embed_all import embed_and_upsert
+    embed_and_upsert(name)
+
+def sample_queries(count):
+    """
+    Known-item queries: the previews of the newest messages, each paired with
+    the page it came from, so recall can be measured without labels.
+    """
+    from basic_functionality import notion
+    from shards import all_shards, query_shards
+    from utils import format_message
+
+    pages, _ = query_shards(notion, all_shards(), None, count)
+    return [(format_message(page["properties"])[1], page["id"]) for page in pages]
+
+def search_version(version, query, top_k):
+    """Return (page IDs of the top_k pooled hits, seconds taken) for one version."""
+    started = time.monotonic()
+    query_vector = embed_query(pc, query, version)
+    results = version_index(pc, version).query(
+        namespace=version["namespace"],
+        vector=query_vector,
+        top_k=top_k * CHUNKS_PER_RESULT,
+        include_values=False,
+        include_metadata=True
+    )
+    elapsed = time.monotonic() - started
+    return [hit["id"] for hit in pool_matches(results["matches"])[:top_k]], elapsed
+
+def percentile(values, fraction):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(fraction * len(ordered)))]
+
+def compare(names, queries_file=None, top_k=10):
+    """
+    Compare versions on the same queries: known-item recall@k (for sampled
+    queries), overlap of their top-k results with the first version, and latency.
+    """
+    versions = [get_version(name) for name in names]
+    require_pinecone("query the indexes")
+    if queries_file:
+        with open(queries_file, "r") as f:
+            queries = [(line.strip(), None) for line in f if line.strip()]
+    else:
+        queries = sample_queries(COMPARE_SAMPLE)
+    if not queries:
+        print("No queries to compare with.")
+        return
+
+    stats = {version["name"]: {"hits": 0, "overlap": [], "latency": []} for version in versions}
+    for query, expected_id in queries:
+        baseline = None
+        for version in versions:
+            ids, elapsed = search_version(version, query, top_k)
+            version_stats = stats[version["name"]]
+            version_stats["latency"].append(elapsed)
+            if expected_id and expected_id in ids:
+                version_stats["hits"] += 1
+            if baseline is None:
+                baseline = set(ids)
+            else:
+                version_stats["overlap"].append(len(baseline & set(ids)) / max(len(baseline), 1))
+
+    print(f"{len(queries)} queries, top {top_k}:")
+    for version in versions:
+        version_stats = stats[version["name"]]
+        line = f"{version['name']:<8} {version['model']:<28}"
+        if not queries_file:
+            line += f" recall@{top_k}={version_stats['hits'] / len(queries):.3f}"
+        if version_stats["overlap"]:
+            line += f" overlap={statistics.mean(version_stats['overlap']):.3f}"
+        latency = version_stats["latency"]
+        line += f" p50={percentile(latency, 0.5) * 1000:.0f}ms p95={percentile(latency, 0.95) * 1000:.0f}ms"
+        print(line)
+
+def bench(names, count=BENCH_MESSAGES, queries=BENCH_QUERIES, top_k=10):
+    """
+    Compare versions without touching the index: embedding throughput over
+    generated messages, query latency, and recall@k of known-item queries (a
+    random span of a message has to find it among all of them by cosine
+    similarity). Generated text favours lexical matching, so confirm with
+    `compare` on real messages before switching.
+    """
+    # Imported here so the other commands do not need numpy
+    import numpy as np
+    from synth_corpus import CorpusGenerator
+
+    for name in names:
+        if not is_local(get_version(name)):
+            require_pinecone(f"embed with version {name}")
+
+    records = list(CorpusGenerator(count=count))
+    passages = [format_passage(record["sender"], record["recipient"], record["message"]) for record in records]
+    rng = random.Random(0)
+    targets = rng.sample(range(len(records)), min(queries, len(records)))
+    spans = []
+    for target in targets:
+        words = records[target]["message"].split()
+        start = rng.randrange(max(1, len(words) - 8))
+        spans.append(" ".join(words[start:start + 8]))
+
+    print(f"{len(passages)} generated messages, {len(spans)} known-item queries, top {top_k}:")
+    for name in names:
+        version = get_version(name)
+        started = time.monotonic()
+        matrix = np.array(embed_passages(pc, passages, version), dtype=np.float32)
+        throughput = len(passages) / (time.monotonic() - started)
+        matrix /= np.maximum(np.linalg.norm(matrix, axis=1, keepdims=True), 1e-12)
+
+        hits = 0
+        latency = []
+        for target, span in zip(targets, spans):
+            started = time.monotonic()
+            query_vector = np.array(embed_query(pc, span, version), dtype=np.float32)
+            latency.append(time.monotonic() - started)
+            if target in np.argsort(matrix @ query_vector)[::-1][:top_k]:
+                hits += 1
+        print(f"{name:<8} {version.get('provider', 'pinecone'):<8} {version['model']:<28} "
+              f"{throughput:.0f} passages/s  query p50={percentile(latency, 0.5) * 1000:.1f}ms "
+              f"recall@{top_k}={hits / len(spans):.3f}")
+
+def switch(name):
+    """
+    Atomically make a version the one reads use. The previous active version
+    becomes the shadow and keeps receiving writes, so switching back is instant.
+    """
+    config = load_versions()
+    if name not in config["versions"]:
+        raise SystemExit(f"Unknown embedding version: {name}")
+    if name == config["active"]:
+        print(f"{name} is already active.")
+        return
+    previous = config["active"]
+    config["active"] = name
+    config["shadow"] = previous
+    save_versions(config)
+    print(f"Reads now use {name}; {previous} is the shadow. Run `retire` once you are sure.")
+
+def retire():
+    """Stop dual-writing to the shadow version (its vectors are left in place)."""
+    config = load_versions()
+    if not config.get("shadow"):
+        print("There is no shadow version.")
+        return
+    print(f"Stopped writing to {config['shadow']}.")
+    config["shadow"] = None
+    save_versions(config)
+
+def main():
+    parser = argparse.ArgumentParser(description="Migrate semantic search to a new embedding model without downtime")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    subparsers.add_parser("list", help="Show the embedding versions")
+    add_parser = subparsers.add_parser("add", help="Register a shadow version that receives dual-writes")
+    add_parser.add_argument("name")
+    add_parser.add_argument("--model", required=True)
+    add_parser.add_argument("--dimension", type=int, help="Output dimension (for models that support it)")
+    add_parser.add_argument("--index", help="Pinecone index (default: the active version's index)")
+    add_parser.add_argument("--namespace", help="Namespace (default: derived from the version name)")
+    add_parser.add_argument("--create-index", action="store_true", help="Create the index if it does not exist")
+    add_parser.add_argument("--provider", choices=["pinecone", "local"], default="pinecone",
+                            help=f"Where to embed (local models: {HASHING_MODEL}, or fastembed models if installed)")
+    backfill_parser = subparsers.add_parser("backfill", help="Embed every existing message into a version")
+    backfill_parser.add_argument("name")
+    compare_parser = subparsers.add_parser("compare", help="Compare recall and latency of versions")
+    compare_parser.add_argument("names", nargs="*", help="Versions to compare (default: active and shadow)")
+    compare_parser.add_argument("--queries", help="File with one query per line (default: sampled messages)")
+    compare_parser.add_argument("--top-k", type=int, default=10)
+    bench_parser = subparsers.add_parser("bench", help="Compare embedding throughput and known-item recall offline")
+    bench_parser.add_argument("names", nargs="*", help="Versions to compare (default: active and shadow)")
+    bench_parser.add_argument("--count", type=int, default=BENCH_MESSAGES, help="Generated messages to embed")
+    bench_parser.add_argument("--top-k", type=int, default=10)
+    switch_parser = subparsers.add_parser("switch", help="Make a version the one reads use")
+    switch_parser.add_argument("name")
+    subparsers.add_parser("retire", help="Stop writing to the shadow version")
+    args = parser.parse_args()
+
+    if args.command == "list":
+        list_versions()
+    elif args.command == "add":
+        add_version(args.name, args.model, args.dimension, args.index, args.namespace, args.create_index,
+                    args.provider)
+    elif args.command == "backfill":
+        backfill(args.name)
+    elif args.command in ("compare", "bench"):
+        config = load_versions()
+        names = args.names or [config["active"]] + ([config["shadow"]] if config.get("shadow") else [])
+        if args.command == "compare":
+            compare(names, args.queries, args.top_k)
+        else:
+            bench(names, args.count, top_k=args.top_k)
+    elif args.command == "switch":
+        switch(args.name)
+    else:
+        retire()
+
+if __name__ == "__main__":
+    main()
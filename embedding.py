@@ -0,0 +1,221 @@
+# embedding.py
+import json
+import os
+import threading
+from dotenv import load_dotenv
+from local_embedding import local_embed
+
+# Load environment variables
+load_dotenv()
+
+EMBED_MODEL = "llama-text-embed-v2"
+NAMESPACE = "notion_mail"
+INDEX_NAME = os.environ.get("PINECONE_INDEX_NAME", "notion-mail")
+
+# Embedding versions written by `python embed_versions.py ...`:
+#   {"active": "v1", "shadow": "v2", "versions": {"v1": {"provider": ..., "model": ...,
+#    "dimension": ..., "index": ..., "namespace": ...}, ...}}
+# Reads use the active version; writes go to the active and the shadow version.
+# "provider" is "pinecone" (Pinecone's inference API) or "local" (embedded on
+# this machine, see local_embedding.py). Without the file the single version
+# below is used.
+VERSIONS_FILE = "embedding_versions.json"
+DEFAULT_VERSION = {
+    "provider": "pinecone", "model": EMBED_MODEL, "dimension": None, "index": INDEX_NAME, "namespace": NAMESPACE
+}
+
+# Messages are split into overlapping character windows so that long bodies
+# are neither truncated by the model nor diluted into a single vector
+CHUNK_SIZE = 1000
+CHUNK_OVERLAP = 200
+
+# Maximum number of inputs per pc.inference.embed call for EMBED_MODEL
+EMBED_BATCH_SIZE = 96
+
+# Maximum number of vectors sent in one index.upsert call
+UPSERT_BATCH_SIZE = 100
+
+def chunk_text(text, size=CHUNK_SIZE, overlap=CHUNK_OVERLAP):
+    """
+    Split text into chunks of at most `size` characters, each overlapping the
+    previous one by about `overlap` characters. Chunks end on whitespace when possible.
+    """
+    if len(text) <= size:
+        return [text]
+    chunks = []
+    start = 0
+    while start < len(text):
+        end = min(start + size, len(text))
+        if end < len(text):
+            # Prefer to cut at the last space in the second half of the window
+            cut = text.rfind(" ", start + size // 2, end)
+            if cut != -1:
+                end = cut
+        chunks.append(text[start:end].strip())
+        if end >= len(text):
+            break
+        start = max(end - overlap, start + 1)
+    return chunks
+
+def format_passage(sender, recipient, message):
+    """Format a message (or one chunk of it) the way it is embedded and stored."""
+    return f"Sender: {sender}\nRecipient: {recipient}\nMessage: {message}"
+
+def chunk_id(page_id, chunk_number):
+    """Vector ID of one chunk of a message page."""
+    return f"{page_id}#{chunk_number}"
+
+def parent_page_id(vector_id):
+    """Page ID a vector belongs to (vectors from before chunking use the page ID itself)."""
+    return vector_id.split("#", 1)[0]
+
+def load_versions():
+    """Load the embedding version configuration (a single default version if none exists)."""
+    try:
+        with open(VERSIONS_FILE, "r") as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return {"active": "v1", "shadow": None, "versions": {"v1": dict(DEFAULT_VERSION)}}
+
+def save_versions(config):
+    """Write the embedding version configuration atomically."""
+    tmp_path = VERSIONS_FILE + ".tmp"
+    with open(tmp_path, "w") as f:
+        json.dump(config, f, indent=4)
+    os.replace(tmp_path, VERSIONS_FILE)
+
+def get_version(name=None):
+    """Settings of an embedding version (the active one by default), including its name."""
+    config = load_versions()
+    name = name or config["active"]
+    if name not in config["versions"]:
+        raise KeyError(f"Unknown embedding version: {name}")
+    return dict(DEFAULT_VERSION, **config["versions"][name], name=name)
+
+def write_versions():
+    """Versions every new vector is written to: the active one, then the shadow if any."""
+    config = load_versions()
+    names = [config["active"]] + ([config["shadow"]] if config.get("shadow") else [])
+    return [get_version(name) for name in names]
+
+_indexes = {}
+_indexes_lock = threading.Lock()
+
+def version_index(pc, version):
+    """Index handle of a version, opened once per index name."""
+    with _indexes_lock:
+        if version["index"] not in _indexes:
+            _indexes[version["index"]] = pc.Index(version["index"])
+        return _indexes[version["index"]]
+
+def embed_parameters(version, input_type):
+    parameters = {"input_type": input_type}
+    if version.get("dimension"):
+        # Only for models with a configurable output dimension
+        parameters["dimension"] = version["dimension"]
+    return parameters
+
+def is_local(version):
+    return version.get("provider") == "local"
+
+def embed_passages(pc, texts, version=None):
+    """Embed passages in batches and return one list of values per text."""
+    version = version or get_version()
+    if is_local(version):
+        return local_embed(version, texts, "passage")
+    values = []
+    for i in range(0, len(texts), EMBED_BATCH_SIZE):
+        embeddings = pc.inference.embed(
+            model=version["model"],
+            inputs=texts[i:i + EMBED_BATCH_SIZE],
+            parameters=embed_parameters(version, "passage")
+        )
+        values.extend(emb["values"] for emb in embeddings)
+    return values
+
+def embed_query(pc, query, version=None):
+    """Embed a search query with a version's model."""
+    version = version or get_version()
+    if is_local(version):
+        return local_embed(version, [query], "query")[0]
+    embeddings = pc.inference.embed(
+        model=version["model"],
+        inputs=[query],
+        parameters=embed_parameters(version, "query")
+    )
+    return embeddings[0]["values"]
+
+def chunk_metadata(text, page_id, number, sender, timestamp=None):
+    """
+    Metadata stored with a chunk vector. sender (lowercased) and timestamp
+    let searches filter by sender and date inside Pinecone.
+    """
+    metadata = {"text": text, "page_id": page_id, "chunk": number, "sender": sender.lower()}
+    if timestamp is not None:
+        metadata["timestamp"] = timestamp
+    return metadata
+
+def build_chunk_vectors(pc, messages, version=None):
+    """
+    Chunk and embed messages, returning vectors ready for upsert.
+    Each message is a dict with "id", "sender", "recipient", "message" and
+    optionally "timestamp".
+    Chunks from every message are embedded together in batches.
+    """
+    chunks = []
+    for msg in messages:
+        for number, chunk in enumerate(chunk_text(msg["message"])):
+            chunks.append((msg, number, format_passage(msg["sender"], msg["recipient"], chunk)))
+
+    values = embed_passages(pc, [text for _, _, text in chunks], version)
+
+    return [
+        {
+            "id": chunk_id(msg["id"], number),
+            "values": vector_values,
+            "metadata": chunk_metadata(text, msg["id"], number, msg["sender"], msg.get("timestamp"))
+        }
+        for (msg, number, text), vector_values in zip(chunks, values)
+    ]
+
+def build_copy_vectors(sender, copies, chunks, values, timestamp=None):
+    """
+    Build the vectors for a message delivered as several pages.
+    copies is a list of (recipient, page_id); chunks and values are the message
+    chunks and their embeddings, which every copy shares.
+    """
+    vectors = []
+    for recipient, page_id in copies:
+        for number, (chunk, chunk_values) in enumerate(zip(chunks, values)):
+            vectors.append({
+                "id": chunk_id(page_id, number),
+                "values": chunk_values,
+                "metadata": chunk_metadata(format_passage(sender, recipient, chunk), page_id, number, sender, timestamp)
+            })
+    return vectors
+
+def upsert_vectors(index, vectors, namespace=NAMESPACE):
+    """Upsert vectors in batches small enough for a single request each."""
+    for i in range(0, len(vectors), UPSERT_BATCH_SIZE):
+        index.upsert(vectors=vectors[i:i + UPSERT_BATCH_SIZE], namespace=namespace)
+
+def write_to_versions(pc, build_vectors):
+    """
+    Build and upsert vectors for every write version (dual-writes during a migration).
+    build_vectors(version) returns the vectors embedded with that version's model.
+    A failing shadow write only prints a warning; the backfill catches it up.
+    Returns the number of vectors written to the active version.
+    """
+    written = 0
+    for position, version in enumerate(write_versions()):
+        try:
+            vectors = build_vectors(version)
+            upsert_vectors(version_index(pc, version), vectors, version["namespace"])
+        except Exception as e:
+            if position == 0:
+                raise
+            print(f"Warning: failed to write shadow embeddings ({version['name']}): {e}")
+            continue
+        if position == 0:
+            written = len(vectors)
+    return written
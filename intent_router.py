@@ -0,0 +1,154 @@
+# intent_router.py
+import argparse
+import re
+import time
+
+# Routes below this confidence are left to the LLM
+MIN_CONFIDENCE = 0.8
+
+# A name may be two capitalized words ("Bob Smith"), so send rules need an
+# explicit delimiter after the recipients to tell where the name ends
+NAME = r"[A-Za-z][\w.'-]*(?: (?-i:[A-Z])[\w.'-]*)?"
+NAMES = rf"{NAME}(?:\s*(?:,|\band\b)\s*{NAME})*"
+MAIL = r"(?:e-?mails?|mails?|messages?|inbox)"
+
+# (pattern, action, confidence); patterns must match the whole prompt
+RULES = [
+    (rf"(?:please )?(?:read|check|show|open|get)(?: me)? (?:my )?(?:new |unread |latest |recent )?{MAIL}", "read", 0.95),
+    (rf"(?:do i have |are there |any )(?:any )?(?:new |unread )?{MAIL}\??", "read_new", 0.9),
+    (r"what'?s (?:new )?in my inbox\??", "read", 0.9),
+    (rf"(?:please )?(?:send|email|mail|message|write)(?: (?:a )?(?:message|mail|email|note))?(?: to)? (?P<recipient>{NAMES})(?::\s*|\s+-\s+)(?P<message>.+)", "send", 0.95),
+    (rf"(?:please )?(?:send|email|mail|message|write)(?: (?:a )?(?:message|mail|email|note))?(?: to)? (?P<recipient>{NAMES}),? (?:saying|that says|with the text) (?P<message>.+)", "send", 0.9),
+    (rf"(?:please )?tell (?P<recipient>{NAMES}),? that (?P<message>.+)", "send", 0.85),
+    # Without a delimiter the end of the name is a guess ("tell Bob I am late")
+    (rf"(?:please )?tell (?P<recipient>{NAMES}),? (?P<message>.+)", "send", 0.5),
+    (rf"(?:search|grep|look)(?: my {MAIL})? for (?P<keyword>.+)", "search", 0.9),
+    (rf"(?:find|show|search)(?: me)? (?:my )?{MAIL} (?:containing|mentioning|with the words?) (?P<keyword>.+)", "search", 0.9),
+    (rf"(?:find|show|search)(?: me)? (?:my )?{MAIL} (?:about|related to|regarding|on the topic of) (?P<query>.+)", "semantic_search", 0.85),
+    (rf"(?:please )?(?:summari[sz]e|give me (?:a |an )?(?:summary|overview) of) (?:my )?(?:new |recent |latest )?{MAIL}\??", "summarize", 0.9),
+]
+COMPILED_RULES = [(re.compile(pattern, re.IGNORECASE | re.DOTALL), action, confidence) for pattern, action, confidence in RULES]
+
+# Words that cannot be recipient names
+PRONOUNS = {"me", "him", "her", "them", "it", "us", "everyone", "everybody"}
+
+# Words that ask for a sender or date filter. Rules capture search terms
+# verbatim, so prompts with them are left to the LLM, which sets "from",
+# "since" and "until" instead of searching for the whole phrase
+FILTER_WORDS = re.compile(
+    r"\b(?:from|by|since|before|after|until|till|between|during|last|past|yesterday|today|ago"
+    r"|this (?:week|month|year)|(?:mon|tues|wednes|thurs|fri|satur|sun)days?"
+    r"|january|february|march|april|may|june|july|august|september|october|november|december"
+    r"|\d{4}-\d{2}-\d{2})\b",
+    re.IGNORECASE
+)
+
+# Longer keywords are more likely a description than a literal substring
+MAX_KEYWORD_WORDS = 4
+
+# Words that mean a prompt refers back to earlier turns or asks for more than one step
+CONTEXT_WORDS = re.compile(r"\b(?:it|that one|them|those|the (?:first|second|third|last|previous) one|reply|forward|again|and then|also)\b", re.IGNORECASE)
+
+def split_names(text):
+    return [name.strip() for name in re.split(r",|\band\b", text) if name.strip()]
+
+def strip_quotes(text):
+    text = text.strip()
+    if len(text) > 1 and text[0] == text[-1] and text[0] in "\"'":
+        return text[1:-1]
+    return text
+
+def route(prompt):
+    """
+    Recognize common one-step commands without the LLM.
+    Returns (instruction, confidence), or (None, 0) if no rule matches confidently.
+    The instruction has the same shape as get_ai_instructions' output.
+    """
+    prompt = prompt.strip().rstrip(".!")
+    for pattern, action, confidence in COMPILED_RULES:
+        match = pattern.fullmatch(prompt)
+        if not match:
+            continue
+        fields = match.groupdict()
+        if action in ("read", "read_new"):
+            new = action == "read_new" or bool(re.search(r"\b(?:new|unread)\b", prompt, re.IGNORECASE))
+            command = {"action": "read", "params": {"new": True} if new else {}}
+        elif action == "send":
+            # Follow-ups ("tell him that...") need the conversation, so leave them to the LLM
+            recipients = split_names(fields["recipient"])
+            if any(name.lower() in PRONOUNS for name in recipients) or CONTEXT_WORDS.search(fields["recipient"]):
+                continue
+            command = {
+                "action": "send",
+                "params": {
+                    "recipient": recipients[0] if len(recipients) == 1 else recipients,
+                    "message": strip_quotes(fields["message"])
+                }
+            }
+        elif action == "search":
+            keyword = strip_quotes(fields["keyword"])
+            if FILTER_WORDS.search(keyword) or len(keyword.split()) > MAX_KEYWORD_WORDS:
+                return None, 0
+            command = {"action": "search", "params": {"keyword": keyword}}
+        elif action == "summarize":
+            command = {"action": "summarize", "params": {}}
+        else:
+            if FILTER_WORDS.search(fields["query"]):
+                return None, 0
+            command = {"action": "semantic_search", "params": {"query": strip_quotes(fields["query"])}}
+
+        if action != "send" and CONTEXT_WORDS.search(prompt):
+            confidence -= 0.2
+        if confidence < MIN_CONFIDENCE:
+            return None, 0
+        return {"commands": [command]}, confidence
+    return None, 0
+
+def template_answer(instruction, command_output):
+    """
+    Answer a routed turn from a template instead of the LLM, for commands whose
+    output already reads as an answer. Returns None when the LLM should phrase it.
+    """
+    command = instruction["commands"][0]
+    if command["action"] == "summarize":
+        # The summary is already the answer
+        return command_output.strip() or "You have no messages to summarize."
+    if command["action"] == "read":
+        output = command_output.strip()
+        return output if output else "You have no messages."
+    if command["action"] == "send":
+        recipient = command["params"]["recipient"]
+        names = recipient if isinstance(recipient, str) else ", ".join(recipient)
+        if "mail sent successfully" in command_output.lower():
+            return f"Sent your message to {names}."
+        return command_output.strip() or f"Could not send your message to {names}."
+    return None
+
+def main():
+    parser = argparse.ArgumentParser(description="Measure how many prompts the local intent router handles")
+    parser.add_argument("prompts", help="File with one chat prompt per line")
+    parser.add_argument("--verbose", action="store_true", help="Show the route of every prompt")
+    args = parser.parse_args()
+
+    with open(args.prompts, "r") as f:
+        prompts = [line.strip() for line in f if line.strip()]
+    if not prompts:
+        print("No prompts found.")
+        return
+
+    routed = 0
+    started = time.perf_counter()
+    for prompt in prompts:
+        instruction, confidence = route(prompt)
+        if instruction:
+            routed += 1
+        if args.verbose:
+            target = instruction["commands"][0] if instruction else "LLM"
+            print(f"{prompt!r} -> {target} ({confidence:.2f})")
+    elapsed = time.perf_counter() - started
+
+    print(f"Fast path: {routed}/{len(prompts)} prompts ({routed / len(prompts):.0%}), "
+          f"{elapsed / len(prompts) * 1e6:.0f} µs per prompt")
+
+if __name__ == "__main__":
+    main()
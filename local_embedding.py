@@ -0,0 +1,115 @@
+# local_embedding.py
+import re
+import threading
+import zlib
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache
+
+# Optional: quantized ONNX sentence models run on the CPU
+try:
+    from fastembed import TextEmbedding
+except ImportError:
+    TextEmbedding = None
+
+# Built-in model that needs no downloads or packages: words and character
+# n-grams hashed into a fixed number of dimensions
+HASHING_MODEL = "hashing-ngram"
+HASHING_DIMENSION = 512
+NGRAM_SIZES = (3, 4, 5)
+
+# Texts embedded per task, and tasks run at once. fastembed releases the GIL
+# while its model runs, so batches embed in parallel; the hashing model is
+# pure Python and runs in the calling thread, where threads would only
+# contend for the GIL.
+LOCAL_BATCH_SIZE = 64
+LOCAL_EMBED_WORKERS = 4
+
+# Distinct words whose hashed features are remembered; mail reuses a small
+# vocabulary, so most words are hashed once
+HASHED_WORD_CACHE = 100_000
+
+WORD = re.compile(r"\w+")
+
+# Field labels added by embedding.format_passage carry no meaning
+LABEL = re.compile(r"^(?:Sender|Recipient|Message): ", re.MULTILINE)
+
+_executor = ThreadPoolExecutor(max_workers=LOCAL_EMBED_WORKERS, thread_name_prefix="embed")
+
+@lru_cache(maxsize=HASHED_WORD_CACHE)
+def _word_features(word, dimension):
+    """A word and its character n-grams hashed into ((dimension, weight), ...)."""
+    padded = f" {word} "
+    features = [word]
+    for size in NGRAM_SIZES:
+        features.extend(padded[i:i + size] for i in range(len(padded) - size + 1))
+    weights = {}
+    for feature in features:
+        digest = zlib.crc32(feature.encode())
+        slot = digest % dimension
+        weights[slot] = weights.get(slot, 0.0) + (1.0 if digest & 0x80000000 else -1.0)
+    return tuple(weights.items())
+
+def hashed_vector(text, dimension=HASHING_DIMENSION):
+    """
+    L2-normalized vector of the text's words and character n-grams, each
+    hashed to one dimension with a hashed sign (the "hashing trick").
+    """
+    values = [0.0] * dimension
+    for word in WORD.findall(LABEL.sub("", text).lower()):
+        for slot, weight in _word_features(word, dimension):
+            values[slot] += weight
+    norm = sum(value * value for value in values) ** 0.5
+    return [value / norm for value in values] if norm else values
+
+class LocalEmbedder:
+    """
+    Embeds texts on the local CPU. model is HASHING_MODEL, whose dimension is
+    configurable, or, with fastembed installed, one of its models (e.g.
+    "BAAI/bge-small-en-v1.5"), whose batches are spread over a thread pool.
+    """
+
+    def __init__(self, model, dimension=None):
+        self.model = model
+        self.dimension = dimension or HASHING_DIMENSION
+        self.text_model = None
+        if model != HASHING_MODEL:
+            if TextEmbedding is None:
+                raise RuntimeError(f"Local model {model} needs fastembed (pip install fastembed)")
+            self.text_model = TextEmbedding(model_name=model)
+            # A fastembed model has a fixed output size
+            self.dimension = len(next(iter(self.text_model.embed(["dimension"]))))
+            if dimension and dimension != self.dimension:
+                raise ValueError(f"{model} embeds into {self.dimension} dimensions, not {dimension}")
+
+    def _embed_batch(self, texts, input_type):
+        if self.text_model is None:
+            return [hashed_vector(text, self.dimension) for text in texts]
+        if input_type == "query":
+            embeddings = self.text_model.query_embed(texts)
+        else:
+            embeddings = self.text_model.passage_embed(texts)
+        return [embedding.tolist() for embedding in embeddings]
+
+    def embed(self, texts, input_type="passage"):
+        """Return one list of values per text, in order."""
+        batches = [texts[i:i + LOCAL_BATCH_SIZE] for i in range(0, len(texts), LOCAL_BATCH_SIZE)]
+        if self.text_model is None or len(batches) <= 1:
+            return self._embed_batch(texts, input_type)
+        values = []
+        for batch_values in _executor.map(lambda batch: self._embed_batch(batch, input_type), batches):
+            values.extend(batch_values)
+        return values
+
+_embedders = {}
+_embedders_lock = threading.Lock()
+
+def get_embedder(model, dimension=None):
+    """Embedder for a model, loaded once per process."""
+    with _embedders_lock:
+        if (model, dimension) not in _embedders:
+            _embedders[(model, dimension)] = LocalEmbedder(model, dimension)
+        return _embedders[(model, dimension)]
+
+def local_embed(version, texts, input_type="passage"):
+    """Embed texts with a version whose provider is "local"."""
+    return get_embedder(version["model"], version.get("dimension")).embed(texts, input_type)
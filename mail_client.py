@@ -0,0 +1,102 @@
+# mail_client.py
+import json
+import os
+import urllib.request
+from dotenv import load_dotenv
+
+# Address of a running server.py, e.g. http://127.0.0.1:8765
+load_dotenv()
+SERVER_URL = os.environ.get("NOTIONMAIL_SERVER")
+
+class ServerError(Exception):
+    """Raised when the mail server answers a call with a JSON-RPC error."""
+
+def call(method, **params):
+    """
+    Call a method on the mail server and return its result.
+    Every result is a dict with the printed "output" and the primitive's "result".
+    """
+    request = urllib.request.Request(
+        SERVER_URL,
+        data=json.dumps({"jsonrpc": "2.0", "method": method, "params": params, "id": 1}).encode(),
+        headers={"Content-Type": "application/json"}
+    )
+    with urllib.request.urlopen(request) as response:
+        reply = json.loads(response.read())
+    if "error" in reply:
+        raise ServerError(reply["error"]["message"])
+    return reply["result"]
+
+def _print_and_return(reply):
+    """Print what the primitive printed on the server and return its result."""
+    if reply["output"]:
+        print(reply["output"], end="")
+    return reply["result"]
+
+# Thin wrappers with the same signatures as the local primitives
+
+def send_mail(sender=None, recipient=None, message=None, cc=None, bcc=None, attachments=None):
+    # Prompt locally, exactly like basic_functionality.send_mail
+    if sender is None:
+        sender = input("Sender: ").strip()
+    if recipient is None:
+        recipient = input("Recipient(s), comma-separated: ").strip()
+        if cc is None:
+            cc = input("Cc (optional): ").strip()
+        if bcc is None:
+            bcc = input("Bcc (optional): ").strip()
+        if attachments is None:
+            attachments = input("Attachments (file paths, optional): ").strip()
+    if message is None:
+        message = input("Message: ").strip()
+    # Attachments are read by the server, from names relative to its files directory
+    if isinstance(attachments, str):
+        attachments = attachments.split(",")
+    attachments = [path.strip() for path in attachments or [] if path.strip()]
+    return _print_and_return(call(
+        "send", sender=sender, recipient=recipient, message=message, cc=cc, bcc=bcc, attachments=attachments
+    ))
+
+def read_mail(user=None, new_only=False, limit=None, start_cursor=None):
+    if user is None:
+        user = input("User: ").strip()
+    results, next_cursor = _print_and_return(
+        call("read", user=user, new=new_only, limit=limit, cursor=start_cursor)
+    )
+    return results, next_cursor
+
+def count_unread(user):
+    return call("count_unread", user=user)["result"]
+
+def open_message(page):
+    return _print_and_return(call("open", page=page))
+
+def save_attachments(page, directory="."):
+    # Saved by the server, into directory relative to its files directory
+    return _print_and_return(call("save_attachments", page=page, directory=directory))
+
+def search_command(notion=None, database_id=None, search_term=None, current_user=None,
+                   limit=None, start_cursor=None, since=None, until=None, sender=None):
+    results, next_cursor = _print_and_return(
+        call("search", user=current_user, keyword=search_term, limit=limit, cursor=start_cursor,
+             since=since, until=until, **{"from": sender})
+    )
+    return results, next_cursor
+
+def semantic_search(query=None, current_user=None, top_k=3, since=None, until=None, sender=None):
+    return _print_and_return(
+        call("semantic_search", user=current_user, query=query, top_k=top_k,
+             since=since, until=until, **{"from": sender})
+    )
+
+def cache_stats():
+    """The server's result cache counters (see query_cache.QueryCache.snapshot)."""
+    return call("cache_stats")["result"]
+
+def chat(current_user, prompt):
+    """
+    Run one chat turn on the server, which keeps the user's conversation memory.
+    Returns (instruction, final_answer, usage, context_tokens).
+    """
+    result = call("chat", user=current_user, prompt=prompt)["result"]
+    return result["instruction"], result["answer"], result["usage"], result["context_tokens"]
@@ -1,8 +1,13 @@
 import os
 import json
+import argparse
 from dotenv import load_dotenv
 from notion_client import Client
 from pinecone import Pinecone, ServerlessSpec  # Import required Pinecone classes
+from basic_functionality import get_message_body
+from scan import scan_pages
+from shards import all_shards
+from embedding import UPSERT_BATCH_SIZE, build_chunk_vectors, get_version, upsert_vectors, version_index
 
 # Load environment variables
 load_dotenv()
@@ -16,59 +21,57 @@ notion = Client(auth=NOTION_KEY)
 # Initialize Pinecone client by creating an instance of Pinecone
 pc = Pinecone(api_key=PINECONE_API_KEY)
 
-# Connect to your index; now using the index name "notion-mail"
-index = pc.Index("notion-mail")
-
 def get_messages():
     """
-    Retrieves messages from the Notion database and returns a list of dictionaries.
-    Each dictionary contains the page ID and a combined text from Sender, Recipient, and Message.
+    Retrieves all messages from the Notion database and returns a list of dictionaries.
+    Each dictionary contains the page ID, sender, recipient and the full message body
+    (loaded from the page blocks when the title only holds a preview).
+    Pages are read with the parallel range scan.
     """
-    response = notion.databases.query(database_id=DATABASE_ID)
     messages = []
-    for page in response.get("results", []):
+    for page in scan_pages(notion, all_shards()):
         properties = page.get("properties", {})
         sender = "".join([p.get("plain_text", "") for p in properties.get("Sender", {}).get("rich_text", [])])
         recipient = "".join([p.get("plain_text", "") for p in properties.get("Recipient", {}).get("rich_text", [])])
-        message_text = "".join([p.get("plain_text", "") for p in properties.get("Message", {}).get("title", [])])
-        combined_text = f"Sender: {sender}\nRecipient: {recipient}\nMessage: {message_text}"
-        messages.append({"id": page["id"], "text": combined_text})
+        messages.append({
+            "id": page["id"],
+            "sender": sender,
+            "recipient": recipient,
+            "message": get_message_body(page),
+            "timestamp": properties.get("Timestamp", {}).get("number")
+        })
     return messages
 
-def embed_and_upsert():
+def embed_and_upsert(version_name=None):
     """
-    Embeds each message using Pinecone’s inference API and upserts the resulting vectors into the Pinecone index.
-    The full embedding vector is used without truncation.
+    Splits each message into overlapping chunks, embeds the chunks in batches using
+    Pinecone's inference API and upserts one vector per chunk into the Pinecone index.
+    Each vector is tagged with its parent page ID.
+    version_name selects the embedding version to fill (the active one by default);
+    this is also the backfill of a shadow version during a model migration.
     """
+    version = get_version(version_name)
+    index = version_index(pc, version)
     messages = get_messages()
     if not messages:
         print("No messages found in Notion.")
         return
 
-    texts = [msg["text"] for msg in messages]
-
-    # Use Pinecone inference to embed the texts.
-    embeddings = pc.inference.embed(
-        model="llama-text-embed-v2",
-        inputs=texts,
-        parameters={"input_type": "passage"}
-    )
+    vectors = build_chunk_vectors(pc, messages, version)
 
-    # Prepare vectors for upsert; each vector contains an id, values, and metadata.
-    vectors = []
-    for msg, emb in zip(messages, embeddings):
-        vector = {
-            "id": msg["id"],
-            "values": emb["values"],
-            "metadata": {"text": msg["text"]}
-        }
-        vectors.append(vector)
+    # Remove the single whole-message vectors written before chunking
+    page_ids = [msg["id"] for msg in messages]
+    for i in range(0, len(page_ids), UPSERT_BATCH_SIZE):
+        index.delete(ids=page_ids[i:i + UPSERT_BATCH_SIZE], namespace=version["namespace"])
 
-    # Upsert vectors to the index (using a namespace "notion_mail")
-    upsert_response = index.upsert(vectors=vectors, namespace="notion_mail")
-    print("Upsert response:", upsert_response)
+    # Upsert vectors to the index in batches
+    upsert_vectors(index, vectors, version["namespace"])
+    print(f"Upserted {len(vectors)} chunk vectors for {len(messages)} messages into version {version['name']}.")
 
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Embed every message into Pinecone")
+    parser.add_argument("--version", help="Embedding version to fill (default: the active one)")
+    args = parser.parse_args()
     print("Embedding all existing messages and upserting to Pinecone...")
-    embed_and_upsert()
+    embed_and_upsert(args.version)
     print("Embedding update complete.")
@@ -1,43 +1,44 @@
 import os
+import gzip
 import json
+import math
 import random
 import argparse
+from collections import Counter
 from datetime import datetime, timedelta
 from dotenv import load_dotenv
-from notion_client import Client
 from openai import OpenAI
 from pinecone import Pinecone
+from basic_functionality import MAX_BLOCKS_PER_REQUEST, create_record_page
+from embedding import (
+    EMBED_BATCH_SIZE, UPSERT_BATCH_SIZE, build_chunk_vectors, chunk_text, write_to_versions, write_versions
+)
+from utils import PREVIEW_LENGTH, build_body_blocks
 
 # Parse command line arguments
 parser = argparse.ArgumentParser(description='Generate sample emails and add them to Notion database')
 parser.add_argument('--use_pinecone', action='store_false', help='Disable Pinecone embedding (enabled by default)')
+parser.add_argument('--input', help='Load messages from a JSONL file (e.g. from synth_corpus.py) instead of generating them')
+parser.add_argument('--dry-run', action='store_true', help='Report the API calls the load would make without writing anything')
 args = parser.parse_args()
+if args.dry_run and not args.input:
+    # Generating messages calls OpenAI and saves them, which a dry run must not do
+    parser.error("--dry-run needs --input")
 
 # Load environment variables
 load_dotenv()
-NOTION_KEY = os.environ["NOTION_KEY"]
-DATABASE_ID = os.environ["DATABASE_ID"]
-OPENAI_API_KEY = os.environ["OPENAI_API_KEY"]
 PINECONE_API_KEY = os.environ.get("PINECONE_API_KEY")
 
-# Initialize clients
-notion = Client(auth=NOTION_KEY)
-openai_client = OpenAI()
-
 # Initialize Pinecone if enabled
 use_pinecone = args.use_pinecone
 if use_pinecone and PINECONE_API_KEY:
     pc = Pinecone(api_key=PINECONE_API_KEY)
-    index = pc.Index("notion-mail")
 
 # Folder for test messages
 MESSAGES_FOLDER = "test_messages"
-os.makedirs(MESSAGES_FOLDER, exist_ok=True)
 
-def load_schema():
-    """Load the database schema from schema.json"""
-    with open("schema.json", "r") as f:
-        return json.load(f)
+# Created messages are embedded and upserted in groups of this many
+EMBED_FLUSH_SIZE = 50
 
 def read_prompt():
     """Read the conversation prompt from sample_emails_prompt.txt"""
@@ -71,7 +72,7 @@ def generate_messages():
         "Only output the JSON lines."
     )
     
-    completion = openai_client.chat.completions.create(
+    completion = OpenAI().chat.completions.create(
         model="gpt-4o-mini",
         messages=[
             {"role": "system", "content": "You are a creative assistant."},
@@ -81,135 +82,120 @@ def generate_messages():
     
     return completion.choices[0].message.content.strip()
 
-def save_messages(raw_messages: str):
-    """Save each message as a JSON file and return the parsed messages."""
-    messages = []
-    lines = raw_messages.splitlines()
+def parse_messages(lines, save=False):
+    """Parse JSON lines into messages as they are read; with save, each is also kept as a JSON file."""
     for i, line in enumerate(lines):
         if line.strip():
             try:
                 message = json.loads(line)
-                messages.append(message)
+            except json.JSONDecodeError:
+                print(f"Skipping invalid JSON line: {line}")
+                continue
+            if save:
                 file_path = os.path.join(MESSAGES_FOLDER, f"message_{i+1}.json")
                 with open(file_path, "w") as f:
                     json.dump(message, f, indent=4)
-            except json.JSONDecodeError:
-                print(f"Skipping invalid JSON line: {line}")
-    return messages
+            yield message
+
+def read_input(path):
+    """Yield the lines of a JSONL file (gzip-compressed if it ends in .gz)."""
+    opener = gzip.open if path.endswith(".gz") else open
+    with opener(path, "rt") as f:
+        yield from f
 
-def add_messages_to_database(messages):
-    """Add messages to the Notion database with properties defined in schema.json."""
-    schema = load_schema()
+def to_records(messages):
+    """Turn messages into records, with a random timestamp in March 2025 unless they have one."""
     start_date = datetime(2025, 3, 1)
     end_date = datetime(2025, 3, 10, 23, 59, 59)
-    
-    # Store page IDs for later embedding
-    page_ids = []
-    
     for message in messages:
-        sender = message.get("sender", "Unknown")
-        recipient = message.get("recipient", "Unknown")
-        text = message.get("message", "")
-        rand_ts = random_date(start_date, end_date)
-        dt_obj = datetime.fromisoformat(rand_ts)
-        timestamp_number = dt_obj.timestamp()
-        
-        properties = {
-            "Sender": {
-                "rich_text": [
-                    {"type": "text", "text": {"content": sender}}
-                ]
-            },
-            "Recipient": {
-                "rich_text": [
-                    {"type": "text", "text": {"content": recipient}}
-                ]
-            },
-            "Message": {
-                "title": [
-                    {"type": "text", "text": {"content": text}}
-                ]
-            },
-            "Timestamp": {
-                "number": timestamp_number
-            }
+        timestamp = message.get("timestamp")
+        if timestamp is None:
+            timestamp = datetime.fromisoformat(random_date(start_date, end_date)).timestamp()
+        yield {
+            "sender": message.get("sender", "Unknown"),
+            "recipient": message.get("recipient", "Unknown"),
+            "cc": message.get("cc", ""),
+            "message": message.get("message", ""),
+            "timestamp": timestamp
         }
-        
-        try:
-            response = notion.pages.create(
-                parent={"database_id": DATABASE_ID},
-                properties=properties
-            )
-            page_ids.append(response["id"])
-            print(f"Added message from '{sender}' to '{recipient}' with timestamp {rand_ts}")
-        except Exception as e:
-            print(f"Error adding message: {e}")
-    
-    return page_ids
 
-def embed_messages(page_ids):
-    """Embed messages and store in Pinecone."""
-    if not use_pinecone or not PINECONE_API_KEY:
-        print("Skipping embedding (Pinecone disabled or API key not found)")
-        return
-    
-    print("Embedding messages in Pinecone...")
-    messages = []
-    
-    for page_id in page_ids:
-        page = notion.pages.retrieve(page_id=page_id)
-        properties = page.get("properties", {})
-        
-        sender = "".join([p.get("plain_text", "") for p in properties.get("Sender", {}).get("rich_text", [])])
-        recipient = "".join([p.get("plain_text", "") for p in properties.get("Recipient", {}).get("rich_text", [])])
-        message_text = "".join([p.get("plain_text", "") for p in properties.get("Message", {}).get("title", [])])
-        
-        combined_text = f"Sender: {sender}\nRecipient: {recipient}\nMessage: {message_text}"
-        messages.append({"id": page_id, "text": combined_text})
-    
-    if not messages:
-        print("No messages to embed.")
-        return
-    
-    # Create embeddings
-    texts = [msg["text"] for msg in messages]
-    
-    # Use Pinecone inference to embed the texts
-    embeddings = pc.inference.embed(
-        model="llama-text-embed-v2",
-        inputs=texts,
-        parameters={"input_type": "passage"}
-    )
-    
-    # Prepare vectors for upsert
-    vectors = []
-    for msg, emb in zip(messages, embeddings):
-        vector = {
-            "id": msg["id"],
-            "values": emb["values"],
-            "metadata": {"text": msg["text"]}
-        }
-        vectors.append(vector)
-    
-    # Upsert vectors to the index
-    upsert_response = index.upsert(vectors=vectors, namespace="notion_mail")
-    print(f"Embedded {len(vectors)} messages in Pinecone")
+def add_messages_to_database(records, calls, dry_run=False):
+    """
+    Create one page per record (in its shard, under the shared rate limiter)
+    and yield the record with its page "id", so it can be embedded straight
+    away without reading the page back. Counts the Notion calls in calls.
+    """
+    for number, record in enumerate(records, start=1):
+        message = record["message"]
+        blocks = len(build_body_blocks(message)) if len(message) > PREVIEW_LENGTH else 0
+        if dry_run:
+            record["id"] = f"dry-run-{number}"
+        else:
+            try:
+                record["id"] = create_record_page(record)["id"]
+            except Exception as e:
+                print(f"Error adding message: {e}")
+                continue
+            date = datetime.fromtimestamp(record["timestamp"]).isoformat()
+            print(f"Added message from '{record['sender']}' to '{record['recipient']}' with timestamp {date}")
+        calls["notion pages.create"] += 1
+        calls["notion blocks.children.append"] += max(0, math.ceil(blocks / MAX_BLOCKS_PER_REQUEST) - 1)
+        yield record
+
+def embed_batch(batch, calls, dry_run=False):
+    """Embed and upsert one group of created messages for every write version."""
+    chunks = sum(len(chunk_text(record["message"])) for record in batch)
+    versions = len(write_versions())
+    calls["pinecone inference.embed"] += versions * math.ceil(chunks / EMBED_BATCH_SIZE)
+    calls["pinecone upsert"] += versions * math.ceil(chunks / UPSERT_BATCH_SIZE)
+    if dry_run:
+        return chunks
+    return write_to_versions(pc, lambda version: build_chunk_vectors(pc, batch, version))
+
+def load_messages(records, embed=True, dry_run=False):
+    """
+    Stream records through page creation and batched embedding in one pass:
+    every EMBED_FLUSH_SIZE created messages are embedded together from memory.
+    Returns (messages added, chunk vectors written, API call counts).
+    """
+    calls = Counter()
+    added = vectors = 0
+    batch = []
+    for record in add_messages_to_database(records, calls, dry_run):
+        added += 1
+        if embed:
+            batch.append(record)
+            if len(batch) >= EMBED_FLUSH_SIZE:
+                vectors += embed_batch(batch, calls, dry_run)
+                batch = []
+    if batch:
+        vectors += embed_batch(batch, calls, dry_run)
+    return added, vectors, calls
 
 def main():
-    print("Generating messages using OpenAI...")
-    raw_messages = generate_messages()
-    
-    print("Saving messages to folder:", MESSAGES_FOLDER)
-    messages = save_messages(raw_messages)
-    
-    print(f"Saved {len(messages)} messages. Adding them to Notion with random timestamps...")
-    page_ids = add_messages_to_database(messages)
-    
-    # Embed messages if Pinecone is enabled
-    if use_pinecone and PINECONE_API_KEY:
-        embed_messages(page_ids)
-    
-    print("All messages added successfully.")
+    embed = use_pinecone and bool(PINECONE_API_KEY)
+    if args.input:
+        print(f"Loading messages from {args.input}...")
+        messages = parse_messages(read_input(args.input))
+    else:
+        print("Generating messages using OpenAI...")
+        os.makedirs(MESSAGES_FOLDER, exist_ok=True)
+        messages = parse_messages(generate_messages().splitlines(), save=True)
+        print("Saving messages to folder:", MESSAGES_FOLDER)
+
+    if not embed:
+        print("Skipping embedding (Pinecone disabled or API key not found)")
+    added, vectors, calls = load_messages(to_records(messages), embed, args.dry_run)
+
+    if args.input is None:
+        calls["openai chat.completions.create"] += 1
+    if args.dry_run:
+        print(f"Dry run: loading {added} messages ({vectors} chunk vectors) would make {sum(calls.values())} API calls:")
+    else:
+        print(f"Added {added} messages ({vectors} chunk vectors) with {sum(calls.values())} API calls:")
+    for name, count in sorted(calls.items()):
+        if count:
+            print(f"  {name}: {count}")
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    main()
@@ -0,0 +1,112 @@
+# query_cache.py
+import json
+import threading
+import time
+from collections import OrderedDict
+
+# How long a cached result is served, in seconds. Writes made by this
+# process invalidate entries at once; the TTL bounds how stale a result can
+# get from writes made elsewhere (another client, the archiver).
+RESULT_CACHE_TTL = 120
+
+# Maximum number of cached results; the least recently used is evicted first
+RESULT_CACHE_SIZE = 256
+
+class QueryCache:
+    """
+    Caches the results of read-only primitives per (primitive, user, params).
+    Every participant has a generation counter that writes bump; an entry is
+    only served while the generation of its user is the one it was stored
+    under, so a sent message invalidates the sender's and recipients' results
+    without touching anyone else's.
+    """
+
+    def __init__(self, ttl=RESULT_CACHE_TTL, max_entries=RESULT_CACHE_SIZE):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.entries = OrderedDict()
+        self.generations = {}
+        self.stats = {"hits": 0, "misses": 0, "expired": 0, "invalidated": 0, "evicted": 0}
+        self.lock = threading.Lock()
+
+    @staticmethod
+    def make_key(primitive, user, params):
+        """Key for a call; parameter order, None values and surrounding whitespace do not matter."""
+        normalized = {
+            name: value.strip() if isinstance(value, str) else value
+            for name, value in params.items()
+            if value is not None
+        }
+        return primitive, user, json.dumps(normalized, sort_keys=True, default=str)
+
+    def generation(self, user):
+        return self.generations.get(user.lower(), 0)
+
+    def bump(self, *participants):
+        """Invalidate every cached result of these participants."""
+        with self.lock:
+            for name in participants:
+                if name:
+                    self.generations[name.lower()] = self.generations.get(name.lower(), 0) + 1
+
+    def get(self, key):
+        """Return (True, value) for a valid entry, else (False, None)."""
+        user = key[1]
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is None:
+                self.stats["misses"] += 1
+                return False, None
+            expires, generation, value = entry
+            if generation != self.generation(user) or time.monotonic() >= expires:
+                del self.entries[key]
+                self.stats["invalidated" if generation != self.generation(user) else "expired"] += 1
+                self.stats["misses"] += 1
+                return False, None
+            self.entries.move_to_end(key)
+            self.stats["hits"] += 1
+            return True, value
+
+    def put(self, key, value, generation):
+        with self.lock:
+            if generation != self.generation(key[1]):
+                # A write happened while the result was being fetched
+                return
+            self.entries[key] = (time.monotonic() + self.ttl, generation, value)
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.max_entries:
+                self.entries.popitem(last=False)
+                self.stats["evicted"] += 1
+
+    def cached(self, primitive, user, params, compute):
+        """Return compute()'s result for this call, from the cache when it is still valid."""
+        key = self.make_key(primitive, user, params)
+        found, value = self.get(key)
+        if found:
+            return value
+        with self.lock:
+            generation = self.generation(user)
+        value = compute()
+        self.put(key, value, generation)
+        return value
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+
+    def hit_rate(self):
+        lookups = self.stats["hits"] + self.stats["misses"]
+        return self.stats["hits"] / lookups if lookups else 0.0
+
+    def snapshot(self):
+        """Counters plus the current size and hit rate, for reporting."""
+        with self.lock:
+            return dict(self.stats, entries=len(self.entries), hit_rate=self.hit_rate())
+
+def format_cache_stats(stats):
+    return (f"Result cache: {stats['hits']} hits, {stats['misses']} misses ({stats['hit_rate']:.0%} hit rate), "
+            f"{stats['invalidated']} invalidated by writes, {stats['expired']} expired, "
+            f"{stats['evicted']} evicted, {stats['entries']} cached")
+
+# Shared by every primitive in the process
+result_cache = QueryCache()
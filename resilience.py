@@ -0,0 +1,110 @@
+# resilience.py
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+# Threads that run calls made under a deadline. A call that misses its
+# deadline cannot be interrupted; it finishes here in the background.
+DEADLINE_WORKERS = 16
+
+_executor = ThreadPoolExecutor(max_workers=DEADLINE_WORKERS, thread_name_prefix="deadline")
+
+class DeadlineExceeded(Exception):
+    """Raised when a call does not finish before its deadline."""
+
+class CircuitOpen(Exception):
+    """Raised instead of calling a backend whose circuit breaker is open."""
+
+class Deadline:
+    """A point in time a sequence of calls has to finish by."""
+
+    def __init__(self, seconds):
+        self.expires = time.monotonic() + seconds
+
+    def remaining(self):
+        return max(0.0, self.expires - time.monotonic())
+
+    def expired(self):
+        return self.remaining() <= 0
+
+class CircuitBreaker:
+    """
+    Stops calling a failing backend for a while.
+    After `failure_threshold` consecutive failures the circuit opens and calls
+    are refused for `reset_timeout` seconds; then one trial call is let through
+    (half-open) and its outcome closes or reopens the circuit.
+    """
+
+    def __init__(self, name, failure_threshold=3, reset_timeout=30):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.failures = 0
+        self.opened_at = None
+        self.trial_running = False
+        self.lock = threading.Lock()
+
+    def allow(self):
+        """Whether a call may be made now."""
+        with self.lock:
+            if self.opened_at is None:
+                return True
+            if time.monotonic() - self.opened_at < self.reset_timeout or self.trial_running:
+                return False
+            self.trial_running = True
+            return True
+
+    def record_success(self):
+        with self.lock:
+            self.failures = 0
+            self.opened_at = None
+            self.trial_running = False
+
+    def record_failure(self):
+        with self.lock:
+            self.failures += 1
+            self.trial_running = False
+            if self.opened_at is not None or self.failures >= self.failure_threshold:
+                self.opened_at = time.monotonic()
+
+    def call(self, func, *args, **kwargs):
+        """Call func through the breaker, recording its outcome."""
+        if not self.allow():
+            raise CircuitOpen(f"{self.name} is unavailable (circuit open)")
+        try:
+            result = func(*args, **kwargs)
+        except Exception:
+            self.record_failure()
+            raise
+        self.record_success()
+        return result
+
+def call_with_deadline(func, timeout, hedge_after=None):
+    """
+    Run func() and return its result, raising DeadlineExceeded after timeout seconds.
+    With hedge_after, a second identical attempt is started if the first has not
+    finished after that many seconds, and whichever succeeds first wins; only use
+    it for idempotent calls. Raises the last error if every attempt fails.
+    """
+    deadline = Deadline(timeout)
+    attempts = {_executor.submit(func)}
+    hedged = hedge_after is None or hedge_after >= timeout
+    error = None
+
+    while attempts:
+        wait_for = deadline.remaining() if hedged else min(hedge_after, deadline.remaining())
+        done, attempts = wait(attempts, timeout=wait_for, return_when=FIRST_COMPLETED)
+        for future in done:
+            if future.exception() is None:
+                return future.result()
+            error = future.exception()
+        if deadline.expired():
+            break
+        if not hedged and (not done or not attempts):
+            # The first attempt is slow (or failed): start the hedge
+            hedged = True
+            attempts.add(_executor.submit(func))
+
+    if attempts or error is None:
+        raise DeadlineExceeded(f"call did not finish within {timeout:.2f}s")
+    raise error
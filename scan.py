@@ -0,0 +1,137 @@
+# scan.py
+import argparse
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from shards import _query_page, add_condition
+
+# Ranges paginated at once. Every request still waits for the shared Notion
+# rate limiter, so this only has to be large enough to hide request latency.
+SCAN_WORKERS = 6
+
+SCAN_PAGE_SIZE = 100
+
+OLDEST_FIRST = [{"property": "Timestamp", "direction": "ascending"}]
+
+def _timestamp(page):
+    return page["properties"].get("Timestamp", {}).get("number")
+
+def _range_filter(query_filter, lower_op, lower, upper):
+    if lower is not None:
+        query_filter = add_condition(query_filter, {"property": "Timestamp", "number": {lower_op: lower}})
+    else:
+        # Pages without a Timestamp are read by a chain of their own
+        query_filter = add_condition(query_filter, {"property": "Timestamp", "number": {"is_not_empty": True}})
+    if upper is not None:
+        query_filter = add_condition(query_filter, {"property": "Timestamp", "number": {"less_than": upper}})
+    return query_filter
+
+def _query(notion, database_id, query_filter, start_cursor=None, page_size=SCAN_PAGE_SIZE, sorts=OLDEST_FIRST):
+    query_kwargs = {"sorts": sorts, "page_size": page_size}
+    if query_filter is not None:
+        query_kwargs["filter"] = query_filter
+    if start_cursor:
+        query_kwargs["start_cursor"] = start_cursor
+    return _query_page(notion, database_id, query_kwargs)
+
+def _scan_bounds(notion, database_id, query_filter):
+    """Find the newest Timestamp and start the scan: one open range plus pages without a Timestamp."""
+    response = _query(notion, database_id, query_filter, page_size=1,
+                      sorts=[{"property": "Timestamp", "direction": "descending"}])
+    tasks = [("chain", database_id, query_filter, {"property": "Timestamp", "number": {"is_empty": True}}, None)]
+    newest = [_timestamp(page) for page in response.get("results", []) if _timestamp(page) is not None]
+    if newest:
+        tasks.append(("range", database_id, query_filter, ("greater_than_or_equal_to", None, None), newest[0]))
+    return [], tasks
+
+def _scan_chain(notion, database_id, query_filter, condition, start_cursor):
+    """Follow one cursor chain (used where a range cannot be split further)."""
+    response = _query(notion, database_id, add_condition(query_filter, condition), start_cursor)
+    if response.get("has_more"):
+        return response.get("results", []), [("chain", database_id, query_filter, condition, response.get("next_cursor"))]
+    return response.get("results", []), []
+
+def _scan_range(notion, database_id, query_filter, bounds, newest):
+    """
+    Fetch the oldest page of a Timestamp range. If the range holds more, keep
+    what lies below the last Timestamp seen and split the rest in two, so
+    dense parts of the table end up in more (and narrower) ranges.
+    """
+    lower_op, lower, upper = bounds
+    response = _query(notion, database_id, _range_filter(query_filter, lower_op, lower, upper))
+    pages = response.get("results", [])
+    if not response.get("has_more"):
+        return pages, []
+
+    last = _timestamp(pages[-1])
+    below = [page for page in pages if _timestamp(page) < last]
+    tasks = []
+    if not below:
+        # A whole page shares one Timestamp: read that Timestamp with a cursor
+        # chain and split what lies above it
+        tasks.append(("chain", database_id, query_filter, {"property": "Timestamp", "number": {"equals": last}}, None))
+        lower_op = "greater_than"
+    else:
+        lower_op = "greater_than_or_equal_to"
+
+    top = upper if upper is not None else newest
+    middle = (last + top) / 2
+    if last < middle < top:
+        tasks.append(("range", database_id, query_filter, (lower_op, last, middle), newest))
+        tasks.append(("range", database_id, query_filter, ("greater_than_or_equal_to", middle, upper), newest))
+    else:
+        tasks.append(("range", database_id, query_filter, (lower_op, last, upper), newest))
+    return below, tasks
+
+def _run(notion, task):
+    kind, database_id, query_filter, *args = task
+    if kind == "bounds":
+        return _scan_bounds(notion, database_id, query_filter)
+    if kind == "chain":
+        return _scan_chain(notion, database_id, query_filter, *args)
+    return _scan_range(notion, database_id, query_filter, *args)
+
+def scan_pages(notion, database_ids, query_filter=None, workers=SCAN_WORKERS):
+    """
+    Fetch every page matching query_filter from each database.
+    Instead of one next_cursor chain per database, the Timestamp axis is split
+    into ranges as the scan discovers where the pages are, and the ranges are
+    paginated in parallel under the shared Notion rate limiter.
+    Returns the pages oldest first.
+    """
+    results = []
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        pending = {executor.submit(_run, notion, ("bounds", database_id, query_filter)) for database_id in database_ids}
+        while pending:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                pages, tasks = future.result()
+                results.extend(pages)
+                pending.update(executor.submit(_run, notion, task) for task in tasks)
+    results.sort(key=lambda page: _timestamp(page) or 0)
+    return results
+
+def main():
+    # Imported here so importing the scan engine does not need the clients
+    from basic_functionality import notion, query_all
+    from shards import all_shards
+
+    parser = argparse.ArgumentParser(description="Time a full scan of the message database")
+    parser.add_argument("--workers", type=int, default=SCAN_WORKERS)
+    parser.add_argument("--compare", action="store_true", help="Also time the sequential cursor scan")
+    args = parser.parse_args()
+
+    started = time.monotonic()
+    pages = scan_pages(notion, all_shards(), workers=args.workers)
+    elapsed = time.monotonic() - started
+    print(f"Range scan: {len(pages)} pages in {elapsed:.1f}s with {args.workers} workers")
+
+    if args.compare:
+        started = time.monotonic()
+        sequential = query_all(page_size=SCAN_PAGE_SIZE)
+        elapsed = time.monotonic() - started
+        print(f"Cursor scan: {len(sequential)} pages in {elapsed:.1f}s")
+        if {page["id"] for page in sequential} != {page["id"] for page in pages}:
+            print("Warning: the two scans returned different pages (was the database modified meanwhile?)")
+
+if __name__ == "__main__":
+    main()
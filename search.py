@@ -1,73 +1,154 @@
 # search.py
 from datetime import datetime
-from utils import format_message, print_message
+from archive import archive_page, continue_into_archive, parse_archive_cursor
+from query_cache import result_cache
+from shards import all_shards, is_sharded, query_shards
+from utils import DEFAULT_PAGE_SIZE, format_cc, format_message, parse_date
 
-def search_command(notion, database_id, search_term=None, current_user=None):
+def build_search_filter(search_term, current_user, since=None, until=None, sender=None):
+    """
+    Build the Notion filter matching search_term in Sender, Recipient, or Message,
+    restricted to messages where current_user is the sender or recipient.
+    search_term may also be a list of terms, any of which may match, or empty
+    when only the other filters apply.
+    since/until (Timestamps, until exclusive) and sender narrow the match in Notion itself.
+    """
+    terms = [search_term] if isinstance(search_term, str) else search_term
+    conditions = [
+        {
+            "or": [
+                {"property": "Sender", "rich_text": {"equals": current_user}},
+                {"property": "Recipient", "rich_text": {"equals": current_user}}
+            ]
+        }
+    ]
+    terms = [term for term in terms or [] if term]
+    if terms:
+        conditions.append({
+            "or": [
+                condition
+                for term in terms
+                for condition in (
+                    {"property": "Sender", "rich_text": {"contains": term}},
+                    {"property": "Recipient", "rich_text": {"contains": term}},
+                    {"property": "Message", "title": {"contains": term}}
+                )
+            ]
+        })
+    if since is not None:
+        conditions.append({"property": "Timestamp", "number": {"greater_than_or_equal_to": since}})
+    if until is not None:
+        conditions.append({"property": "Timestamp", "number": {"less_than": until}})
+    if sender:
+        conditions.append({"property": "Sender", "rich_text": {"equals": sender}})
+    return {"and": conditions}
+
+def describe_search(search_term, since=None, until=None, sender=None):
+    """Describe a search for headings, e.g. "containing 'budget' from Alice since 2025-03-01"."""
+    parts = [f"containing '{search_term}'"] if search_term else []
+    if sender:
+        parts.append(f"from {sender}")
+    if since is not None:
+        parts.append(f"since {datetime.fromtimestamp(since):%Y-%m-%d}")
+    if until is not None:
+        parts.append(f"before {datetime.fromtimestamp(until):%Y-%m-%d %H:%M}")
+    return " ".join(parts)
+
+def search_command(notion, database_id, search_term=None, current_user=None,
+                   limit=DEFAULT_PAGE_SIZE, start_cursor=None, since=None, until=None, sender=None):
     """
     Searches through messages for the search_term in Sender, Recipient, or Message.
     Only displays messages where current_user is involved (as sender or recipient).
-    Results are displayed in chronological order.
+    since/until ("YYYY-MM-DD" or Timestamps) and sender restrict the results;
+    they are applied by Notion, not after fetching. search_term may be empty
+    if one of them is given.
+    Results are sorted by Notion, newest first, `limit` at a time; pass the
+    returned cursor as start_cursor to fetch the next (older) page.
+    When shards are configured, every shard is searched and database_id is ignored.
+    Once the live results run out, paging continues into the local archive.
+    Returns (displayed_results, next_cursor).
     """
     if search_term is None:
         search_term = input("Enter search term: ").strip()
-    
+
     if current_user is None:
         current_user = input("Current user: ").strip()
-    
-    query_filter = {
-        "or": [
-            {"property": "Sender", "rich_text": {"contains": search_term}},
-            {"property": "Recipient", "rich_text": {"contains": search_term}},
-            {"property": "Message", "title": {"contains": search_term}}
-        ]
-    }
-    
-    response = notion.databases.query(
-        database_id=database_id,
-        filter=query_filter
-    )
-    results = response.get("results", [])
-    
-    def get_timestamp(page):
-        try:
-            return page["properties"].get("Timestamp", {}).get("number", 0)
-        except Exception:
-            return 0
-    sorted_results = sorted(results, key=get_timestamp)
-    
-    if not sorted_results:
-        print(f"No messages found containing '{search_term}'.")
-        return []
-    
-    print(f"\nSearch results for '{search_term}' ({len(sorted_results)} messages):\n")
-    displayed = 0
+
+    try:
+        since = parse_date(since)
+        until = parse_date(until, end_of_day=True)
+    except ValueError as e:
+        print(f"Error: {e}")
+        return [], None
+    if not search_term and since is None and until is None and not sender:
+        print("Error: provide a search term or a filter.")
+        return [], None
+    filters = {"since": since, "until": until, "sender": sender}
+
+    archive_before = parse_archive_cursor(start_cursor)
+    if archive_before is not None:
+        # Paging has reached back past the live database into the archive
+        results, next_cursor = archive_page(
+            current_user, "participant", archive_before, limit, term=search_term, **filters
+        )
+    else:
+        def fetch_results():
+            # With sharding enabled the search visits every shard, not just database_id
+            database_ids = all_shards() if is_sharded() else [database_id]
+            results, next_cursor = query_shards(
+                notion,
+                database_ids,
+                build_search_filter(search_term, current_user, **filters),
+                limit,
+                start_cursor
+            )
+            return continue_into_archive(
+                results, next_cursor, current_user, "participant", limit, term=search_term, **filters
+            )
+
+        # Repeated searches are served from the cache until the user's mail changes
+        params = dict(filters, term=search_term, limit=limit, cursor=start_cursor)
+        results, next_cursor = result_cache.cached("search_command", current_user, params, fetch_results)
+        results = list(results)
+
+    description = describe_search(search_term, since, until, sender)
+    if not results:
+        print(f"No messages found {description} for user {current_user}.")
+        return [], None
+
+    # Build the whole screen and print it in one call
+    lines = [f"\nSearch results {description} ({len(results)} messages):\n"]
     displayed_results = []
-    
-    for page in sorted_results:
+
+    for page in results:
         properties = page["properties"]
+        number = len(displayed_results) + 1
         sender_text, message_text = format_message(properties)
         recipient_parts = properties.get("Recipient", {}).get("rich_text", [])
         recipient_text = "".join([part.get("plain_text", "") for part in recipient_parts])
-        
+
         # Only display the message if current_user is involved
         if current_user.lower() not in (sender_text.lower(), recipient_text.lower()):
             continue
-        
+
         timestamp_number = properties.get("Timestamp", {}).get("number", None)
         date_str = ""
         if timestamp_number:
             dt_obj = datetime.fromtimestamp(timestamp_number)
             date_str = dt_obj.strftime("%Y-%m-%d %H:%M:%S")
-        
-        print(f"[{date_str}]")
-        print(f"From: {sender_text}")
-        print(f"To:   {recipient_text}")
-        print(message_text)
-        print("-" * 40)
-        displayed += 1
+
+        lines.append(f"#{number} [{date_str}]")
+        lines.append(f"From: {sender_text}")
+        lines.append(f"To:   {recipient_text}")
+        cc_text = format_cc(properties)
+        if cc_text:
+            lines.append(f"Cc:   {cc_text}")
+        lines.append(message_text)
+        lines.append("-" * 40)
         displayed_results.append(page)
 
-    if displayed == 0:
-        print(f"No messages found containing '{search_term}' for user {current_user}.")
-    
-    return displayed_results
\ No newline at end of file
+    if next_cursor:
+        lines.append("(older results available)")
+    print("\n".join(lines))
+
+    return displayed_results, next_cursor
@@ -2,18 +2,20 @@
 import os
 from dotenv import load_dotenv
 from pinecone import Pinecone
-from utils import format_message, print_message
+from archive import archive_cutoff, semantic_matches as archive_semantic_matches, tokenize
+from embedding import embed_query, get_version, parent_page_id, version_index
+from resilience import CircuitBreaker, Deadline, call_with_deadline
+from utils import format_message, parse_date
 
 # Load environment variables
 load_dotenv()
 PINECONE_API_KEY = os.environ.get("PINECONE_API_KEY")
-PINECONE_INDEX_NAME = os.environ.get("PINECONE_INDEX_NAME", "notion-mail")
 
 # Initialize Pinecone client if possible
 try:
     if PINECONE_API_KEY:
         pc = Pinecone(api_key=PINECONE_API_KEY)
-        index = pc.Index(PINECONE_INDEX_NAME)
+        index = version_index(pc, get_version())
     else:
         pc = None
         index = None
@@ -22,14 +24,185 @@ except Exception as e:
     pc = None
     index = None
 
-def semantic_search(query=None, current_user=None, top_k=3, namespace="notion_mail"):
+# Chunks fetched per requested result, so several chunks of one message
+# still leave enough distinct messages after aggregation and user filtering
+CHUNKS_PER_RESULT = 10
+
+# Seconds the vector path (query embedding plus index query) may take before
+# falling back to keyword results
+SEARCH_DEADLINE = 3.0
+
+# Start a second, identical Pinecone request if the first has not answered
+# after this many seconds (None disables hedging)
+HEDGE_AFTER = 1.0
+
+# Stop calling Pinecone for a while after repeated failures or timeouts
+pinecone_breaker = CircuitBreaker("Pinecone", failure_threshold=3, reset_timeout=30)
+
+# Query words tried by the keyword fallback, longest first
+FALLBACK_TERMS = 3
+STOPWORDS = {
+    "about", "and", "any", "are", "emails", "for", "from", "messages", "mail", "mails",
+    "that", "the", "this", "what", "with", "where", "which", "who", "email", "message"
+}
+
+def pool_matches(matches, pooling="max"):
+    """
+    Aggregate chunk matches into one hit per message.
+    "max" scores a message by its best chunk, "sum" by the total of its chunk scores.
+    Returns hits sorted by score, each with the text of its best-scoring chunk.
+    """
+    hits = {}
+    for match in matches:
+        metadata = match.get("metadata", {})
+        page_id = metadata.get("page_id") or parent_page_id(match.get("id", ""))
+        score = match.get("score", 0)
+        hit = hits.get(page_id)
+        if hit is None:
+            hits[page_id] = {"id": page_id, "score": score, "best": score, "text": metadata.get("text", "")}
+            continue
+        if pooling == "sum":
+            hit["score"] += score
+        else:
+            hit["score"] = max(hit["score"], score)
+        if score > hit["best"]:
+            hit["best"] = score
+            hit["text"] = metadata.get("text", "")
+    return sorted(hits.values(), key=lambda hit: hit["score"], reverse=True)
+
+def user_hits(matches, current_user, top_k, pooling="max"):
+    """
+    Pool chunk matches per message and keep the top_k messages that involve
+    current_user (as sender or recipient), each shown by its best chunk.
+    """
+    hits = []
+    for hit in pool_matches(matches, pooling=pooling):
+        # Parse the text format: "Sender: X\nRecipient: Y\nMessage: Z"
+        lines = hit["text"].splitlines()
+        if len(lines) < 2:
+            continue
+        
+        # Extract sender and recipient values
+        sender = lines[0].replace("Sender:", "").strip()
+        recipient = lines[1].replace("Recipient:", "").strip()
+        
+        # Check if current_user matches either sender or recipient (case-insensitive)
+        if current_user.lower() in (sender.lower(), recipient.lower()):
+            hits.append({
+                "id": hit["id"],
+                "score": hit["score"],
+                "sender": sender,
+                "recipient": recipient,
+                "message": "\n".join(lines[2:]).replace("Message:", "", 1).strip()
+            })
+            if len(hits) >= top_k:
+                break
+    return hits
+
+def metadata_filter(since=None, until=None, sender=None):
+    """
+    Pinecone metadata filter for date (Timestamps, until exclusive) and sender
+    restrictions, or None. Vectors written before these fields were stored
+    only match once pinecone_embed_all.py has been rerun.
+    """
+    conditions = {}
+    timestamp = {}
+    if since is not None:
+        timestamp["$gte"] = since
+    if until is not None:
+        timestamp["$lt"] = until
+    if timestamp:
+        conditions["timestamp"] = timestamp
+    if sender:
+        conditions["sender"] = {"$eq": sender.lower()}
+    return conditions or None
+
+def vector_matches(query, top_k, namespace, deadline, hedge_after, version=None, query_filter=None):
+    """
+    Embed the query and fetch its chunk matches from an embedding version
+    (the active one by default), all within the deadline.
+    query_filter is an optional Pinecone metadata filter.
+    Returns (query_vector, matches); raises DeadlineExceeded, CircuitOpen or
+    the Pinecone error.
+    """
+    version = version or get_version()
+    version_idx = version_index(pc, version)
+    query_vector = pinecone_breaker.call(
+        call_with_deadline,
+        lambda: embed_query(pc, query, version),
+        deadline.remaining(),
+        hedge_after
+    )
+    query_kwargs = {"filter": query_filter} if query_filter else {}
+    results = pinecone_breaker.call(
+        call_with_deadline,
+        lambda: version_idx.query(
+            namespace=namespace or version["namespace"],
+            vector=query_vector,
+            top_k=top_k * CHUNKS_PER_RESULT,  # request more to account for pooling and filtering
+            include_values=False,
+            include_metadata=True,
+            **query_kwargs
+        ),
+        deadline.remaining(),
+        hedge_after
+    )
+    return query_vector, results["matches"]
+
+def keyword_fallback(query, current_user, top_k, since=None, until=None, sender=None):
+    """
+    Keyword search for the longest words of a semantic query, used when the
+    vector path is unavailable. Hits are scored by the share of words they
+    contain and tagged as degraded. Date and sender filters still apply.
+    """
+    # Imported here so semantic search alone does not need the Notion client
+    from basic_functionality import notion
+    from search import build_search_filter
+    from shards import all_shards, query_shards
+
+    words = fallback_terms(query)
+    if not words and since is None and until is None and not sender:
+        return []
+    query_filter = build_search_filter(words, current_user, since=since, until=until, sender=sender)
+    pages, _ = query_shards(notion, all_shards(), query_filter, top_k * 3)
+    return keyword_hits(pages, words, top_k)
+
+def fallback_terms(query):
+    """The words of a semantic query the keyword fallback searches for."""
+    return sorted(tokenize(query) - STOPWORDS, key=len, reverse=True)[:FALLBACK_TERMS]
+
+def keyword_hits(pages, words, top_k):
+    """Score keyword-matched pages like semantic hits, tagged as degraded."""
+    hits = []
+    for page in pages:
+        properties = page["properties"]
+        sender, message = format_message(properties)
+        recipient = "".join(part.get("plain_text", "") for part in properties.get("Recipient", {}).get("rich_text", []))
+        text = f"{sender} {recipient} {message}".lower()
+        hits.append({
+            "id": page["id"],
+            "score": sum(1 for word in words if word in text) / len(words) if words else 0.0,
+            "sender": sender,
+            "recipient": recipient,
+            "message": message,
+            "degraded": True
+        })
+    # Stable sort keeps Notion's newest-first order among equal scores
+    hits.sort(key=lambda hit: hit["score"], reverse=True)
+    return hits[:top_k]
+
+def semantic_search(query=None, current_user=None, top_k=3, namespace=None, pooling="max",
+                    deadline=SEARCH_DEADLINE, hedge_after=HEDGE_AFTER, since=None, until=None, sender=None):
     """
     Uses Pinecone's inference API to find semantically similar messages.
+    Messages are indexed as several chunk vectors; chunk hits are pooled per
+    message ("max" or "sum") before the top_k messages are picked.
     Only returns messages that involve the current_user (as sender or recipient).
+    since/until ("YYYY-MM-DD" or Timestamps) and sender are applied as Pinecone
+    metadata filters, so only matching chunks are fetched.
+    If Pinecone misses the deadline (seconds), fails, or its circuit breaker is
+    open, keyword results are returned instead, each tagged "degraded".
     """
-    if not pc or not index:
-        print("Error: Pinecone is not properly configured. Semantic search unavailable.")
-        return []
     
     if query is None:
         query = input("Enter a phrase for semantic search: ").strip()
@@ -42,69 +215,47 @@ def semantic_search(query=None, current_user=None, top_k=3, namespace="notion_ma
         return []
 
     try:
-        # Embed the query using Pinecone's inference service
-        embeddings = pc.inference.embed(
-            model="llama-text-embed-v2",
-            inputs=[query],
-            parameters={"input_type": "query"}
-        )
-        query_vector = embeddings[0]["values"]
-
-        # Query the index for similar vectors
-        results = index.query(
-            namespace=namespace,
-            vector=query_vector,
-            top_k=top_k * 3,  # request more to account for filtering
-            include_values=False,
-            include_metadata=True
-        )
-    except Exception as e:
-        print(f"Error performing semantic search: {e}")
+        filters = {"since": parse_date(since), "until": parse_date(until, end_of_day=True), "sender": sender}
+    except ValueError as e:
+        print(f"Error: {e}")
         return []
 
-    print(f"\nSemantic search results for '{query}':")
-    displayed = 0
-    displayed_results = []
-    
-    for match in results["matches"]:
-        metadata = match.get("metadata", {})
-        text = metadata.get("text", "")
-        
-        # Parse the text format: "Sender: X\nRecipient: Y\nMessage: Z"
-        lines = text.splitlines()
-        if len(lines) >= 2:
-            sender_line = lines[0]
-            recipient_line = lines[1]
-            
-            # Extract sender and recipient values
-            sender = sender_line.replace("Sender:", "").strip()
-            recipient = recipient_line.replace("Recipient:", "").strip()
-            
-            # Check if current_user matches either sender or recipient (case-insensitive)
-            if current_user.lower() in (sender.lower(), recipient.lower()):
-                # Reconstruct message format for display
-                message_content = "\n".join(lines[2:]).replace("Message:", "", 1).strip()
-                
-                score = match.get("score", 0)
-                print(f"\nScore: {score:.4f}")
-                print(f"From: {sender}")
-                print(f"To: {recipient}")
-                print(message_content)
-                print("-" * 40)
-                
-                displayed += 1
-                displayed_results.append({
-                    "id": match.get("id"),
-                    "score": score,
-                    "sender": sender,
-                    "recipient": recipient,
-                    "message": message_content
-                })
-                
-                if displayed >= top_k:
-                    break
+    degraded_reason = None
+    if not pc or not index:
+        degraded_reason = "Pinecone is not configured"
+    else:
+        try:
+            query_vector, matches = vector_matches(
+                query, top_k, namespace, Deadline(deadline), hedge_after, query_filter=metadata_filter(**filters)
+            )
+        except Exception as e:
+            degraded_reason = str(e) or type(e).__name__
+
+    if degraded_reason:
+        print(f"Warning: semantic search unavailable ({degraded_reason}); showing keyword results instead.")
+        try:
+            displayed_results = keyword_fallback(query, current_user, top_k, **filters)
+        except Exception as e:
+            print(f"Error performing keyword fallback search: {e}")
+            return []
+    else:
+        displayed_results = user_hits(matches, current_user, top_k, pooling=pooling)
+
+        # Old mail may have been moved (with its vectors) into the local archive;
+        # only look there when the live index cannot fill the results
+        if len(displayed_results) < top_k and archive_cutoff() is not None:
+            archived = archive_semantic_matches(query_vector, current_user, top_k * CHUNKS_PER_RESULT, **filters)
+            displayed_results = user_hits(matches + archived, current_user, top_k, pooling=pooling)
+
+    print(f"\nSemantic search results for '{query}'{' (degraded: keyword matches)' if degraded_reason else ''}:")
+    for hit in displayed_results:
+        print(f"\nScore: {hit['score']:.4f}")
+        print(f"From: {hit['sender']}")
+        print(f"To: {hit['recipient']}")
+        print(hit["message"])
+        print("-" * 40)
     
-    if displayed == 0:
+    if not displayed_results:
         print(f"No matching messages found for user '{current_user}'.")
     
     return displayed_results
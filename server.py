@@ -0,0 +1,239 @@
+# server.py
+import argparse
+import json
+import os
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from basic_functionality import (
+    DATABASE_ID, notion, count_unread, open_message, read_mail, save_attachments, send_mail
+)
+from chat_engine import chat_turn, load_documentation, new_memory
+from query_cache import result_cache
+from search import search_command
+from semantic_search import semantic_search
+from utils import DEFAULT_PAGE_SIZE, capture_output
+
+DEFAULT_HOST = "127.0.0.1"
+DEFAULT_PORT = 8765
+
+# Attachments are only read from, and saved into, this directory; calls name
+# files relative to it (set with --files-dir)
+DEFAULT_FILES_DIR = "server_files"
+files_dir = os.path.abspath(DEFAULT_FILES_DIR)
+
+# Loaded once and shared by every chat call
+documentation = load_documentation()
+
+# One conversation memory per user, kept for the life of the server
+memories = {}
+memories_lock = threading.Lock()
+
+def memory_for(user):
+    with memories_lock:
+        if user not in memories:
+            memories[user] = new_memory()
+        return memories[user]
+
+class InvalidParams(ValueError):
+    """Raised when a call is missing a required parameter or names a file it may not use."""
+
+def require(params, name):
+    """
+    Return a required parameter.
+    The primitives prompt with input() for missing values, which must never
+    happen inside the server, so missing values are rejected here.
+    """
+    value = params.get(name)
+    if value is None or value == "":
+        raise InvalidParams(f"Missing required parameter: {name}")
+    return value
+
+def resolve_path(name):
+    """
+    Path of a file or directory named by a call, inside files_dir.
+    Absolute paths and ".." are rejected so calls cannot reach other files.
+    """
+    if not isinstance(name, str) or not name.strip():
+        raise InvalidParams("File names must be non-empty strings")
+    name = name.strip()
+    if os.path.isabs(name) or os.path.splitdrive(name)[0] or ".." in name.replace("\\", "/").split("/"):
+        raise InvalidParams(f"File names must be relative to the server's files directory: {name}")
+    path = os.path.realpath(os.path.join(files_dir, name))
+    if os.path.commonpath([path, os.path.realpath(files_dir)]) != os.path.realpath(files_dir):
+        # A symlink inside files_dir pointing elsewhere
+        raise InvalidParams(f"File names must be relative to the server's files directory: {name}")
+    return path
+
+# Each handler returns (printed output, result)
+
+def handle_send(params):
+    attachments = params.get("attachments") or []
+    if isinstance(attachments, str):
+        attachments = [name for name in attachments.split(",") if name.strip()]
+    if not isinstance(attachments, list):
+        raise InvalidParams("attachments must be a list of file names")
+    return capture_output(
+        send_mail,
+        sender=require(params, "sender"),
+        recipient=require(params, "recipient"),
+        message=require(params, "message"),
+        cc=params.get("cc") or "",
+        bcc=params.get("bcc") or "",
+        attachments=[resolve_path(name) for name in attachments]
+    )
+
+def handle_read(params):
+    return capture_output(
+        read_mail,
+        user=require(params, "user"),
+        new_only=bool(params.get("new", False)),
+        limit=params.get("limit") or DEFAULT_PAGE_SIZE,
+        start_cursor=params.get("cursor")
+    )
+
+def handle_count_unread(params):
+    return "", count_unread(require(params, "user"))
+
+def handle_open(params):
+    return capture_output(open_message, require(params, "page"))
+
+def handle_save_attachments(params):
+    return capture_output(save_attachments, require(params, "page"), resolve_path(params.get("directory") or "."))
+
+def handle_search(params):
+    return capture_output(
+        search_command,
+        notion,
+        DATABASE_ID,
+        search_term=params.get("keyword", ""),
+        current_user=require(params, "user"),
+        limit=params.get("limit") or DEFAULT_PAGE_SIZE,
+        start_cursor=params.get("cursor"),
+        since=params.get("since"),
+        until=params.get("until"),
+        sender=params.get("from")
+    )
+
+def handle_semantic_search(params):
+    return capture_output(
+        semantic_search,
+        query=require(params, "query"),
+        current_user=require(params, "user"),
+        top_k=params.get("top_k") or 3,
+        since=params.get("since"),
+        until=params.get("until"),
+        sender=params.get("from")
+    )
+
+def handle_chat(params):
+    user = require(params, "user")
+    memory = memory_for(user)
+    instruction, answer = chat_turn(
+        require(params, "prompt"),
+        documentation,
+        notion,
+        DATABASE_ID,
+        user,
+        memory,
+        # Attachments the model names are confined like those of `send` calls
+        resolve_attachment=resolve_path
+    )
+    return "", {
+        "instruction": instruction,
+        "answer": answer,
+        "usage": memory.usage,
+        "context_tokens": memory.context_tokens()
+    }
+
+def handle_cache_stats(params):
+    return "", result_cache.snapshot()
+
+METHODS = {
+    "send": handle_send,
+    "read": handle_read,
+    "count_unread": handle_count_unread,
+    "open": handle_open,
+    "save_attachments": handle_save_attachments,
+    "search": handle_search,
+    "semantic_search": handle_semantic_search,
+    "chat": handle_chat,
+    "cache_stats": handle_cache_stats,
+}
+
+class MailRequestHandler(BaseHTTPRequestHandler):
+    """Serves JSON-RPC 2.0 calls posted to any path."""
+
+    def do_POST(self):
+        try:
+            length = int(self.headers.get("Content-Length", 0))
+            request = json.loads(self.rfile.read(length))
+        except (ValueError, json.JSONDecodeError):
+            self.reply(None, error={"code": -32700, "message": "Parse error"})
+            return
+
+        # Batches are not supported; every call is one JSON object
+        if not isinstance(request, dict) or not isinstance(request.get("method"), str):
+            self.reply(None, error={"code": -32600, "message": "Invalid Request"})
+            return
+
+        request_id = request.get("id")
+        handler = METHODS.get(request["method"])
+        if handler is None:
+            self.reply(request_id, error={"code": -32601, "message": f"Unknown method: {request['method']}"})
+            return
+
+        params = request.get("params") or {}
+        if not isinstance(params, dict):
+            self.reply(request_id, error={"code": -32602, "message": "params must be an object"})
+            return
+
+        try:
+            output, result = handler(params)
+        except InvalidParams as e:
+            self.reply(request_id, error={"code": -32602, "message": str(e)})
+            return
+        except Exception as e:
+            self.reply(request_id, error={"code": -32000, "message": f"{type(e).__name__}: {e}"})
+            return
+        self.reply(request_id, result={"output": output, "result": result})
+
+    def reply(self, request_id, result=None, error=None):
+        body = {"jsonrpc": "2.0", "id": request_id}
+        if error is not None:
+            body["error"] = error
+        else:
+            body["result"] = result
+        data = json.dumps(body).encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+def main():
+    parser = argparse.ArgumentParser(description="Serve NotionMail primitives over local JSON-RPC")
+    parser.add_argument("--host", default=DEFAULT_HOST, help="Interface to listen on")
+    parser.add_argument("--port", type=int, default=DEFAULT_PORT, help="Port to listen on")
+    parser.add_argument("--files-dir", default=DEFAULT_FILES_DIR,
+                        help="Directory attachments are read from and saved into")
+    args = parser.parse_args()
+
+    global files_dir
+    files_dir = os.path.abspath(args.files_dir)
+    os.makedirs(files_dir, exist_ok=True)
+
+    # One thread per connection; clients, caches and documentation are shared
+    server = ThreadingHTTPServer((args.host, args.port), MailRequestHandler)
+    server.daemon_threads = True
+    print(f"NotionMail server listening on http://{args.host}:{args.port}")
+    print(f"Point the CLIs at it with NOTIONMAIL_SERVER=http://{args.host}:{args.port}")
+    print(f"Attachments are read from and saved into {files_dir}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        print("\nShutting down NotionMail server.")
+    finally:
+        server.server_close()
+
+if __name__ == "__main__":
+    main()
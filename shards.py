@@ -0,0 +1,204 @@
+# shards.py
+import json
+import os
+import zlib
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from dotenv import load_dotenv
+from rate_limiter import notion_limiter
+from utils import NEWEST_FIRST
+
+# Load environment variables
+load_dotenv()
+DATABASE_ID = os.environ.get("DATABASE_ID")
+
+# Routing configuration written by `python dev.py shards ...`. Two layouts:
+#   {"strategy": "recipient", "shards": ["<database id>", ...]}
+#   {"strategy": "month", "shards": {"2025-03": "<database id>", ...}}
+# Without the file every message lives in DATABASE_ID.
+SHARDS_FILE = "shards.json"
+
+# Prefix of the cursors used to page through merged results of several shards
+BEFORE_CURSOR_PREFIX = "before:"
+
+def load_shard_config():
+    """Load the shard routing configuration (a single unsharded database if none exists)."""
+    try:
+        with open(SHARDS_FILE, "r") as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return {"strategy": "none", "shards": []}
+
+def save_shard_config(config):
+    """Write the shard routing configuration atomically."""
+    tmp_path = SHARDS_FILE + ".tmp"
+    with open(tmp_path, "w") as f:
+        json.dump(config, f, indent=4)
+    os.replace(tmp_path, SHARDS_FILE)
+
+def month_key(timestamp):
+    """Time bucket of a message Timestamp, e.g. "2025-03"."""
+    return datetime.fromtimestamp(timestamp).strftime("%Y-%m")
+
+def recipient_shard(recipient, shards):
+    """Pick a recipient's shard with a hash that is stable across processes."""
+    return shards[zlib.crc32(recipient.lower().encode()) % len(shards)]
+
+def is_sharded():
+    """Whether messages are spread across several databases."""
+    return load_shard_config()["strategy"] != "none"
+
+def all_shards():
+    """Every database that may hold messages."""
+    config = load_shard_config()
+    if config["strategy"] == "recipient":
+        return list(config["shards"])
+    if config["strategy"] == "month":
+        # Months without a shard of their own stay in DATABASE_ID
+        return list(dict.fromkeys(list(config["shards"].values()) + [DATABASE_ID]))
+    return [DATABASE_ID]
+
+def shard_for_write(recipient, timestamp):
+    """Database that stores the copy of a message delivered to recipient at timestamp."""
+    config = load_shard_config()
+    if config["strategy"] == "recipient":
+        return recipient_shard(recipient, config["shards"])
+    if config["strategy"] == "month":
+        return config["shards"].get(month_key(timestamp), DATABASE_ID)
+    return DATABASE_ID
+
+def shards_for_read(recipient=None, since=None):
+    """
+    Databases a query has to visit.
+    An inbox (messages *to* recipient) lives in a single shard under recipient
+    hashing; monthly shards older than `since` are skipped; anything else has
+    to visit every shard.
+    """
+    config = load_shard_config()
+    if recipient and config["strategy"] == "recipient":
+        return [recipient_shard(recipient, config["shards"])]
+    if since and config["strategy"] == "month":
+        first_month = month_key(since)
+        recent = [db for month, db in config["shards"].items() if month >= first_month]
+        return list(dict.fromkeys(recent + [DATABASE_ID]))
+    return all_shards()
+
+def add_condition(query_filter, condition):
+    """AND a condition onto a filter without nesting deeper than Notion allows."""
+    if query_filter is None:
+        return condition
+    if "and" in query_filter:
+        return {"and": query_filter["and"] + [condition]}
+    return {"and": [query_filter, condition]}
+
+def _query_page(notion, database_id, query_kwargs):
+    notion_limiter.acquire()
+    return notion.databases.query(database_id=database_id, **query_kwargs)
+
+def page_key(page):
+    """Order of a page in merged listings: by Timestamp, then page ID to break ties."""
+    return (page["properties"].get("Timestamp", {}).get("number") or 0, page["id"])
+
+def parse_before_cursor(start_cursor):
+    """(Timestamp, page ID) of the last page shown before a "before:" cursor."""
+    before, _, page_id = start_cursor[len(BEFORE_CURSOR_PREFIX):].partition(":")
+    return float(before), page_id
+
+def below_cursor(pages, start_cursor):
+    """
+    Drop the pages a "before:" cursor has already shown. Notion cannot filter
+    on page IDs, so shards are queried from the cursor's Timestamp inclusive
+    and the pages sharing it are cut here.
+    """
+    if not start_cursor:
+        return pages
+    cursor_key = parse_before_cursor(start_cursor)
+    return [page for page in pages if page_key(page) < cursor_key]
+
+def shard_needs_more(pages, limit, has_more):
+    """
+    Whether one shard's results must be followed further before merging: it has
+    fewer than limit pages past the cursor, or more pages with the Timestamp of
+    its limit-th page may follow (ties are ordered by page ID, so all of them are needed).
+    """
+    if not has_more:
+        return False
+    if len(pages) < limit:
+        return True
+    return page_key(pages[-1])[0] == page_key(pages[limit - 1])[0]
+
+def _query_shard(notion, database_id, query_kwargs, limit, start_cursor):
+    """One shard's newest pages past a "before:" cursor, as (pages, has_more)."""
+    pages = []
+    query_kwargs = dict(query_kwargs)
+    while True:
+        response = _query_page(notion, database_id, query_kwargs)
+        pages.extend(below_cursor(response.get("results", []), start_cursor))
+        if not shard_needs_more(pages, limit, response.get("has_more")):
+            return pages, bool(response.get("has_more"))
+        query_kwargs["start_cursor"] = response.get("next_cursor")
+
+def merge_shard_pages(shard_pages, limit):
+    """
+    Merge the (pages, has_more) of every shard into one page, newest first.
+    Returns (results, next_cursor); the cursor resumes below the (Timestamp,
+    page ID) of the last page shown, since per-shard Notion cursors cannot be
+    combined and copies of one message share a Timestamp.
+    """
+    merged = sorted((page for pages, _ in shard_pages for page in pages), key=page_key, reverse=True)
+    results = merged[:limit]
+    has_more = len(merged) > limit or any(more for _, more in shard_pages)
+    if not has_more or not results:
+        return results, None
+    timestamp, page_id = page_key(results[-1])
+    return results, f"{BEFORE_CURSOR_PREFIX}{timestamp}:{page_id}"
+
+def shard_query_kwargs(query_filter, limit, start_cursor, sorts=NEWEST_FIRST):
+    """Query arguments for one shard's page of a merged, multi-shard listing."""
+    if start_cursor:
+        before, _ = parse_before_cursor(start_cursor)
+        query_filter = add_condition(query_filter, {"property": "Timestamp", "number": {"less_than_or_equal_to": before}})
+    query_kwargs = {"sorts": sorts, "page_size": limit}
+    if query_filter is not None:
+        query_kwargs["filter"] = query_filter
+    return query_kwargs
+
+def query_shards(notion, database_ids, query_filter, limit, start_cursor=None):
+    """
+    Fetch one page of results (newest first) across shards.
+    A single shard is paged with its own Notion cursor; several shards are
+    queried in parallel and merged. Returns (results, next_cursor).
+    """
+    if len(database_ids) == 1:
+        query_kwargs = shard_query_kwargs(query_filter, limit, None)
+        if start_cursor:
+            query_kwargs["start_cursor"] = start_cursor
+        response = _query_page(notion, database_ids[0], query_kwargs)
+        next_cursor = response.get("next_cursor") if response.get("has_more") else None
+        return response.get("results", []), next_cursor
+
+    query_kwargs = shard_query_kwargs(query_filter, limit, start_cursor)
+    with ThreadPoolExecutor(max_workers=len(database_ids)) as executor:
+        shard_pages = list(executor.map(
+            lambda db: _query_shard(notion, db, query_kwargs, limit, start_cursor), database_ids
+        ))
+    return merge_shard_pages(shard_pages, limit)
+
+def query_all_shards(notion, database_ids, **query_kwargs):
+    """Fetch every matching page from each shard, following cursors, with shards in parallel."""
+    def query_one(database_id):
+        results = []
+        kwargs = dict(query_kwargs)
+        while True:
+            response = _query_page(notion, database_id, kwargs)
+            results.extend(response.get("results", []))
+            if not response.get("has_more"):
+                return results
+            kwargs["start_cursor"] = response.get("next_cursor")
+
+    with ThreadPoolExecutor(max_workers=len(database_ids)) as executor:
+        per_shard = list(executor.map(query_one, database_ids))
+    results = [page for pages in per_shard for page in pages]
+    if len(database_ids) > 1 and query_kwargs.get("sorts") == NEWEST_FIRST:
+        results.sort(key=lambda page: page["properties"].get("Timestamp", {}).get("number") or 0, reverse=True)
+    return results
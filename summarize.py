@@ -0,0 +1,231 @@
+# summarize.py
+import argparse
+import hashlib
+import json
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from dotenv import load_dotenv
+from openai import OpenAI
+from archive import continue_into_archive
+from basic_functionality import build_inbox_filter, notion, page_to_record
+from chat_memory import count_tokens
+from shards import add_condition, query_shards, shards_for_read
+from utils import format_cc, format_message, get_attachments, parse_date
+
+load_dotenv()
+
+SUMMARY_MODEL = "gpt-4o-mini"
+
+# Local file caching one summary per message, keyed by page ID and content hash
+SUMMARIES_FILE = "message_summaries.json"
+
+# Messages summarized when no limit is given
+SUMMARIZE_LIMIT = 100
+
+# Messages summarized per model call in the map step, and calls run at once
+SUMMARY_BATCH_SIZE = 10
+SUMMARY_WORKERS = 4
+
+# Long bodies are cut to this many tokens before they are summarized
+MESSAGE_TOKEN_LIMIT = 500
+
+# Per-message summaries are merged in groups until they fit this many tokens
+REDUCE_TOKEN_LIMIT = 3000
+
+# Serializes writes of the cache file, and usage records from the map threads
+_lock = threading.Lock()
+_usage_lock = threading.Lock()
+
+def load_summaries():
+    try:
+        with open(SUMMARIES_FILE, "r") as f:
+            return json.load(f)
+    except (FileNotFoundError, json.JSONDecodeError):
+        return {}
+
+def save_summaries(new_summaries):
+    """Merge new {page_id: {"hash", "summary"}} entries into the cache file."""
+    with _lock:
+        summaries = load_summaries()
+        summaries.update(new_summaries)
+        # Write to a temp file first so a crash never leaves a half-written file
+        tmp_path = SUMMARIES_FILE + ".tmp"
+        with open(tmp_path, "w") as f:
+            json.dump(summaries, f)
+        os.replace(tmp_path, SUMMARIES_FILE)
+
+def content_hash(page):
+    """
+    Hash of what a message says, from its properties alone. Bodies never change
+    once sent, so the preview stands in for them and cached pages are never re-read.
+    """
+    sender_text, message_text = format_message(page["properties"])
+    names = [ref["name"] for ref in get_attachments(page["properties"])]
+    content = json.dumps([sender_text, message_text, format_cc(page["properties"]), names])
+    return hashlib.sha1(content.encode()).hexdigest()
+
+def render_record(record):
+    """One message as text for the map step, with long bodies cut short."""
+    date = datetime.fromtimestamp(record["timestamp"]).strftime("%Y-%m-%d %H:%M")
+    body = record["message"]
+    if count_tokens(body) > MESSAGE_TOKEN_LIMIT:
+        body = body[:MESSAGE_TOKEN_LIMIT * 4] + " [...]"
+    text = f"From: {record['sender']} ({date})\n"
+    if record["cc"]:
+        text += f"Cc: {record['cc']}\n"
+    if record["attachments"]:
+        text += f"Attachments: {', '.join(ref['name'] for ref in record['attachments'])}\n"
+    return text + body
+
+def _complete(openai_client, instructions, text, memory=None, json_output=False):
+    kwargs = {"response_format": {"type": "json_object"}} if json_output else {}
+    response = openai_client.chat.completions.create(
+        model=SUMMARY_MODEL,
+        messages=[
+            {"role": "system", "content": instructions},
+            {"role": "user", "content": text}
+        ],
+        temperature=0,
+        **kwargs
+    )
+    if memory is not None:
+        with _usage_lock:
+            memory.record_usage("summarize", response)
+    return response.choices[0].message.content.strip()
+
+def summarize_batch(openai_client, pages, memory=None):
+    """Map step: summarize a batch of messages in one call. Returns {page_id: summary}."""
+    records = [page_to_record(page) for page in pages]
+    text = "\n\n".join(f"Message {number}:\n{render_record(record)}" for number, record in enumerate(records, start=1))
+    content = _complete(
+        openai_client,
+        "Summarize each email in one sentence of at most 25 words: who wrote, what they want or say, "
+        "and any date, deadline or request. Answer with a JSON object mapping each message number "
+        "(as a string) to its summary.",
+        text,
+        memory,
+        json_output=True
+    )
+    try:
+        summaries = json.loads(content)
+    except json.JSONDecodeError:
+        summaries = {}
+    results = {}
+    for number, (page, record) in enumerate(zip(pages, records), start=1):
+        summary = summaries.get(str(number))
+        if not summary:
+            # Fall back to the preview rather than losing the message
+            summary = record["message"][:150]
+        date = datetime.fromtimestamp(record["timestamp"]).strftime("%Y-%m-%d")
+        results[page["id"]] = f"[{date}] {record['sender']}: {summary}"
+    return results
+
+def reduce_summaries(openai_client, summaries, focus=None, memory=None):
+    """
+    Reduce step: merge per-message summaries into one answer. While they do not
+    fit REDUCE_TOKEN_LIMIT, groups of them are condensed first.
+    """
+    instructions = (
+        "You summarize an email inbox for its owner. From these per-message summaries, write a short "
+        "overview: the main topics, who needs an answer, and any deadlines. Group related messages."
+    )
+    if focus:
+        instructions += f" Focus on: {focus}."
+    while count_tokens("\n".join(summaries)) > REDUCE_TOKEN_LIMIT and len(summaries) > 1:
+        groups, group, size = [], [], 0
+        for summary in summaries:
+            tokens = count_tokens(summary)
+            if group and size + tokens > REDUCE_TOKEN_LIMIT // 2:
+                groups.append(group)
+                group, size = [], 0
+            group.append(summary)
+            size += tokens
+        groups.append(group)
+        with ThreadPoolExecutor(max_workers=SUMMARY_WORKERS) as executor:
+            summaries = list(executor.map(
+                lambda group: _complete(
+                    openai_client,
+                    "Condense these email summaries into a few lines, keeping senders, requests and deadlines.",
+                    "\n".join(group),
+                    memory
+                ),
+                groups
+            ))
+    return _complete(openai_client, instructions, "\n".join(summaries), memory)
+
+def fetch_inbox(user, limit, since=None, until=None, sender=None):
+    """The user's newest `limit` received messages, continuing into the archive if needed."""
+    query_filter = build_inbox_filter(user)
+    if since is not None:
+        query_filter = add_condition(query_filter, {"property": "Timestamp", "number": {"greater_than_or_equal_to": since}})
+    if until is not None:
+        query_filter = add_condition(query_filter, {"property": "Timestamp", "number": {"less_than": until}})
+    if sender:
+        query_filter = add_condition(query_filter, {"property": "Sender", "rich_text": {"equals": sender}})
+    results, next_cursor = query_shards(notion, shards_for_read(recipient=user, since=since), query_filter, limit)
+    results, _ = continue_into_archive(
+        results, next_cursor, user, "recipient", limit, since=since, until=until, sender=sender
+    )
+    return results
+
+def summarize_inbox(openai_client, user, limit=SUMMARIZE_LIMIT, since=None, until=None, sender=None,
+                    focus=None, memory=None):
+    """
+    Summarize a user's inbox by map-reduce: every message not summarized yet is
+    summarized in parallel batches, the per-message summaries are cached by page
+    ID and content hash, and the summaries are reduced into one overview. Repeat
+    summaries only send new mail to the model.
+    since/until ("YYYY-MM-DD" or Timestamps) and sender narrow the messages.
+    With a ConversationMemory, the token usage is recorded on it.
+    Prints and returns the overview.
+    """
+    try:
+        since = parse_date(since)
+        until = parse_date(until, end_of_day=True)
+    except ValueError as e:
+        print(f"Error: {e}")
+        return ""
+
+    pages = fetch_inbox(user, limit, since, until, sender)
+    if not pages:
+        print("No messages to summarize.")
+        return ""
+
+    cached = load_summaries()
+    hashes = {page["id"]: content_hash(page) for page in pages}
+    missing = [page for page in pages if cached.get(page["id"], {}).get("hash") != hashes[page["id"]]]
+
+    new_summaries = {}
+    if missing:
+        batches = [missing[i:i + SUMMARY_BATCH_SIZE] for i in range(0, len(missing), SUMMARY_BATCH_SIZE)]
+        with ThreadPoolExecutor(max_workers=SUMMARY_WORKERS) as executor:
+            for results in executor.map(lambda batch: summarize_batch(openai_client, batch, memory), batches):
+                new_summaries.update(results)
+        save_summaries({
+            page_id: {"hash": hashes[page_id], "summary": summary}
+            for page_id, summary in new_summaries.items()
+        })
+
+    summaries = [
+        new_summaries[page["id"]] if page["id"] in new_summaries else cached[page["id"]]["summary"]
+        for page in pages
+    ]
+    overview = reduce_summaries(openai_client, summaries, focus, memory)
+    print(f"Summary of {len(pages)} messages ({len(missing)} newly summarized):\n\n{overview}")
+    return overview
+
+def main():
+    parser = argparse.ArgumentParser(description="Summarize a user's inbox")
+    parser.add_argument("user")
+    parser.add_argument("--limit", type=int, default=SUMMARIZE_LIMIT, help="Newest messages to include")
+    parser.add_argument("--since", help="Only messages from this date (YYYY-MM-DD)")
+    parser.add_argument("--until", help="Only messages up to this date (YYYY-MM-DD)")
+    parser.add_argument("--from", dest="sender", help="Only messages from this sender")
+    parser.add_argument("--focus", help="What the summary should concentrate on")
+    args = parser.parse_args()
+    summarize_inbox(OpenAI(), args.user, args.limit, args.since, args.until, args.sender, args.focus)
+
+if __name__ == "__main__":
+    main()
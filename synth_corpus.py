@@ -0,0 +1,222 @@
+# synth_corpus.py
+import argparse
+import gzip
+import json
+import math
+import random
+import sys
+from bisect import bisect
+from collections import deque
+from datetime import datetime, timezone
+
+# Seed text for the word-level Markov chain that writes message bodies
+SEED_TEXT = """
+I wanted to follow up on the project timeline we discussed in the meeting yesterday.
+The client asked for an updated estimate before the end of the week so we need to agree on the scope.
+Could you send me the latest numbers from the budget review when you have a moment?
+I think we should move the design review to Thursday because the team is still waiting on feedback.
+The deployment went well last night but we saw a few errors in the logs that need a closer look.
+Let me know if you have time to sync on the roadmap later today or tomorrow morning.
+We are still waiting on the vendor to confirm the delivery date for the new hardware.
+The marketing team shared a draft of the launch plan and they would like our comments by Friday.
+I reviewed the pull request and left some notes about the test coverage and the error handling.
+Please remember to update the shared document with your notes from the customer call.
+The quarterly report is almost ready but the sales figures for March are still missing.
+I can take the first pass at the presentation if you can handle the questions from finance.
+We should schedule a retrospective once the release is out so we can talk about what went wrong.
+Thanks for covering the support rotation this week, it made a big difference for the team.
+The new hire starts on Monday and we still need to set up their laptop and accounts.
+Can we push the planning meeting by an hour because I have a conflict with the board call?
+The dashboard numbers look off compared to last month so I am double checking the queries.
+I talked to legal about the contract and they want a few changes to the renewal terms.
+Our budget for the offsite was approved so we can start booking the venue and travel.
+Let me know what you think about the proposal and whether we should share it with the wider team.
+"""
+
+FIRST_NAMES = [
+    "Alice", "Bob", "Charlie", "Dana", "Eve", "Frank", "Grace", "Heidi", "Ivan", "Judy",
+    "Mallory", "Niaj", "Olivia", "Peggy", "Rupert", "Sybil", "Trent", "Uma", "Victor", "Walter",
+]
+GREETINGS = ["Hi {name},", "Hello {name},", "Hey {name},", "{name},", "Good morning {name},"]
+SIGN_OFFS = ["Thanks,\n{sender}", "Best,\n{sender}", "Cheers,\n{sender}", "- {sender}", "Talk soon,\n{sender}"]
+REPLY_OPENERS = ["Sounds good.", "Thanks for the update.", "Got it.", "Makes sense to me.", "Good point."]
+
+def build_chain(text):
+    """Order-1 word Markov chain: word -> list of following words."""
+    chain = {}
+    sentences = [line.split() for line in text.strip().splitlines() if line.strip()]
+    for words in sentences:
+        for current, following in zip(words, words[1:]):
+            chain.setdefault(current, []).append(following)
+    starts = [words[0] for words in sentences]
+    return chain, starts
+
+def zipf_cumulative_weights(n, exponent):
+    """Cumulative Zipf weights for ranks 1..n, for sampling with bisect."""
+    total = 0.0
+    cumulative = []
+    for rank in range(1, n + 1):
+        total += 1.0 / rank ** exponent
+        cumulative.append(total)
+    return cumulative
+
+def make_users(count):
+    """Distinct, readable user names: Alice, Bob, ..., Alice 2, Bob 2, ..."""
+    return [
+        FIRST_NAMES[i % len(FIRST_NAMES)] + ("" if i < len(FIRST_NAMES) else f" {i // len(FIRST_NAMES) + 1}")
+        for i in range(count)
+    ]
+
+class CorpusGenerator:
+    """
+    Seeded generator of realistic-looking mail. Everything is derived from the
+    seed, so the same arguments always produce the same corpus (and IDs).
+    """
+
+    def __init__(self, seed=0, users=50, zipf=1.1, contacts=8, reply_prob=0.6,
+                 cc_prob=0.1, mean_words=60, sigma=0.9, max_words=2000,
+                 start="2024-01-01", days=365, count=1000):
+        self.rng = random.Random(seed)
+        self.seed = seed
+        self.users = make_users(users)
+        self.count = count
+        self.reply_prob = reply_prob
+        self.cc_prob = cc_prob
+        self.max_words = max_words
+        # Lognormal body length whose mean is mean_words
+        self.mu = math.log(mean_words) - sigma ** 2 / 2
+        self.sigma = sigma
+        self.chain, self.starts = build_chain(SEED_TEXT)
+
+        # A few users send most of the mail
+        self.sender_weights = zipf_cumulative_weights(users, zipf)
+        # Everyone writes mostly to a handful of regular contacts
+        contact_weights = zipf_cumulative_weights(min(contacts, users - 1), zipf)
+        self.contacts = {}
+        for user in self.users:
+            others = [other for other in self.users if other != user]
+            self.contacts[user] = (self.rng.sample(others, min(contacts, len(others))), contact_weights)
+
+        # Midnight UTC, so the corpus does not depend on the machine's time zone
+        self.start = datetime.strptime(start, "%Y-%m-%d").replace(tzinfo=timezone.utc).timestamp()
+        self.mean_gap = days * 86400 / max(count, 1)
+        # Recently active threads that can receive replies: (sender, recipient, subject)
+        self.open_threads = deque(maxlen=200)
+
+    def pick_sender(self):
+        position = self.rng.random() * self.sender_weights[-1]
+        return self.users[bisect(self.sender_weights, position)]
+
+    def pick_contact(self, user):
+        contacts, weights = self.contacts[user]
+        position = self.rng.random() * weights[-1]
+        return contacts[bisect(weights, position)]
+
+    def sentence(self):
+        word = self.rng.choice(self.starts)
+        words = [word]
+        while word in self.chain and not word.endswith((".", "?", "!")) and len(words) < 40:
+            word = self.rng.choice(self.chain[word])
+            words.append(word)
+        sentence = " ".join(words)
+        return sentence if sentence.endswith((".", "?", "!")) else sentence + "."
+
+    def body(self, sender, recipient, opener=None):
+        target = min(self.max_words, max(3, int(self.rng.lognormvariate(self.mu, self.sigma))))
+        sentences = [opener] if opener else []
+        words = sum(len(s.split()) for s in sentences)
+        while words < target:
+            sentence = self.sentence()
+            sentences.append(sentence)
+            words += len(sentence.split())
+        greeting = self.rng.choice(GREETINGS).format(name=recipient)
+        sign_off = self.rng.choice(SIGN_OFFS).format(sender=sender)
+        return f"{greeting}\n\n{' '.join(sentences)}\n\n{sign_off}"
+
+    def __iter__(self):
+        timestamp = self.start
+        for number in range(self.count):
+            timestamp += self.rng.expovariate(1 / self.mean_gap)
+
+            if self.open_threads and self.rng.random() < self.reply_prob:
+                # Reply in an existing thread, in the other direction
+                thread = self.open_threads[self.rng.randrange(len(self.open_threads))]
+                sender, recipient, subject = thread[1], thread[0], thread[2]
+                message = f"Re: {subject}\n" + self.body(sender, recipient, opener=self.rng.choice(REPLY_OPENERS))
+            else:
+                sender = self.pick_sender()
+                recipient = self.pick_contact(sender)
+                subject = " ".join(self.sentence().split()[:6]).rstrip(".?!")
+                message = f"{subject}\n" + self.body(sender, recipient)
+            self.open_threads.append((sender, recipient, subject))
+
+            cc = ""
+            if self.rng.random() < self.cc_prob:
+                cc = self.pick_contact(sender)
+                if cc == recipient:
+                    cc = ""
+
+            yield {
+                "id": f"synthetic-{self.seed}-{number:09d}",
+                "sender": sender,
+                "recipient": recipient,
+                "cc": cc,
+                "message": message,
+                "timestamp": round(timestamp, 3)
+            }
+
+def write_jsonl(records, path):
+    """Stream records to a JSONL file (gzip-compressed if the name ends in .gz), or stdout for "-"."""
+    if path == "-":
+        out = sys.stdout
+    elif path.endswith(".gz"):
+        out = gzip.open(path, "wt")
+    else:
+        out = open(path, "w")
+    written = 0
+    try:
+        for record in records:
+            out.write(json.dumps(record, separators=(",", ":")) + "\n")
+            written += 1
+    finally:
+        if out is not sys.stdout:
+            out.close()
+    return written
+
+def main():
+    parser = argparse.ArgumentParser(description="Generate a deterministic synthetic mail corpus offline")
+    parser.add_argument("--count", type=int, default=1000, help="Number of messages")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--users", type=int, default=50)
+    parser.add_argument("--zipf", type=float, default=1.1, help="Zipf exponent of sender activity")
+    parser.add_argument("--contacts", type=int, default=8, help="Regular contacts per user")
+    parser.add_argument("--reply-prob", type=float, default=0.6, help="Probability a message replies to a thread")
+    parser.add_argument("--cc-prob", type=float, default=0.1)
+    parser.add_argument("--mean-words", type=int, default=60, help="Mean body length in words (lognormal)")
+    parser.add_argument("--sigma", type=float, default=0.9, help="Spread of the body length distribution")
+    parser.add_argument("--start", default="2024-01-01", help="Date of the first message (YYYY-MM-DD, UTC)")
+    parser.add_argument("--days", type=int, default=365, help="Days the corpus spans")
+    parser.add_argument("--out", default="corpus.jsonl.gz", help="Output file (.jsonl, .jsonl.gz or - for stdout)")
+    parser.add_argument("--load", action="store_true",
+                        help="Load the messages straight into Notion with the bulk restore instead of writing a file")
+    args = parser.parse_args()
+
+    if args.users < 2:
+        parser.error("--users must be at least 2")
+
+    generator = CorpusGenerator(
+        seed=args.seed, users=args.users, zipf=args.zipf, contacts=args.contacts,
+        reply_prob=args.reply_prob, cc_prob=args.cc_prob, mean_words=args.mean_words,
+        sigma=args.sigma, start=args.start, days=args.days, count=args.count
+    )
+    if args.load:
+        # Imported here so generating files never needs Notion credentials
+        from backup import restore_records
+        restore_records(iter(generator), f"synthetic-{args.seed}.restored")
+    else:
+        written = write_jsonl(generator, args.out)
+        if args.out != "-":
+            print(f"Wrote {written} messages to {args.out}")
+
+if __name__ == "__main__":
+    main()
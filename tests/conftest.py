@@ -0,0 +1,12 @@
+# conftest.py
+import os
+import sys
+
+# The modules are flat scripts in the repository root
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+# Clients are created at import time; tests never reach the real services
+os.environ.setdefault("NOTION_KEY", "test")
+os.environ.setdefault("DATABASE_ID", "test-database")
+os.environ.setdefault("OPENAI_API_KEY", "test")
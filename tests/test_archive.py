@@ -0,0 +1,85 @@
+# test_archive.py
+import os
+import pytest
+import archive
+
+CUTOFF = 1000.0
+
+@pytest.fixture
+def archive_dir(tmp_path, monkeypatch):
+    """An archive with a cutoff of 1000 holding Bob's messages at 900-960 and 100-190."""
+    monkeypatch.setattr(archive, "ARCHIVE_DIR", str(tmp_path))
+    monkeypatch.setattr(archive, "MANIFEST_FILE", os.path.join(str(tmp_path), "manifest.json"))
+    records = [
+        {"id": f"archived-{ts}", "sender": "Alice", "recipient": "Bob", "message": "budget", "timestamp": float(ts)}
+        for ts in list(range(900, 1000, 20)) + list(range(100, 200, 10))
+    ]
+    archive.write_segment(records)
+    manifest = archive.load_manifest()
+    manifest["cutoff"] = CUTOFF
+    archive.save_manifest(manifest)
+    return records
+
+def live_page(page_id, timestamp):
+    return {"id": page_id, "properties": {"Timestamp": {"number": timestamp}}}
+
+def page_through(results, next_cursor, limit):
+    """Every page ID a reader sees: the first page, then the archive cursors followed to the end."""
+    seen = [page["id"] for page in results]
+    while next_cursor:
+        results, next_cursor = archive.archive_page("Bob", "recipient", archive.parse_archive_cursor(next_cursor), limit)
+        seen += [page["id"] for page in results]
+    return seen
+
+@pytest.mark.parametrize("limit", [3, 4, 50])
+def test_live_pages_older_than_cutoff_do_not_hide_archived_ones(archive_dir, limit):
+    # Restored live pages at 500 and 200, below the cutoff and the archived 900-980
+    live = [live_page("live-1200", 1200.0), live_page("live-500", 500.0), live_page("live-200", 200.0)]
+    results, next_cursor = archive.continue_into_archive(live, None, "Bob", "recipient", limit)
+    seen = page_through(results, next_cursor, limit)
+    assert sorted(seen) == sorted([page["id"] for page in live] + [record["id"] for record in archive_dir])
+    assert len(seen) == len(set(seen))
+
+def test_pages_both_live_and_archived_are_shown_once(archive_dir):
+    # An interrupted archive run leaves a page in both tiers
+    live = [live_page("archived-980", 980.0)]
+    results, next_cursor = archive.continue_into_archive(live, None, "Bob", "recipient", 5)
+    assert [page["id"] for page in results].count("archived-980") == 1
+
+def test_archive_paging_keeps_tied_timestamps(tmp_path, monkeypatch):
+    monkeypatch.setattr(archive, "ARCHIVE_DIR", str(tmp_path))
+    monkeypatch.setattr(archive, "MANIFEST_FILE", os.path.join(str(tmp_path), "manifest.json"))
+    records = [
+        {"id": f"copy-{number:02d}", "sender": "Alice", "recipient": "Bob", "message": "hi", "timestamp": 100.0}
+        for number in range(15)
+    ]
+    archive.write_segment(records)
+    manifest = archive.load_manifest()
+    manifest["cutoff"] = CUTOFF
+    archive.save_manifest(manifest)
+    results, next_cursor = archive.continue_into_archive([], None, "Bob", "recipient", 4)
+    assert sorted(page_through(results, next_cursor, 4)) == sorted(record["id"] for record in records)
+
+def test_read_mail_shows_archived_mail_newer_than_old_live_pages(archive_dir, tmp_path, monkeypatch):
+    for module in ("dotenv", "notion_client", "openai", "pinecone"):
+        pytest.importorskip(module)
+    import basic_functionality
+
+    # The live database holds only one restored message, older than the cutoff
+    live = [live_page("live-500", 500.0)]
+    live[0]["properties"].update({
+        "Sender": {"rich_text": [{"plain_text": "Alice"}]},
+        "Recipient": {"rich_text": [{"plain_text": "Bob"}]},
+        "Message": {"title": [{"plain_text": "restored"}]},
+    })
+    monkeypatch.setattr(basic_functionality, "query_shards", lambda *args: (list(live), None))
+    monkeypatch.setattr(basic_functionality, "set_watermark", lambda user, timestamp: None)
+    monkeypatch.chdir(tmp_path)
+
+    seen = []
+    results, next_cursor = basic_functionality.read_mail("Bob", limit=4, use_cache=False)
+    seen += [page["id"] for page in results]
+    while next_cursor:
+        results, next_cursor = basic_functionality.read_mail("Bob", limit=4, start_cursor=next_cursor, use_cache=False)
+        seen += [page["id"] for page in results]
+    assert sorted(seen) == sorted(["live-500"] + [record["id"] for record in archive_dir])
@@ -0,0 +1,75 @@
+# test_embed_versions.py
+import json
+import pytest
+
+for module in ("dotenv", "notion_client", "openai", "pinecone"):
+    pytest.importorskip(module)
+
+import embed_versions
+from embedding import VERSIONS_FILE
+
+class FakeIndex:
+    def __init__(self, dimension):
+        self.dimension = dimension
+
+    def describe_index_stats(self):
+        return {"dimension": self.dimension, "total_vector_count": 0}
+
+class FakePinecone:
+    """Pinecone with one index per name, of a fixed dimension."""
+
+    def __init__(self, indexes):
+        self.indexes = indexes
+        self.created = []
+
+    def has_index(self, name):
+        return name in self.indexes
+
+    def create_index(self, name, dimension, **kwargs):
+        self.indexes[name] = dimension
+        self.created.append(name)
+
+@pytest.fixture
+def pinecone(tmp_path, monkeypatch):
+    """Run in an empty directory, so the default v1 version (index "notion-mail", 1024 dimensions) is active."""
+    monkeypatch.chdir(tmp_path)
+    fake = FakePinecone({embed_versions.get_version()["index"]: 1024})
+    monkeypatch.setattr(embed_versions, "pc", fake)
+    monkeypatch.setattr(embed_versions, "version_index", lambda pc, version: FakeIndex(pc.indexes[version["index"]]))
+    # The active model's default output size
+    monkeypatch.setattr(embed_versions, "embed_passages", lambda pc, texts, version: [[0.0] * 1024 for _ in texts])
+    return fake
+
+def saved_versions(tmp_path):
+    with open(tmp_path / VERSIONS_FILE) as f:
+        return json.load(f)["versions"]
+
+def test_local_version_cannot_reuse_an_index_of_another_dimension(pinecone, tmp_path):
+    with pytest.raises(SystemExit, match="512"):
+        embed_versions.add_version("local", "hashing-ngram", provider="local")
+    assert not (tmp_path / VERSIONS_FILE).exists()
+
+def test_pinecone_version_with_another_dimension_cannot_reuse_the_index(pinecone, tmp_path):
+    with pytest.raises(SystemExit, match="--index"):
+        embed_versions.add_version("v2", "llama-text-embed-v2", dimension=384)
+    assert not (tmp_path / VERSIONS_FILE).exists()
+
+def test_version_of_the_same_dimension_reuses_the_index(pinecone, tmp_path):
+    embed_versions.add_version("v2", "llama-text-embed-v2")
+    assert saved_versions(tmp_path)["v2"]["index"] == embed_versions.get_version("v1")["index"]
+
+def test_version_with_its_own_index_is_added(pinecone, tmp_path, monkeypatch):
+    monkeypatch.setattr(embed_versions, "ServerlessSpec", dict)
+    embed_versions.add_version("local", "hashing-ngram", index_name="notion-mail-local", create_index=True,
+                               provider="local")
+    assert pinecone.created == ["notion-mail-local"]
+    assert saved_versions(tmp_path)["local"]["dimension"] == 512
+
+def test_missing_index_is_refused(pinecone):
+    with pytest.raises(SystemExit, match="does not exist"):
+        embed_versions.add_version("local", "hashing-ngram", index_name="nowhere", provider="local")
+
+def test_without_pinecone_a_different_dimension_needs_its_own_index(pinecone, tmp_path, monkeypatch):
+    monkeypatch.setattr(embed_versions, "pc", None)
+    with pytest.raises(SystemExit, match="--index"):
+        embed_versions.add_version("local", "hashing-ngram", provider="local")
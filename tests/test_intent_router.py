@@ -0,0 +1,50 @@
+# test_intent_router.py
+import pytest
+from intent_router import MIN_CONFIDENCE, route
+
+def routed_command(prompt):
+    instruction, confidence = route(prompt)
+    if instruction is None:
+        return None
+    assert confidence >= MIN_CONFIDENCE
+    return instruction["commands"][0]
+
+@pytest.mark.parametrize("prompt", [
+    "search my mail for messages from Alice last week",
+    "search for budget from Bob",
+    "look for invoices since 2025-03-01",
+    "search my emails for the offsite before Friday",
+    "grep for deadline yesterday",
+    "find my messages containing budget from March",
+    "search for anything Carol sent by email this week",
+    "search for the notes about the quarterly planning offsite meeting",
+    "find messages about the launch from Dana",
+    "show me emails related to hiring in the past month",
+])
+def test_filter_style_searches_go_to_the_llm(prompt):
+    assert routed_command(prompt) is None
+
+@pytest.mark.parametrize("prompt, keyword", [
+    ("search for budget", "budget"),
+    ("search my mail for \"quarterly report\"", "quarterly report"),
+    ("find my messages containing invoice 42", "invoice 42"),
+])
+def test_short_keyword_searches_are_routed(prompt, keyword):
+    assert routed_command(prompt) == {"action": "search", "params": {"keyword": keyword}}
+
+def test_topic_search_is_routed():
+    assert routed_command("find my emails about the product launch") == {
+        "action": "semantic_search", "params": {"query": "the product launch"}
+    }
+
+@pytest.mark.parametrize("prompt", ["tell Bob I am late", "tell him that I am late", "send to Jean-Luc hi there"])
+def test_sends_without_a_clear_recipient_go_to_the_llm(prompt):
+    assert routed_command(prompt) is None
+
+@pytest.mark.parametrize("prompt, recipient, message", [
+    ("tell Bob that I am late", "Bob", "I am late"),
+    ("email Bob Smith: lunch at 1", "Bob Smith", "lunch at 1"),
+    ("send to Jean-Luc - hi there", "Jean-Luc", "hi there"),
+])
+def test_sends_with_a_delimiter_are_routed(prompt, recipient, message):
+    assert routed_command(prompt) == {"action": "send", "params": {"recipient": recipient, "message": message}}
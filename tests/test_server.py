@@ -0,0 +1,53 @@
+# test_server.py
+import pytest
+
+pytest.importorskip("dotenv")
+pytest.importorskip("notion_client")
+pytest.importorskip("openai")
+pytest.importorskip("pinecone")
+
+import chat_engine
+import server
+
+@pytest.fixture
+def files_dir(tmp_path, monkeypatch):
+    monkeypatch.setattr(server, "files_dir", str(tmp_path))
+    (tmp_path / "report.txt").write_text("quarterly numbers")
+    return tmp_path
+
+@pytest.fixture
+def sends(monkeypatch):
+    """Record send_mail calls instead of writing to Notion."""
+    calls = []
+
+    def fake_send_mail(**kwargs):
+        calls.append(kwargs)
+        print("Mail sent successfully.")
+
+    monkeypatch.setattr(chat_engine, "send_mail", fake_send_mail)
+    return calls
+
+def chat_send(monkeypatch, attachments):
+    """Run a chat turn through the server whose plan is a send with these attachments."""
+    instruction = {"commands": [{"action": "send", "params": {
+        "recipient": "Bob", "message": "see attached", "attachments": attachments
+    }}]}
+    monkeypatch.setattr(chat_engine, "route", lambda prompt: (instruction, 1.0))
+    monkeypatch.setattr(server, "memory_for", lambda user: chat_engine.new_memory())
+    _, result = server.handle_chat({"user": "Alice", "prompt": "send Bob the file"})
+    return result["answer"]
+
+@pytest.mark.parametrize("name", ["../secret.txt", "sub/../../secret.txt", "/etc/passwd"])
+def test_chat_send_refuses_files_outside_files_dir(files_dir, sends, monkeypatch, name):
+    answer = chat_send(monkeypatch, [name])
+    assert sends == []
+    assert "not sent" in answer
+
+def test_chat_send_resolves_attachments_inside_files_dir(files_dir, sends, monkeypatch):
+    chat_send(monkeypatch, ["report.txt"])
+    assert [call["attachments"] for call in sends] == [[str(files_dir / "report.txt")]]
+
+@pytest.mark.parametrize("name", ["../x", "/etc/passwd", "a/../../x", ""])
+def test_resolve_path_rejects_escapes(files_dir, name):
+    with pytest.raises(server.InvalidParams):
+        server.resolve_path(name)
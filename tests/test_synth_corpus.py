@@ -0,0 +1,29 @@
+# test_synth_corpus.py
+import json
+import os
+import subprocess
+import sys
+from synth_corpus import CorpusGenerator
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Prints the first records of a seeded corpus as JSON
+GENERATE = (
+    "import json; from synth_corpus import CorpusGenerator; "
+    "print(json.dumps(list(CorpusGenerator(seed=7, count=20, start='2024-03-10'))))"
+)
+
+def generate_in_time_zone(tz):
+    """Generate the corpus in a fresh interpreter running in time zone tz."""
+    env = dict(os.environ, TZ=tz, PYTHONPATH=ROOT)
+    output = subprocess.run([sys.executable, "-c", GENERATE], env=env, cwd=ROOT,
+                            capture_output=True, text=True, check=True).stdout
+    return json.loads(output)
+
+def test_same_seed_gives_the_same_corpus_in_every_time_zone():
+    utc = generate_in_time_zone("UTC")
+    assert utc == generate_in_time_zone("America/New_York")
+    assert utc == generate_in_time_zone("Asia/Kolkata")
+
+def test_start_date_is_midnight_utc():
+    assert CorpusGenerator(start="2024-01-01").start == 1704067200.0
@@ -1,4 +1,23 @@
 # utils.py
+import io
+import json
+import sys
+import threading
+from datetime import datetime, timedelta
+
+# Number of messages shown per screen in inbox and search listings
+DEFAULT_PAGE_SIZE = 10
+
+# Messages longer than this keep only a preview in the Message title;
+# the full body is stored as paragraph blocks inside the page
+PREVIEW_LENGTH = 200
+
+# Notion rejects text objects longer than 2000 characters
+BLOCK_TEXT_LIMIT = 2000
+
+# Notion sort specification for listing the most recent messages first
+NEWEST_FIRST = [{"property": "Timestamp", "direction": "descending"}]
+
 def format_message(properties):
     """Format and print a message from Notion properties."""
     sender_parts = properties.get("Sender", {}).get("rich_text", [])
@@ -9,8 +28,139 @@ def format_message(properties):
     
     return sender_text, message_text
 
+def format_cc(properties):
+    """Return the visible CC list of a message ("" if it had none)."""
+    cc_parts = properties.get("Cc", {}).get("rich_text", [])
+    return "".join([part.get("plain_text", "") for part in cc_parts])
+
+def get_attachments(properties):
+    """Return the attachment references of a message ({"name", "hash", "size"} each)."""
+    parts = properties.get("Attachments", {}).get("rich_text", [])
+    text = "".join([part.get("plain_text", "") for part in parts])
+    return json.loads(text) if text else []
+
+def format_size(size):
+    for unit in ("B", "KB", "MB"):
+        if size < 1024:
+            return f"{size:.0f} {unit}" if unit == "B" else f"{size:.1f} {unit}"
+        size /= 1024
+    return f"{size:.1f} GB"
+
+def format_attachments(attachments):
+    """One-line list of attachments, e.g. "report.pdf (1.2 MB), notes.txt (340 B)"."""
+    return ", ".join(f"{ref['name']} ({format_size(ref['size'])})" for ref in attachments)
+
+def render_message(sender_text, message_text, cc_text="", attachments=None):
+    """Render a message as the text block printed by print_message."""
+    cc_line = f"cc: {cc_text}\n" if cc_text else ""
+    attachment_line = f"attachments: {format_attachments(attachments)}\n" if attachments else ""
+    return f"from: {sender_text}\n{cc_line}{message_text}\n{attachment_line}" + "-" * 40
+
 def print_message(sender_text, message_text):
     """Print a formatted message."""
-    print(f"from: {sender_text}")
-    print(message_text)
-    print("-" * 40)
\ No newline at end of file
+    print(render_message(sender_text, message_text))
+
+def make_preview(message):
+    """Return the text stored in the Message title: the whole message, or its start."""
+    if len(message) <= PREVIEW_LENGTH:
+        return message
+    return message[:PREVIEW_LENGTH - 1].rstrip() + "…"
+
+def build_body_blocks(message):
+    """Split a message body into paragraph blocks that fit Notion's text limit."""
+    return [
+        {
+            "object": "block",
+            "type": "paragraph",
+            "paragraph": {
+                "rich_text": [
+                    {"type": "text", "text": {"content": message[i:i + BLOCK_TEXT_LIMIT]}}
+                ]
+            }
+        }
+        for i in range(0, len(message), BLOCK_TEXT_LIMIT)
+    ]
+
+def parse_date(value, end_of_day=False):
+    """
+    Turn a date filter value into a Timestamp: a number is used as is, a
+    "YYYY-MM-DD" or "YYYY-MM-DD HH:MM" string is read as local time.
+    With end_of_day, a plain date means the end of that day (for "until").
+    Returns None for empty values; raises ValueError for anything else.
+    """
+    if value is None or value == "":
+        return None
+    if isinstance(value, (int, float)):
+        return float(value)
+    value = value.strip()
+    for fmt in ("%Y-%m-%d %H:%M", "%Y-%m-%d"):
+        try:
+            parsed = datetime.strptime(value, fmt)
+        except ValueError:
+            continue
+        if end_of_day and fmt == "%Y-%m-%d":
+            parsed += timedelta(days=1)
+        return parsed.timestamp()
+    raise ValueError(f"Invalid date: {value!r} (use YYYY-MM-DD)")
+
+def parse_search_filters(text):
+    """Parse "from:Alice since:2025-03-01 until:2025-03-31" into search keyword arguments."""
+    filters = {}
+    names = {"from": "sender", "since": "since", "until": "until"}
+    for token in text.split():
+        key, _, value = token.partition(":")
+        if key.lower() not in names or not value:
+            raise ValueError(f"Unknown filter: {token!r} (use from:, since: or until:)")
+        filters[names[key.lower()]] = value
+    return filters
+
+def is_truncated(properties):
+    """Whether the Message title only holds a preview of a longer body."""
+    return properties.get("Truncated", {}).get("checkbox", False)
+
+class ThreadLocalStdout:
+    """
+    Stand-in for sys.stdout that lets each thread capture its own prints.
+    Threads that are not capturing write to the real stdout.
+    """
+
+    def __init__(self, default):
+        self.default = default
+        self.local = threading.local()
+
+    def buffers(self):
+        if not hasattr(self.local, "buffers"):
+            self.local.buffers = []
+        return self.local.buffers
+
+    def target(self):
+        buffers = self.buffers()
+        return buffers[-1] if buffers else self.default
+
+    def write(self, text):
+        return self.target().write(text)
+
+    def flush(self):
+        self.target().flush()
+
+    def __getattr__(self, name):
+        return getattr(self.target(), name)
+
+_stdout_lock = threading.Lock()
+
+def capture_output(func, *args, **kwargs):
+    """
+    Capture printed output from a function.
+    Safe to call from several threads at once (e.g. in the mail server).
+    """
+    with _stdout_lock:
+        if not isinstance(sys.stdout, ThreadLocalStdout):
+            sys.stdout = ThreadLocalStdout(sys.stdout)
+        stdout = sys.stdout
+    buffer = io.StringIO()
+    stdout.buffers().append(buffer)
+    try:
+        result = func(*args, **kwargs)
+    finally:
+        stdout.buffers().pop()
+    return buffer.getvalue(), result
@@ -0,0 +1,39 @@
+# watermarks.py
+import json
+import os
+import threading
+
+# Local file holding the last seen message Timestamp for each user
+WATERMARKS_FILE = "watermarks.json"
+
+# Serializes read-modify-write of the file when several threads read mail
+_lock = threading.Lock()
+
+def load_watermarks():
+    """Load the per-user read watermarks from disk."""
+    try:
+        with open(WATERMARKS_FILE, "r") as f:
+            return json.load(f)
+    except (FileNotFoundError, json.JSONDecodeError):
+        return {}
+
+def get_watermark(user):
+    """Return the Timestamp of the newest message the user has seen (0 if none)."""
+    return load_watermarks().get(user, 0)
+
+def set_watermark(user, timestamp):
+    """
+    Advance the user's watermark to timestamp.
+    The watermark never moves backwards.
+    """
+    with _lock:
+        watermarks = load_watermarks()
+        if timestamp <= watermarks.get(user, 0):
+            return
+        watermarks[user] = timestamp
+
+        # Write to a temp file first so a crash never leaves a half-written file
+        tmp_path = WATERMARKS_FILE + ".tmp"
+        with open(tmp_path, "w") as f:
+            json.dump(watermarks, f, indent=4)
+        os.replace(tmp_path, WATERMARKS_FILE)